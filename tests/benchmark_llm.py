@@ -0,0 +1,199 @@
+"""
+Throughput benchmark of the LLM client and the main evals, against the local mock
+LLM server, so limiter, retry and caching changes can be measured without tokens.
+
+    python tests/benchmark_llm.py --rows 2000 --json benchmark.json
+
+Every scenario reports payloads (or rows) per second, server requests per second,
+p50/p99 latency of the API calls (from the request telemetry), and the peak memory
+allocated by Python while it ran (with tracemalloc, which slows things down a bit,
+so compare runs of this script with each other only).
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_llm_server import MockLLMServer  # noqa: E402
+
+# the evals most commonly run through `EvalLLM.evaluate`
+EVAL_CHECKS = (
+    "context_relevance",
+    "factual_accuracy",
+    "response_completeness",
+    "response_conciseness",
+    "critique_language",
+)
+
+
+def make_rows(num_rows: int, context_words: int = 200) -> list[dict]:
+    filler = " ".join(["The quick brown fox jumps over the lazy dog."] * (context_words // 9 + 1))
+    return [
+        {
+            "question": f"What does row {idx} say about the fox?",
+            "context": f"Row {idx}. {filler}",
+            "response": f"The fox of row {idx} jumps over the lazy dog.",
+        }
+        for idx in range(num_rows)
+    ]
+
+
+def make_settings(args: argparse.Namespace, logs_folder: str, **kwargs):
+    from uptrain.framework import Settings
+
+    return Settings(
+        model="gpt-3.5-turbo",
+        openai_api_key="sk-mock",
+        logs_folder=logs_folder,
+        rpm_limit=args.rpm_limit,
+        tpm_limit=args.tpm_limit,
+        **kwargs,
+    )
+
+
+def measure(
+    name: str, mock: MockLLMServer, units: int, func: t.Callable[[], t.Any]
+) -> dict:
+    """Run a scenario and collect its metrics."""
+    from uptrain.operators.language.llm_stats import STATS_REGISTRY
+
+    STATS_REGISTRY.clear()
+    requests_before = mock.requests
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = None
+    for stats in STATS_REGISTRY._stats.values():
+        if latencies is None:
+            latencies = type(stats)()
+        latencies.merge(stats)
+    histogram = latencies.histograms["latency_seconds"] if latencies else None
+    requests = mock.requests - requests_before
+    return {
+        "scenario": name,
+        "units": units,
+        "seconds": round(elapsed, 3),
+        "units_per_second": round(units / elapsed, 2),
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_p50": round(histogram.quantile(0.5), 4) if histogram else None,
+        "latency_p99": round(histogram.quantile(0.99), 4) if histogram else None,
+        "peak_memory_mb": round(peak / 2**20, 2),
+        "counters": latencies.counters if latencies else {},
+    }
+
+
+def bench_multiclient(args, mock, logs_folder: str, **settings_kwargs) -> None:
+    from uptrain.operators.language.llm import LLMMulticlient
+
+    settings = make_settings(args, logs_folder, **settings_kwargs)
+    client = LLMMulticlient(settings, operator_name="benchmark")
+    payloads = [
+        client.make_payload(idx, f"Grade row {idx}. {_CLASSIFY_FORMAT}")
+        for idx in range(args.rows)
+    ]
+    client.fetch_responses(payloads)
+
+
+def bench_evaluate(args, mock, logs_folder: str) -> None:
+    from uptrain import EvalLLM, Evals
+
+    settings = make_settings(
+        args,
+        logs_folder,
+        journal_responses=False,
+        eval_type=args.eval_type,
+        grading_pack_size=args.grading_pack_size,
+    )
+    EvalLLM(settings).evaluate(
+        data=make_rows(args.eval_rows, args.context_words),
+        checks=[Evals(check) for check in EVAL_CHECKS],
+    )
+
+
+_CLASSIFY_FORMAT = """Return the output only in the corresponding JSON format. Do not output anything other than this JSON object:
+{
+    "Reasoning": [Reasoning],
+    "Choice": [Selected Choice],  # one of ("A", "B", "C")
+}"""
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    results = []
+    with MockLLMServer(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    ) as mock, tempfile.TemporaryDirectory() as logs_folder:
+        # every OpenAI client of the process, including EvalLLM's key check, hits the mock
+        os.environ["OPENAI_BASE_URL"] = mock.base_url
+        scenarios = {
+            "multiclient": lambda: bench_multiclient(args, mock, logs_folder),
+            "multiclient_cached": lambda: bench_multiclient(
+                args, mock, logs_folder, response_cache=True
+            ),
+            "evaluate": lambda: bench_evaluate(args, mock, logs_folder),
+        }
+        for name in args.scenarios:
+            if name == "multiclient_cached":
+                # warm the cache, then measure the cached run
+                scenarios[name]()
+            units = args.eval_rows if name == "evaluate" else args.rows
+            result = measure(name, mock, units, scenarios[name])
+            results.append(result)
+            print(
+                f"{name:>20}: {result['units_per_second']:>9.1f} units/s "
+                f"{result['requests_per_second']:>9.1f} req/s "
+                f"p50 {result['latency_p50']}s p99 {result['latency_p99']}s "
+                f"peak {result['peak_memory_mb']} MB"
+            )
+    return results
+
+
+def main(argv: t.Optional[list[str]] = None) -> list[dict]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000, help="Payloads of the client scenarios")
+    parser.add_argument("--eval-rows", type=int, default=100, help="Rows of the evaluate scenario")
+    parser.add_argument("--context-words", type=int, default=200)
+    parser.add_argument("--eval-type", default="cot", choices=["basic", "cot"])
+    parser.add_argument(
+        "--grading-pack-size", type=int, default=1, help="Rows per request of the basic evals"
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["multiclient", "multiclient_cached", "evaluate"],
+        choices=["multiclient", "multiclient_cached", "evaluate"],
+    )
+    parser.add_argument("--latency", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm-limit", type=int, default=100_000)
+    parser.add_argument("--tpm-limit", type=int, default=100_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
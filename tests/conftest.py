@@ -0,0 +1,162 @@
+import asyncio
+import inspect
+import os
+import sys
+import threading
+import weakref
+
+import pytest
+
+from uptrain.framework import Settings
+
+SELF_DIR = os.path.dirname(os.path.abspath(__file__))
+# for `mock_llm_server`
+sys.path.insert(0, SELF_DIR)
+
+DEFAULT_CONTENT = '{"Choice": "A", "Reasoning": "ok"}'
+
+
+class FakeAsyncClient:
+    """Mimics the `chat.completions.create` surface of `openai.AsyncOpenAI`.
+
+    Every request is answered with `content`, or with what `respond` returns for the
+    request arguments: the content of the completion, or a completion. `respond` may
+    be async, and may raise to fail the request.
+    """
+
+    def __init__(self, content=DEFAULT_CONTENT, respond=None, delay=0.0, usage=(10, 5)):
+        self.content = content
+        self.respond = respond
+        self.delay = delay
+        self.usage = usage
+        self.calls = []
+        self.threads = set()
+        self.in_flight = self.max_in_flight = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.threads.add(threading.get_ident())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            result = self.content if self.respond is None else self.respond(**kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        finally:
+            self.in_flight -= 1
+        return self.completion(result) if isinstance(result, str) else result
+
+    def completion(self, content):
+        from openai.types.chat import ChatCompletion
+
+        prompt_tokens, completion_tokens = self.usage
+        return ChatCompletion.model_validate(
+            {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-3.5-turbo",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_state():
+    """Circuit breakers, latencies, rate limiters and response caches are shared by
+    the process, don't carry them across tests."""
+    from uptrain.operators.language.llm_cache import ResponseCache
+    from uptrain.operators.language.llm_hedge import LatencyTracker
+    from uptrain.operators.language.llm_retry import CircuitBreaker
+    from uptrain.operators.language.llm_scheduler import LIMITER_REGISTRY
+
+    CircuitBreaker.clear()
+    LatencyTracker.clear()
+    LIMITER_REGISTRY.clear()
+    yield
+    CircuitBreaker.clear()
+    LatencyTracker.clear()
+    LIMITER_REGISTRY.clear()
+    ResponseCache.close_all()
+
+
+@pytest.fixture
+def make_aclient():
+    return FakeAsyncClient
+
+
+@pytest.fixture
+def make_settings(tmp_path):
+    """Settings for tests, with their logs in a temporary folder."""
+
+    def make(**kwargs):
+        kwargs = {
+            "model": "gpt-3.5-turbo",
+            "openai_api_key": "sk-test",
+            "logs_folder": str(tmp_path),
+            **kwargs,
+        }
+        return Settings(**kwargs)
+
+    return make
+
+
+@pytest.fixture
+def make_client(make_settings):
+    """An `LLMMulticlient` sending its requests to a fake client, without rate limits."""
+    from uptrain.operators.language.llm import LLMMulticlient
+
+    def make(aclient=None, **settings_kwargs):
+        if aclient is None:
+            aclient = FakeAsyncClient()
+        client = LLMMulticlient(make_settings(**settings_kwargs), aclient=aclient)
+        client._rpm_limit, client._tpm_limit = 10_000, 10_000_000
+        return client
+
+    return make
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """A fake client that every API client created from here on is, e.g. the ones of
+    the operators run by `EvalLLM`."""
+    from uptrain.operators.language import llm_runner
+
+    aclient = FakeAsyncClient()
+    aclient.configs = []
+
+    def make_async_client(config):
+        aclient.configs.append(config)
+        return aclient
+
+    monkeypatch.setattr(llm_runner, "make_async_client", make_async_client)
+    monkeypatch.setattr(llm_runner, "_CLIENT_POOL", weakref.WeakKeyDictionary())
+    return aclient
+
+
+@pytest.fixture
+def rate_limit_error():
+    import httpx
+    import openai
+
+    def make(retry_after="0.05"):
+        request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+        response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+        return openai.RateLimitError("Rate limited", response=response, body=None)
+
+    return make
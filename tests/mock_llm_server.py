@@ -0,0 +1,307 @@
+"""
+A local, OpenAI-compatible mock of the chat completions API, to test and benchmark
+uptrain without spending tokens.
+
+Responses are valid grading JSON for the uptrain eval templates: the keys are taken
+from the output format the prompt asks for, and the values (choices, scores,
+judgements) are picked deterministically from a hash of the prompt. Latencies,
+server errors and 429s can be injected.
+
+Run standalone with `python tests/mock_llm_server.py --port 8000`, then point the
+OpenAI client at it with `OPENAI_BASE_URL=http://127.0.0.1:8000/v1`.
+"""
+
+from __future__ import annotations
+import argparse
+import hashlib
+import http.server
+import json
+import math
+import random
+import re
+import threading
+import time
+import typing as t
+
+# the templates end with the output format, after this sentence
+_FORMAT_MARKER = "Return the output only in the corresponding JSON format"
+_KEY_RE = re.compile(r'"([A-Z][A-Za-z ]*)"\s*:')
+_CHOICES_RE = re.compile(r"one of \(([^)]*)\)")
+_SCORE_RANGE_RE = re.compile(r"Score between (\d+) to (\d+)")
+# numbered items of a packed prompt, see `uptrain.operators.language.llm_pack`
+_ITEM_RE = re.compile(r"^\[Item (\d+)\]$", re.MULTILINE)
+_PACK_KEYS = ("Results", "Item")
+
+
+def _prompt_text(messages: list[dict]) -> str:
+    return "\n".join(
+        message["content"] if isinstance(message.get("content"), str) else ""
+        for message in messages
+    )
+
+
+def _output_keys(format_block: str) -> list[str]:
+    keys = []
+    for key in _KEY_RE.findall(format_block):
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def make_grading_content(prompt: str, seed: int = 0, reasoning_words: int = 20) -> str:
+    """The JSON answer to a grading prompt, deterministic for a prompt and seed.
+    Packed prompts get one result per numbered item."""
+    rng = random.Random(hashlib.sha256(f"{seed}:{prompt}".encode("utf-8")).digest())
+    marker = prompt.rfind(_FORMAT_MARKER)
+    format_block = prompt[marker:] if marker >= 0 else prompt
+    keys = [key for key in _output_keys(format_block) if key not in _PACK_KEYS]
+    keys = keys or ["Reasoning", "Choice"]
+    items = _ITEM_RE.findall(prompt)
+    if items:
+        results = [
+            {"Item": int(num), **_grade(keys, format_block, rng, reasoning_words)}
+            for num in items
+        ]
+        return json.dumps({"Results": results})
+    return json.dumps(_grade(keys, format_block, rng, reasoning_words))
+
+
+def _grade(
+    keys: list[str], format_block: str, rng: random.Random, reasoning_words: int
+) -> dict[str, t.Any]:
+    reasoning = " ".join(
+        rng.choice(("the", "response", "context", "is", "relevant", "because", "it"))
+        for _ in range(reasoning_words)
+    )
+    output: dict[str, t.Any] = {}
+    for key in keys:
+        if key == "Choice":
+            match = _CHOICES_RE.search(format_block)
+            options = (
+                [option.strip().strip("\"'") for option in match.group(1).split(",")]
+                if match
+                else ["A"]
+            )
+            output[key] = rng.choice([option for option in options if option] or ["A"])
+        elif key == "Score":
+            match = _SCORE_RANGE_RE.search(format_block)
+            low, high = (int(match.group(1)), int(match.group(2))) if match else (0, 1)
+            output[key] = (
+                rng.choice([0.0, 0.5, 1.0]) if high <= 1 else rng.randint(low, high)
+            )
+        elif key in ("Turns", "Number of Turns"):
+            output[key] = rng.randint(1, 5)
+        elif key == "Facts":
+            output[key] = [f"Fact {idx + 1} of the response." for idx in range(rng.randint(1, 3))]
+        elif key == "Result":
+            output[key] = [
+                {
+                    "Fact": f"Fact {idx + 1} of the response.",
+                    "Reasoning": reasoning,
+                    "Judgement": rng.choice(["yes", "unclear", "no"]),
+                }
+                for idx in range(rng.randint(1, 3))
+            ]
+        elif key in ("Fact", "Judgement"):
+            continue  # nested in "Result"
+        elif key == "Snippet":
+            output[key] = ""
+        elif key == "Question":
+            output[key] = "What is the rewritten question?"
+        else:
+            output[key] = reasoning
+    return output
+
+
+class MockLLMServer:
+    """OpenAI-compatible chat completions server, on a daemon thread.
+
+    Attributes:
+        latency: Distribution of the response times, "fixed", "uniform" (between 0 and
+            twice the mean) or "lognormal" (with `latency_sigma`).
+        latency_mean: Mean response time in seconds.
+        error_rate: Fraction of requests answered with a 500.
+        rate_limit_rate: Fraction of requests answered with a 429.
+        rpm_limit: Requests per minute above which requests get a 429, like a real
+            account quota. None means no limit.
+        seed: Seed of the injected latencies/errors and of the response contents.
+        reasoning_words: Length of the generated reasoning, for CoT-sized responses.
+        requests/errors/rate_limited: Counters of requests and injected failures.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: t.Literal["fixed", "uniform", "lognormal"] = "lognormal",
+        latency_mean: float = 0.05,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        rpm_limit: t.Optional[float] = None,
+        seed: int = 0,
+        reasoning_words: int = 20,
+    ):
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm_limit = rpm_limit
+        self.seed = seed
+        self.reasoning_words = reasoning_words
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._window: list[float] = []
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: t.Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _sample_latency(self) -> float:
+        if self.latency == "fixed":
+            return self.latency_mean
+        if self.latency == "uniform":
+            return self._rng.uniform(0, 2 * self.latency_mean)
+        # lognormal with the given mean
+        mu = math.log(max(self.latency_mean, 1e-6)) - self.latency_sigma**2 / 2
+        return self._rng.lognormvariate(mu, self.latency_sigma)
+
+    def _decide(self) -> tuple[float, t.Optional[int]]:
+        """Latency and injected status code of the next request."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.rpm_limit is not None:
+                self._window = [ts for ts in self._window if now - ts < 60.0]
+                if len(self._window) >= self.rpm_limit:
+                    self.rate_limited += 1
+                    return 0.0, 429
+                self._window.append(now)
+            latency = self._sample_latency()
+            draw = self._rng.random()
+            if draw < self.rate_limit_rate:
+                self.rate_limited += 1
+                return 0.0, 429
+            if draw < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                return latency, 500
+            return latency, None
+
+    def _completion(self, request: dict) -> dict:
+        prompt = _prompt_text(request.get("messages", []))
+        content = make_grading_content(prompt, self.seed, self.reasoning_words)
+        prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(content) // 4 + 1
+        return {
+            "id": "chatcmpl-mock-" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, status: int, body: dict, headers: t.Optional[dict] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                latency, status = server._decide()
+                if latency > 0:
+                    time.sleep(latency)
+                if status == 429:
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"retry-after": "0.1", "x-ratelimit-remaining-requests": "0"},
+                    )
+                elif status == 500:
+                    self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                else:
+                    self._send_json(200, server._completion(request))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm-limit", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockLLMServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rpm_limit=args.rpm_limit,
+        seed=args.seed,
+    )
+    print(f"Mock LLM server listening on {mock.base_url}")
+    mock._server.serve_forever()
@@ -0,0 +1,244 @@
+import asyncio
+import threading
+import time
+
+import polars as pl
+import pytest
+from loguru import logger
+
+from uptrain import EvalLLM
+from uptrain.framework import evalllm
+from uptrain.framework.result_store import ResultStore, row_fingerprints
+from uptrain.operators.language.llm import parse_json
+from uptrain.operators import ColumnOp, register_custom_op
+
+
+@register_custom_op
+class ScaledLength(ColumnOp):
+    col_in: str
+    scale: int = 1
+
+    def setup(self, settings):
+        return self
+
+    def run(self, data):
+        scores = data[self.col_in].str.len_chars() * self.scale
+        return {"output": data.with_columns(scores.alias("score_scaled_length"))}
+
+
+@pytest.fixture
+def eval_llm(fake_backend, make_settings, monkeypatch):
+    """An `EvalLLM` grading with the fake client, like the mock LLM server does."""
+    from mock_llm_server import make_grading_content
+
+    fake_backend.respond = lambda messages, **kwargs: make_grading_content(
+        messages[0]["content"]
+    )
+    monkeypatch.setattr(evalllm, "check_openai_api_key", lambda api_key: True)
+    return EvalLLM(make_settings(rpm_limit=10_000, tpm_limit=10_000_000))
+
+
+ROWS = [
+    {"question": f"Question {idx}?", "context": f"Context {idx}.", "response": f"Response {idx}."}
+    for idx in range(5)
+]
+CHECKS = ["context_relevance", "response_completeness", "critique_language"]
+
+
+# uptrain.framework.result_store
+def test_result_store_fingerprints(tmp_path):
+    data = pl.DataFrame(
+        {"question": ["q1", "q2", "q1"], "response": ["r1", "r2", "r1"], "extra": [1, 2, 3]}
+    )
+    config = {"check": {"check_name": "response_relevance"}, "model": "gpt-3.5-turbo"}
+    keys = row_fingerprints(data, ["question", "response"], config)
+    # only the fields read by the check matter
+    assert keys[0] == keys[2] and keys[0] != keys[1]
+    assert row_fingerprints(data, ["question", "response"], config) == keys
+    assert row_fingerprints(data, ["question", "response"], dict(config, model="gpt-4")) != keys
+
+    fpath = str(tmp_path / "results.sqlite")
+    store = ResultStore(fpath)
+    store.set_many({keys[0]: {"score_relevance": 1.0, "explanation_relevance": "ok"}})
+    store.close()
+
+    store = ResultStore(fpath)
+    found = store.get_many(keys)
+    assert found == {keys[0]: {"score_relevance": 1.0, "explanation_relevance": "ok"}}
+    assert (store.hits, store.misses) == (1, 1)
+    assert len(store) == 1
+    store.clear()
+    assert store.get_many(keys) == {}
+    store.close()
+
+
+# uptrain.framework.evalllm
+def test_incremental_evaluation(eval_llm, fake_backend):
+    rows = [{"question": f"q{idx}", "context": "ctx", "response": "r" * idx} for idx in range(4)]
+    first = eval_llm.evaluate(rows, ["context_relevance"], incremental=True)
+    assert len(fake_backend.calls) == 4
+    rows[1] = dict(rows[1], context="changed")
+    second = eval_llm.evaluate(rows, ["context_relevance"], incremental=True)
+    assert len(fake_backend.calls) == 5
+    assert [second[idx] for idx in (0, 2, 3)] == [first[idx] for idx in (0, 2, 3)]
+
+    # lists of different operators don't share their results
+    once = eval_llm.evaluate(rows, [[ScaledLength(col_in="response")]], incremental=True)
+    twice = eval_llm.evaluate(
+        rows, [[ScaledLength(col_in="response", scale=2)]], incremental=True
+    )
+    assert [row["score_scaled_length"] for row in once] == [0, 1, 2, 3]
+    assert [row["score_scaled_length"] for row in twice] == [0, 2, 4, 6]
+
+
+def test_aevaluate(eval_llm, fake_backend):
+    expected = eval_llm.evaluate(ROWS, CHECKS)
+    num_calls = len(fake_backend.calls)
+
+    async def main():
+        return await asyncio.gather(
+            eval_llm.aevaluate(ROWS, CHECKS),
+            eval_llm.aevaluate(ROWS, CHECKS, return_dataframe=True),
+        )
+
+    results, frame = asyncio.run(main())
+    assert results == expected and frame.to_dicts() == expected
+    assert len(fake_backend.calls) == 3 * num_calls
+
+
+def test_evaluate_stream(eval_llm, fake_backend):
+    expected = eval_llm.evaluate(ROWS, CHECKS)
+    chunks = list(eval_llm.evaluate_stream(iter(ROWS), CHECKS, chunk_size=2))
+    # in the order of the source, though two chunks are graded at a time
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row for chunk in chunks for row in chunk] == expected
+
+
+def test_evaluate_stream_cost_budget(fake_backend, make_settings, monkeypatch):
+    from mock_llm_server import make_grading_content
+
+    fake_backend.respond = lambda messages, **kwargs: make_grading_content(
+        messages[0]["content"]
+    )
+    monkeypatch.setattr(evalllm, "check_openai_api_key", lambda api_key: True)
+    # every response costs $10, `max_cost` is for the whole stream
+    eval_llm = EvalLLM(
+        make_settings(
+            rpm_limit=10_000,
+            tpm_limit=10_000_000,
+            max_cost=25.0,
+            model_prices={"gpt-3.5-turbo": [1_000_000, 0]},
+        )
+    )
+    rows = [dict(ROWS[0], question=f"Question {idx}?") for idx in range(10)]
+    chunks = list(eval_llm.evaluate_stream(rows, ["context_relevance"], chunk_size=1))
+    assert len(chunks) == 10
+    assert len(fake_backend.calls) <= 4
+    assert [chunk[0]["score_context_relevance"] for chunk in chunks[-5:]] == [None] * 5
+
+
+def test_estimate_cost(eval_llm, fake_backend):
+    errors = []
+    handler = logger.add(lambda message: errors.append(message.record), level="ERROR")
+    try:
+        estimate = eval_llm.estimate_cost(ROWS, CHECKS)
+        assert not fake_backend.calls and estimate.total_requests >= 15
+        # the missing responses aren't errors, and logging stays enabled
+        assert not errors
+        parse_json("{")
+        assert len(errors) == 1
+
+        # nor is it enabled again if it was disabled
+        logger.disable("uptrain")
+        eval_llm.estimate_cost(ROWS, CHECKS)
+        parse_json("{")
+        assert len(errors) == 1
+    finally:
+        logger.enable("uptrain")
+        logger.remove(handler)
+
+
+def test_evaluate_stream_early_close(eval_llm, fake_backend):
+    from mock_llm_server import make_grading_content
+
+    async def respond(messages, **kwargs):
+        if "Question 1?" in messages[0]["content"]:
+            await asyncio.sleep(1.0)
+        return make_grading_content(messages[0]["content"])
+
+    fake_backend.respond = respond
+    stream = eval_llm.evaluate_stream(ROWS, ["context_relevance"], chunk_size=1)
+    [row] = next(stream)
+    assert row["question"] == "Question 0?"
+    # the chunk being graded is not waited on, and no chunk is read after it
+    start = time.perf_counter()
+    stream.close()
+    assert time.perf_counter() - start < 0.5
+    assert not any("Question 2?" in call["messages"][0]["content"] for call in fake_backend.calls)
+    # let it finish before the logs of the test are closed
+    for thread in threading.enumerate():
+        if thread.name.startswith("ThreadPoolExecutor"):
+            thread.join()
+
+
+def test_concurrent_checks(eval_llm, fake_backend):
+    from uptrain import CritiqueTone, GuidelineAdherence
+
+    checks = [
+        *CHECKS,
+        CritiqueTone(llm_persona="teacher"),
+        GuidelineAdherence(guideline="Be brief", guideline_name="brevity"),
+        ScaledLength(col_in="response", scale=2),
+    ]
+    expected = eval_llm.evaluate(ROWS, checks)
+    eval_llm.settings.check_concurrency = 3
+    results = eval_llm.evaluate(ROWS, checks)
+    assert results == expected
+    # the columns of every check, merged into the rows in their order
+    assert [row["question"] for row in results] == [row["question"] for row in ROWS]
+    for column in [
+        "score_context_relevance",
+        "score_response_completeness",
+        "score_critique_tone",
+        "score_brevity_adherence",
+        "score_scaled_length",
+    ]:
+        assert all(column in row for row in results)
+    assert [row["score_scaled_length"] for row in results] == [22] * 5
+
+
+def test_merged_outputs(eval_llm):
+    # rows from the server may not all have the same keys
+    frame = evalllm._rows_to_frame([{"a": 1}, {"a": 2, "b": "x"}])
+    assert frame.to_dicts() == [{"a": 1, "b": None}, {"a": 2, "b": "x"}]
+
+    # a later check overwrites the column of the same name of an earlier one
+    checks = [
+        "critique_language",
+        ScaledLength(col_in="response"),
+        ScaledLength(col_in="response", scale=3),
+    ]
+    results = eval_llm.evaluate(ROWS, checks)
+    assert [row["score_scaled_length"] for row in results] == [33] * 5
+    assert list(results[0]).count("score_scaled_length") == 1
+    frame = eval_llm.evaluate(ROWS, checks, return_dataframe=True)
+    assert isinstance(frame, pl.DataFrame) and frame.to_dicts() == results
+
+
+def test_server_results_stay_rows(eval_llm, fake_backend, monkeypatch):
+    class FakeExecutor:
+        def evaluate(self, data, checks, metadata):
+            return [dict(row, score_server=1.0) for row in data]
+
+    monkeypatch.setattr(eval_llm, "executor", FakeExecutor())
+    # the metadata holds different types in different rows, which a DataFrame can't
+    rows = [dict(ROWS[0], meta={"a": 1}), dict(ROWS[1], meta=[1, 2])]
+    expected = [dict(row, score_server=1.0) for row in rows]
+
+    # graded locally, except for the checks the server grades
+    assert eval_llm.evaluate(rows, ["response_alignment_with_scenario"]) == expected
+    eval_llm.settings.evaluate_locally = False
+    assert eval_llm.evaluate(rows, CHECKS) == expected
+    assert not fake_backend.calls
+    frame = eval_llm.evaluate(ROWS, CHECKS, return_dataframe=True)
+    assert frame.to_dicts() == [dict(row, score_server=1.0) for row in ROWS]
@@ -0,0 +1,415 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+
+import httpx
+import openai
+from loguru import logger
+
+from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm_batch import BatchTransport
+from uptrain.operators.language.llm_endpoints import Endpoint
+from uptrain.operators.language.llm_hedge import Hedger, LatencyTracker
+from uptrain.operators.language.llm_journal import ResponseJournal, journal_session
+from uptrain.operators.language import llm_runner, llm_tokens
+from uptrain.operators.language.llm_stats import STATS_REGISTRY, start_metrics_server
+from uptrain.operators.language.llm_tokens import count_message_tokens
+
+
+def prompts(client, num, template="prompt {}"):
+    return [client.make_payload(idx, template.format(idx)) for idx in range(num)]
+
+
+# uptrain.operators.language.llm_cache
+def test_response_cache(make_aclient, make_client):
+    aclient = make_aclient()
+    client = make_client(aclient, response_cache=True)
+    client.fetch_responses(prompts(client, 3))
+    assert len(aclient.calls) == 3 and client.cache.misses == 3
+
+    # the database is opened once, for all clients
+    cache = client.cache
+    client = make_client(aclient, response_cache=True)
+    assert client.cache is cache
+    outputs = client.fetch_responses(prompts(client, 4))
+    assert len(aclient.calls) == 4 and client.cache.hits == 3
+    assert all(
+        json.loads(res.response.choices[0].message.content)["Choice"] == "A"
+        for res in outputs
+    )
+
+    client = make_client(aclient, response_cache=True, response_cache_bypass=True)
+    client.fetch_responses(prompts(client, 1))
+    assert len(aclient.calls) == 5
+
+
+# uptrain.operators.language.llm_tokens
+def test_token_usage(make_client):
+    messages = [{"role": "user", "content": "Hello world, how are you?"}]
+    assert 5 < count_message_tokens(messages, "gpt-3.5-turbo") < 20
+
+    client = make_client()
+    client.fetch_responses(prompts(client, 3, "prompt"))
+    assert client.last_run_usage.dict() == {
+        "requests": 3,
+        "prompt_tokens": 30,
+        "completion_tokens": 15,
+        "total_tokens": 45,
+    }
+    client.fetch_responses(prompts(client, 1, "prompt"))
+    assert client.last_run_usage.requests == 1
+    assert client.token_usage.requests == 4
+
+
+def test_token_count_fallback(monkeypatch):
+    # without tiktoken, token counts are estimated, with a single warning
+    monkeypatch.setattr(llm_tokens.importlib.util, "find_spec", lambda name: None)
+    llm_tokens._has_tiktoken.cache_clear()
+    llm_tokens.get_encoding.cache_clear()
+    warnings = []
+    handler = logger.add(warnings.append, level="WARNING")
+    try:
+        assert llm_tokens.count_text_tokens("a" * 30, "gpt-3.5-turbo") == 10
+        assert llm_tokens.count_text_tokens("a" * 30, "gpt-4") == 10
+    finally:
+        logger.remove(handler)
+        llm_tokens._has_tiktoken.cache_clear()
+        llm_tokens.get_encoding.cache_clear()
+    assert len(warnings) == 1 and "tiktoken" in warnings[0]
+
+
+# uptrain.operators.language.llm
+def test_iter_responses(make_aclient, make_client):
+    async def slow_first(messages, **kwargs):
+        if messages[0]["content"] == "prompt 0":
+            await asyncio.sleep(0.3)
+        return '{"Choice": "A"}'
+
+    # yielded as the responses arrive
+    client = make_client(make_aclient(respond=slow_first))
+    indices = [res.metadata["index"] for res in client.iter_responses(prompts(client, 5))]
+    assert sorted(indices) == list(range(5)) and indices[-1] == 0
+    assert list(client.iter_responses([])) == []
+
+    # bounded, the input is pulled lazily and the payloads passed are left as they are
+    aclient = make_aclient(delay=0.005)
+    client = make_client(aclient)
+    pulled, seen = [], []
+
+    def payloads():
+        for idx in range(40):
+            pulled.append(idx)
+            yield client.make_payload(idx, f"prompt {idx}")
+
+    for res in client.iter_responses(payloads(), max_in_flight=4):
+        assert len(pulled) - len(seen) <= 8
+        assert res.response is not None
+        assert res.data["messages"][0]["content"] == f"prompt {res.metadata['index']}"
+        seen.append(res.metadata["index"])
+    assert sorted(seen) == list(range(40))
+    assert aclient.max_in_flight <= 4
+
+
+def test_identical_requests_are_coalesced(make_aclient, make_client):
+    aclient = make_aclient(delay=0.05)
+    client = make_client(aclient)
+    outputs = client.fetch_responses(
+        [client.make_payload(idx, f"prompt {idx % 2}") for idx in range(6)]
+    )
+    assert len(aclient.calls) == 2
+    assert all(res.response is not None for res in outputs)
+    assert sum(res.metadata.get("coalesced", False) for res in outputs) == 4
+
+
+# uptrain.operators.language.llm_runner
+def test_background_loop_and_client_pool(fake_backend, make_settings):
+    client = LLMMulticlient(make_settings())
+    client._rpm_limit, client._tpm_limit = 10_000, 10_000_000
+
+    loops = set()
+    for _ in range(3):
+        client.fetch_responses(prompts(client, 1))
+        loops.add(llm_runner.get_background_loop().loop)
+    assert len(loops) == 1 and len(fake_backend.configs) == 1
+    assert fake_backend.configs[0].provider == "openai"
+    assert fake_backend.configs[0].api_key == "sk-test"
+
+    # works from inside a running loop too, and sees the caller's context variables
+    var = contextvars.ContextVar("var", default=None)
+
+    async def read_var():
+        return var.get()
+
+    async def main():
+        var.set("value")
+        [res] = client.fetch_responses(prompts(client, 1))
+        return res, llm_runner.run_coroutine(read_var())
+
+    res, value = asyncio.run(main())
+    assert res.response is not None and value == "value"
+    assert len(fake_backend.configs) == 1
+
+
+# uptrain.operators.language.llm_endpoints
+def test_endpoint_pool_load_balancing(make_aclient, make_settings):
+    def connection_error(**kwargs):
+        request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+        raise openai.APIConnectionError(request=request)
+
+    first, second = make_aclient(delay=0.01), make_aclient(delay=0.01)
+    broken = make_aclient(respond=connection_error)
+    client = LLMMulticlient(
+        make_settings(retry_base_delay=0.01),
+        endpoints=[
+            Endpoint("first", 10_000, 10_000_000, aclient=first),
+            Endpoint("second", 10_000, 10_000_000, aclient=second, weight=2, model="gpt-4"),
+            Endpoint("broken", 10_000, 10_000_000, aclient=broken),
+        ],
+    )
+    outputs = client.fetch_responses(prompts(client, 60))
+    assert all(res.error is None for res in outputs)
+    assert not client.endpoints.endpoints[2].is_healthy()
+    assert len(broken.calls) < 10
+    assert len(second.calls) > len(first.calls) > 0
+    assert all(call["model"] == "gpt-4" for call in second.calls)
+
+
+# uptrain.operators.language.llm_hedge
+def test_hedged_requests(make_aclient, make_client):
+    attempts = {}
+
+    async def straggle(messages, **kwargs):
+        # the first attempt of some prompts hangs
+        content = messages[0]["content"]
+        attempts[content] = attempts.get(content, 0) + 1
+        hangs = content.endswith("straggler") and attempts[content] == 1
+        await asyncio.sleep(5 if hangs else 0.01)
+        return '{"Choice": "A"}'
+
+    client = make_client(make_aclient(respond=straggle))
+    client.hedger = Hedger(budget=0.5, min_delay=0.05, min_samples=5)
+    client.fetch_responses(prompts(client, 10, "warmup {}"))
+
+    start = time.perf_counter()
+    outputs = client.fetch_responses(prompts(client, 2, "prompt {} straggler"))
+    assert time.perf_counter() - start < 2
+    assert all(res.response is not None and res.metadata["hedged"] for res in outputs)
+    assert client.hedger.hedges == client.hedger.wins == 2
+
+    # over budget, requests aren't hedged
+    client.hedger.budget = 0
+    [res] = client.fetch_responses(prompts(client, 1, "slow {}"))
+    assert "hedged" not in res.metadata
+
+
+def test_hedged_cold_request(make_aclient, make_client):
+    attempts = []
+
+    async def straggle(**kwargs):
+        attempts.append(kwargs)
+        await asyncio.sleep(5 if len(attempts) == 1 else 0.01)
+        return '{"Choice": "A"}'
+
+    # the only request of a new client, without latencies observed before
+    client = make_client(
+        make_aclient(respond=straggle),
+        hedge_requests=True,
+        hedge_min_samples=0,
+        hedge_min_delay=0.05,
+    )
+    start = time.perf_counter()
+    [res] = client.fetch_responses(prompts(client, 1))
+    assert time.perf_counter() - start < 2
+    assert res.response is not None and res.metadata["hedged"]
+    assert client.hedger.hedges == client.hedger.wins == 1
+    # the cancelled request counts as spent
+    assert client.token_usage.requests == 2
+
+    # time spent waiting for the rate limiter doesn't count as latency
+    async def queued(on_sent):
+        await asyncio.sleep(0.2)
+        on_sent()
+        await asyncio.sleep(0.01)
+        return "primary"
+
+    async def backup(on_sent):
+        on_sent()
+        return "backup"
+
+    hedger = Hedger(min_delay=0.05, min_samples=0)
+    assert asyncio.run(hedger.run(queued, backup)) == ("primary", False)
+    assert hedger.hedges == 0 and hedger.latencies.quantile(0.5) < 0.1
+
+    # the latencies are shared with the other clients of the model
+    other = make_client(make_aclient(), hedge_requests=True, hedge_min_samples=1)
+    [key] = LatencyTracker._registry
+    assert other.hedger.delay(key) is not None
+
+
+# uptrain.operators.language.llm_batch
+class InMemoryBatchTransport(BatchTransport):
+    """Completes every batch on its second poll. The first answer for prompt 1 is
+    invalid, prompt 2 always errors."""
+
+    def __init__(self, aclient):
+        self.aclient = aclient
+        self.batches = {}
+        self.polls = 0
+
+    async def submit(self, requests):
+        batch_id = f"batch_{len(self.batches)}"
+        self.batches[batch_id] = requests
+        return batch_id
+
+    async def status(self, batch_id):
+        self.polls += 1
+        return "completed" if self.polls % 2 == 0 else "in_progress"
+
+    async def results(self, batch_id):
+        lines = []
+        for request in self.batches[batch_id]:
+            prompt = request["body"]["messages"][0]["content"]
+            if prompt == "prompt 2":
+                error = {"message": "bad request"}
+                lines.append({"custom_id": request["custom_id"], "response": None, "error": error})
+                continue
+            choice = "X" if prompt == "prompt 1" and len(self.batches) == 1 else "A"
+            body = self.aclient.completion(json.dumps({"Choice": choice})).model_dump(mode="json")
+            response = {"status_code": 200, "body": body}
+            lines.append({"custom_id": request["custom_id"], "response": response, "error": None})
+        return lines
+
+    async def cancel(self, batch_id):
+        self.batches.pop(batch_id, None)
+
+
+def test_batch_execution_mode(make_aclient, make_settings):
+    aclient = make_aclient()
+    transport = InMemoryBatchTransport(aclient)
+    client = LLMMulticlient(
+        make_settings(batch_poll_interval=0.01), aclient=aclient, batch_transport=transport
+    )
+    outputs = list(
+        client.iter_responses(prompts(client, 4), validate_func=lambda res: res["Choice"] == "A")
+    )
+    assert [res.metadata["index"] for res in outputs] == [0, 1, 2, 3]
+    assert len(transport.batches) == 2 and len(transport.batches["batch_1"]) == 1
+    assert outputs[1].error is None and outputs[1].metadata["batch_id"] == "batch_1"
+    assert outputs[2].response is None and "bad request" in outputs[2].error
+    assert client.last_run_usage.requests == 4
+
+
+# uptrain.operators.language.llm_stats
+def test_request_stats(make_aclient, make_settings, rate_limit_error):
+    raised = []
+
+    def flaky(**kwargs):
+        if not raised:
+            raised.append(kwargs)
+            raise rate_limit_error("0.01")
+        return '{"Choice": "A"}'
+
+    # slow enough for the identical prompts to be in flight at the same time, whichever
+    # order the payloads start in
+    aclient = make_aclient(respond=flaky, usage=(100, 20), delay=0.05)
+    client = LLMMulticlient(make_settings(), aclient=aclient, operator_name="TestOperator")
+    client._rpm_limit, client._tpm_limit = 10_000, 10_000_000
+    payloads = [client.make_payload(idx, f"prompt {idx % 3}") for idx in range(4)]
+    outputs, stats = client.fetch_responses(payloads, return_stats=True)
+    assert len(outputs) == 4
+
+    summary = stats.dict()
+    assert summary["payloads"] == 4 and summary["coalesced"] == 1
+    assert summary["attempts"] == 4 and summary["retries"] == 1
+    assert summary["latency_seconds"]["count"] == 4
+    assert summary["prompt_tokens"]["sum"] == 300
+    assert summary["retry_sleep_seconds"]["sum"] > 0
+
+    assert STATS_REGISTRY.dict()["TestOperator"]["payloads"] >= 4
+    metrics = STATS_REGISTRY.to_openmetrics()
+    assert 'uptrain_llm_payloads_total{operator="TestOperator"}' in metrics
+    assert 'uptrain_llm_latency_seconds_bucket{operator="TestOperator",le="+Inf"} ' in metrics
+    assert metrics.endswith("# EOF\n")
+
+    # served to local connections only, unless asked otherwise
+    server = start_metrics_server(port=0)
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        assert "TestOperator" in httpx.get(f"http://{host}:{port}/metrics").text
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# uptrain.operators.language.llm_journal
+def test_response_journal_resume(make_aclient, make_client, tmp_path):
+    def crash_on_prompt_3(messages, **kwargs):
+        if "prompt 3" in messages[0]["content"]:
+            raise ValueError("crashed")
+        return '{"Choice": "A"}'
+
+    fpath = str(tmp_path / "journal.jsonl")
+    journal = ResponseJournal(fpath)
+    with journal_session(journal):
+        client = make_client(make_aclient(respond=crash_on_prompt_3), retry_max_attempts=1)
+        client.fetch_responses(prompts(client, 5))
+    journal.close()
+    assert journal.recorded == 4
+    # a write torn by the crash
+    with open(fpath, "a") as f:
+        f.write('{"operator": "default", "ha')
+
+    aclient = make_aclient()
+    journal = ResponseJournal(fpath, resume=True)
+    assert len(journal) == 4
+    with journal_session(journal):
+        client = make_client(aclient)
+        outputs = client.fetch_responses(prompts(client, 5))
+    assert len(aclient.calls) == 1
+    assert "prompt 3" in aclient.calls[0]["messages"][0]["content"]
+    assert all(res.error is None for res in outputs)
+    assert sum(bool(res.metadata.get("replayed")) for res in outputs) == 4
+    assert client.last_run_stats.counters["replayed"] == 4
+    journal.close(remove=True)
+    assert not os.path.exists(fpath)
+
+
+# tests/mock_llm_server.py
+def test_mock_llm_server(make_settings):
+    from mock_llm_server import MockLLMServer, make_grading_content
+    from uptrain.operators.language.prompts.output_format import (
+        CONTEXT_RELEVANCE_OUTPUT_FORMAT__COT,
+        FACT_EVALUATE_OUTPUT_FORMAT__COT,
+        LANGUAGE_CRITIQUE_FLUENCY_OUTPUT_FORMAT__CLASSIFY,
+    )
+
+    marker = "Return the output only in the corresponding JSON format:\n"
+    content = json.loads(make_grading_content(marker + CONTEXT_RELEVANCE_OUTPUT_FORMAT__COT))
+    assert set(content) == {"Reasoning", "Choice"} and content["Choice"] in "ABC"
+    content = json.loads(make_grading_content(marker + FACT_EVALUATE_OUTPUT_FORMAT__COT))
+    assert all(row["Judgement"] in ("yes", "unclear", "no") for row in content["Result"])
+    content = json.loads(
+        make_grading_content(marker + LANGUAGE_CRITIQUE_FLUENCY_OUTPUT_FORMAT__CLASSIFY)
+    )
+    assert content["Score"] in range(1, 6)
+    assert make_grading_content("prompt") == make_grading_content("prompt")
+
+    with MockLLMServer(latency="fixed", latency_mean=0.01, error_rate=0.3) as mock:
+        settings = make_settings(
+            retry_base_delay=0.01,
+            llm_endpoints=[{"api_key": "sk-mock", "base_url": mock.base_url}],
+        )
+        client = LLMMulticlient(settings)
+        prompt = marker + CONTEXT_RELEVANCE_OUTPUT_FORMAT__COT
+        outputs = client.fetch_responses(
+            [client.make_payload(idx, f"{idx}\n{prompt}") for idx in range(20)]
+        )
+    assert all(res.error is None for res in outputs)
+    assert mock.requests > 20 and mock.errors > 0
+    assert all(
+        json.loads(res.response.choices[0].message.content)["Choice"] in "ABC"
+        for res in outputs
+    )
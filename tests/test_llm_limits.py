@@ -0,0 +1,236 @@
+import asyncio
+import time
+
+import httpx
+import openai
+
+from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm_cost import (
+    capture_payloads,
+    cost_budget,
+    get_model_price,
+)
+from uptrain.operators.language.llm_ratelimit import RateLimiter, parse_duration
+from uptrain.operators.language.llm_retry import (
+    CircuitBreaker,
+    ResponseValidationError,
+    RetryPolicy,
+)
+from uptrain.operators.language.llm_scheduler import SchedulingSession
+
+
+# uptrain.operators.language.llm_ratelimit
+def test_adaptive_rate_limiter():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == 0.02
+
+    # the configured limits are a ceiling for those sent by the server
+    limiter = RateLimiter(rpm_limit=100, tpm_limit=90_000, adaptive=True)
+    limiter.record_success(
+        {"x-ratelimit-limit-requests": "10000", "x-ratelimit-limit-tokens": "20000"}
+    )
+    assert limiter.rpm_limit == 100 and limiter.tpm_limit == 20_000
+    limiter.configure(50, 90_000)
+    limiter.record_success(
+        {"x-ratelimit-limit-requests": "10000", "x-ratelimit-limit-tokens": "2000000"}
+    )
+    assert limiter.rpm_limit == 50 and limiter.tpm_limit == 90_000
+    limiter.configure(200, 200_000)
+    assert limiter.rpm_limit == 200 and limiter.tpm_limit == 200_000
+
+    concurrency = limiter.concurrency
+    limiter.record_rate_limited({})
+    limiter.record_rate_limited({})  # within the cooldown, counts once
+    assert limiter.concurrency == concurrency / 2
+
+    async def run_requests():
+        async def one():
+            await limiter.acquire(10)
+            await asyncio.sleep(0.01)
+            limiter.release()
+            limiter.record_success()
+
+        await asyncio.gather(*[one() for _ in range(50)])
+
+    asyncio.run(run_requests())
+    assert limiter.in_flight == 0
+    assert limiter.concurrency > concurrency / 2
+
+
+# uptrain.operators.language.llm_scheduler
+def test_shared_limiters_and_priorities(make_aclient, make_client, make_settings):
+    # clients of the same API key or client object share a limiter
+    settings = make_settings(openai_api_key="sk-shared")
+    first, second = LLMMulticlient(settings), LLMMulticlient(settings)
+    assert first.endpoints.endpoints[0].limiter is second.endpoints.endpoints[0].limiter
+    aclient = make_aclient()
+    first, second = make_client(aclient), make_client(aclient)
+    assert first.endpoints.endpoints[0].limiter is second.endpoints.endpoints[0].limiter
+    other = make_client()
+    assert other.endpoints.endpoints[0].limiter is not first.endpoints.endpoints[0].limiter
+    first = make_client(aclient, share_rate_limits=False)
+    assert first.endpoints.endpoints[0].limiter is not second.endpoints.endpoints[0].limiter
+
+    # the latest configuration of the clients sharing a limiter applies
+    limiter = LLMMulticlient(settings).endpoints.endpoints[0].limiter
+    assert not limiter.adaptive  # opt-in
+    rpm_limit, tpm_limit = limiter.rpm_limit, limiter.tpm_limit
+    lower = LLMMulticlient(
+        make_settings(openai_api_key="sk-shared", rpm_limit=rpm_limit / 2, max_concurrency=8)
+    )
+    assert lower.endpoints.endpoints[0].limiter is limiter
+    assert (limiter.rpm_limit, limiter.tpm_limit) == (rpm_limit / 2, tpm_limit)
+    assert limiter.max_concurrency == 8
+    higher = LLMMulticlient(settings)
+    assert higher.endpoints.endpoints[0].limiter.rpm_limit == rpm_limit
+    assert limiter.max_concurrency == settings.max_concurrency
+
+    async def admission_order():
+        limiter = RateLimiter(
+            10_000, 10_000_000, adaptive=True, initial_concurrency=1, max_concurrency=1
+        )
+        bulk_a = SchedulingSession("bulk", name="a")
+        bulk_b = SchedulingSession("bulk", name="b")
+        interactive = SchedulingSession("interactive", name="i")
+        order = []
+
+        async def one(session):
+            await limiter.acquire(1, session)
+            order.append(session.name)
+            await asyncio.sleep(0)
+            limiter.release()
+
+        # hold the only slot, so that all requests queue up
+        await limiter.acquire(1)
+        tasks = [asyncio.ensure_future(one(bulk_a)) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(one(bulk_b)) for _ in range(2)]
+        tasks += [asyncio.ensure_future(one(interactive)) for _ in range(2)]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    # interactive requests first, then the bulk sessions share the slot fairly
+    assert asyncio.run(admission_order()) == ["i", "i", "a", "b", "a", "b", "a", "a"]
+
+
+# uptrain.operators.language.llm_retry
+def test_retry_policy(make_aclient, make_client, rate_limit_error):
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    assert policy.classify(rate_limit_error()) == "rate_limit"
+    assert policy.classify(ResponseValidationError()) == "validation"
+    assert policy.classify(ValueError()) is None
+    assert policy.compute_delay(rate_limit_error("2"), 0) == 2.0
+    assert policy.compute_delay(rate_limit_error("3600"), 0) == 4.0
+    assert RetryPolicy().max_attempts == 4
+    assert all(0 <= policy.compute_delay(TimeoutError(), 10) <= 4.0 for _ in range(20))
+
+    def rate_limited_twice(**kwargs):
+        if len(aclient.calls) <= 2:
+            raise rate_limit_error()
+        return '{"Choice": "A"}'
+
+    aclient = make_aclient(respond=rate_limited_twice)
+    client = make_client(aclient)
+    start = time.perf_counter()
+    [res] = client.fetch_responses([client.make_payload(0, "prompt")])
+    assert res.error is None and len(aclient.calls) == 3
+    assert time.perf_counter() - start < 5
+
+    aclient = make_aclient(respond=rate_limited_twice)
+    client = make_client(aclient, retry_budgets={"rate_limit": 1})
+    [res] = client.fetch_responses([client.make_payload(0, "prompt")])
+    assert res.error is not None and len(aclient.calls) == 2
+
+
+def test_circuit_breaker(make_aclient, make_client):
+    down = True
+
+    def unavailable(**kwargs):
+        if down:
+            request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+            raise openai.InternalServerError(
+                "Service unavailable",
+                response=httpx.Response(503, request=request),
+                body=None,
+            )
+        return '{"Choice": "A"}'
+
+    aclient = make_aclient(respond=unavailable)
+    client = make_client(
+        aclient,
+        retry_base_delay=0.5,
+        circuit_breaker_threshold=3,
+        circuit_breaker_reset_timeout=0.2,
+    )
+    client.endpoints.endpoints[0].failure_threshold = 1000
+    start = time.perf_counter()
+    outputs = client.fetch_responses(
+        [client.make_payload(idx, f"prompt {idx}") for idx in range(20)]
+    )
+    assert time.perf_counter() - start < 2
+    assert all(res.error is not None for res in outputs)
+    assert len(aclient.calls) < 40
+
+    # keyed by the provider, base url and model, not the client object
+    breaker = CircuitBreaker.get("FakeAsyncClient:default:gpt-3.5-turbo", 3, 0.2)
+    assert breaker.state == "open"
+    time.sleep(0.25)
+    assert breaker.state == "half_open"
+    down = False
+    outputs = client.fetch_responses(
+        [client.make_payload(idx, f"again {idx}") for idx in range(3)]
+    )
+    assert breaker.state == "closed"
+    assert sum(res.error is None for res in outputs) >= 1
+
+    # off by default, and clients with other settings update the shared breaker
+    assert make_client(aclient).retry_policy.get_circuit_breaker("any") is None
+    client = make_client(aclient, circuit_breaker_threshold=10)
+    assert client.retry_policy.get_circuit_breaker(breaker.name) is breaker
+    assert breaker.failure_threshold == 10 and breaker.reset_timeout == 30.0
+
+
+# uptrain.operators.language.llm_cost
+def test_cost_budget_and_estimate(make_aclient, make_client):
+    assert get_model_price("gpt-4-0613") == (30.0, 60.0)
+    assert get_model_price("azure/gpt-4o-mini-2024-07-18") == (0.15, 0.6)
+    assert get_model_price("some-local-model") is None
+
+    # every response costs $10, over the budget after the second one
+    aclient = make_aclient()
+    prices = {"gpt-3.5-turbo": [1_000_000, 0]}
+    client = make_client(aclient, max_cost=15.0, model_prices=prices)
+    for idx in range(2):
+        [output] = client.fetch_responses([client.make_payload(idx, f"prompt {idx}")])
+        assert output.error is None
+    assert client.cost_tracker.spent == 20.0
+    outputs = client.fetch_responses(
+        [client.make_payload(idx, f"prompt {idx}") for idx in range(2, 5)]
+    )
+    assert len(aclient.calls) == 2
+    assert all("budget" in output.error for output in outputs)
+
+    # a budget block is shared by all clients in it
+    aclient = make_aclient()
+    with cost_budget(15.0, prices) as tracker:
+        for idx in range(3):
+            client = make_client(aclient)
+            client.fetch_responses([client.make_payload(idx, f"prompt {idx}")])
+    assert len(aclient.calls) == 2 and tracker.spent == 20.0
+
+    # dry run, nothing is sent
+    aclient = make_aclient()
+    client = make_client(aclient)
+    with capture_payloads() as capture:
+        outputs = client.fetch_responses(
+            [client.make_payload(idx, f"prompt {idx}") for idx in range(4)]
+        )
+    assert not aclient.calls
+    assert all(output.response is None for output in outputs)
+    estimate = capture.estimate(prices)
+    assert estimate.total_requests == 4
+    assert estimate.models["gpt-3.5-turbo"].prompt_tokens > 0
+    assert estimate.operators["default"].requests == 4
+    assert estimate.total_cost == estimate.models["gpt-3.5-turbo"].prompt_tokens
@@ -30,6 +30,29 @@ def test_concept_drift():
         print("Counter:", output["alert_info"]["counter"])
 
 
+# uptrain.operators.io
+def test_batched_text_readers():
+    import polars as pl
+    from uptrain.operators import CsvReader, JsonReader
+
+    for reader_cls, fname, batch_size in [
+        (CsvReader, "data/predictions.csv", 4),
+        (JsonReader, "data/qna_on_docs_samples.jsonl", 32),
+    ]:
+        fpath = os.path.join(SELF_DIR, fname)
+        full = reader_cls(fpath=fpath).setup(SETTINGS).run()["output"]
+
+        # Read the same file in batches, until the reader is exhausted
+        reader = reader_cls(fpath=fpath, batch_size=batch_size).setup(SETTINGS)
+        batches = []
+        while (batch := reader.run()["output"]) is not None:
+            batches.append(batch)
+
+        assert reader.is_incremental
+        assert len(batches) == -(-len(full) // batch_size)
+        assert pl.concat(batches, how="diagonal_relaxed").equals(full)
+
+
 # uptrain.operators.language.embedding
 def test_embedding():
     import polars as pl
@@ -391,3 +414,187 @@ def test_text_comparison_operator():
 
     # Print the comparison results
     print(comparison)
+
+
+# uptrain.operators.language.llm_pack
+def test_packed_grading(make_aclient, make_client):
+    import json
+    import re
+    from uptrain.operators.language.context_quality import ContextRelevance
+    from uptrain.operators.language.llm_pack import make_packs, split_prompt
+
+    def grade_items(messages, **kwargs):
+        items = re.findall(
+            r"^\[Item (\d+)\]\n\[Query\]: (.*)$", messages[0]["content"], re.MULTILINE
+        )
+        if not items:
+            return '{"Choice": "B"}'
+        # the grade of the query about row 3 is garbled when packed
+        results = [
+            {"Item": int(num), "Choice": "Z" if "row 3" in query else "A"}
+            for num, query in items
+        ]
+        return json.dumps({"Results": results})
+
+    aclient = make_aclient(respond=grade_items)
+    settings_kwargs = {"eval_type": "basic", "grading_pack_size": 4}
+    op = ContextRelevance().setup(Settings(openai_api_key="sk-test", **settings_kwargs))
+    op._api_client = make_client(aclient, **settings_kwargs)
+    rows = [{"question": f"What about row {idx}?", "context": f"Row {idx}."} for idx in range(6)]
+    results = op.evaluate_local(rows)
+
+    # a pack of 4 and one of 2, then row 3 alone
+    assert len(aclient.calls) == 3
+    assert [res["score_context_relevance"] for res in results] == [1.0] * 3 + [0.5] + [1.0] * 2
+    packed_prompt = aclient.calls[0]["messages"][0]["content"]
+    assert packed_prompt.count("[Item ") == 4 and packed_prompt.count("Example Data.") == 1
+    assert "[Item " not in aclient.calls[2]["messages"][0]["content"]
+
+    # only payloads of the same template and request parameters share a pack
+    client = make_client()
+    payloads = [
+        client.make_payload(0, "Grade.\nTask Data.\n[Query]: a\n[Output]:\n"),
+        client.make_payload(1, "Grade.\nTask Data.\n[Query]: b\n[Output]:\n"),
+        client.make_payload(2, "Grade.\nTask Data.\n[Query]: c\n[Output]:\n", temperature=0.5),
+        client.make_payload(3, "No template"),
+    ]
+    assert split_prompt(payloads[0].data["messages"][0]["content"]) == ("Grade.", "[Query]: a")
+    packs, singles = make_packs(payloads, 4)
+    assert [pack.metadata["pack"] for pack, _ in packs] == [[0, 1]]
+    assert sorted(payload.metadata["index"] for payload in singles) == [2, 3]
+
+
+# uptrain.operators.language.llm
+def test_responses_are_parsed_once(make_client, monkeypatch):
+    from uptrain.operators.language import llm
+    from uptrain.operators.language.context_quality import ContextRelevance
+
+    assert llm.parse_json('Output: {"Choice": "A"}') == {"Choice": "A"}
+    # models sometimes return JSON5, e.g. unquoted keys and trailing commas
+    assert llm.parse_json("{Choice: 'B',}") == {"Choice": "B"}
+
+    calls = []
+    parse_json = llm.parse_json
+
+    def counting_parse_json(json_str):
+        calls.append(json_str)
+        return parse_json(json_str)
+
+    monkeypatch.setattr(llm, "parse_json", counting_parse_json)
+    op = ContextRelevance().setup(Settings(openai_api_key="sk-test"))
+    op._api_client = make_client()
+    rows = [{"question": f"Question {idx}?", "context": "Context."} for idx in range(5)]
+    results = op.evaluate_local(rows)
+    assert [res["score_context_relevance"] for res in results] == [1.0] * 5
+    # once for the validation function and the scores together
+    assert len(calls) == 5
+
+
+# uptrain.operators.language.llm_context
+def test_context_window_fitting(make_aclient, make_client):
+    import json
+    from uptrain.operators.language.context_quality import ContextRelevance
+    from uptrain.operators.language.llm_context import get_context_window
+    from uptrain.operators.language.llm_tokens import count_message_tokens
+
+    assert get_context_window("azure/gpt-4-32k-0613") == 32_768
+    assert get_context_window("gpt-4-0125-preview") == 128_000
+    assert get_context_window("gpt-3.5-turbo-0301") == 4_096
+    assert get_context_window("gpt-3.5-turbo-0125") == 16_385
+    assert get_context_window("my-model", {"my-model": 1000}) == 1000
+    assert get_context_window("my-model") is None
+
+    def find_needle(messages, **kwargs):
+        found = "NEEDLE" in messages[0]["content"].split("Task Data.")[-1]
+        return json.dumps({"Choice": "A" if found else "C"})
+
+    windows = {"gpt-3.5-turbo": 1500}
+    context = "filler " * 1500 + "NEEDLE " + "filler " * 1500
+
+    def run_context_relevance(aclient, **settings_kwargs):
+        settings_kwargs = {"eval_type": "basic", "context_windows": windows, **settings_kwargs}
+        op = ContextRelevance().setup(Settings(openai_api_key="sk-test", **settings_kwargs))
+        op._api_client = make_client(aclient, **settings_kwargs)
+        rows = [{"question": "Where is the needle?", "context": context}]
+        return op.evaluate_local(rows)[0]["score_context_relevance"]
+
+    # chunks are graded separately, the one with the needle wins
+    aclient = make_aclient(respond=find_needle)
+    assert run_context_relevance(aclient, context_overflow="chunk") == 1.0
+    assert len(aclient.calls) > 1
+    assert all(
+        count_message_tokens(call["messages"], "gpt-3.5-turbo") <= 1500 - 256
+        for call in aclient.calls
+    )
+
+    # the truncated context loses the needle
+    aclient = make_aclient(respond=find_needle)
+    assert run_context_relevance(aclient, context_overflow="truncate") == 0.0
+    assert len(aclient.calls) == 1
+    assert count_message_tokens(aclient.calls[0]["messages"], "gpt-3.5-turbo") <= 1500 - 256
+
+    # prompts without a context to cut are routed to a larger model
+    aclient = make_aclient()
+    client = make_client(aclient, context_overflow="truncate", context_windows=windows)
+    client.fetch_responses([client.make_payload(0, context)])
+    assert aclient.calls[0]["model"] == "gpt-3.5-turbo-16k"
+
+    # by default, prompts are sent as they are
+    aclient = make_aclient()
+    client = make_client(aclient, context_windows=windows)
+    client.fetch_responses([client.make_payload(0, context)])
+    assert aclient.calls[0]["model"] == "gpt-3.5-turbo"
+
+
+# uptrain.operators.base
+def test_operator_arun(make_aclient, make_client):
+    import asyncio
+    import json
+    import threading
+    import polars as pl
+    from uptrain.operators.language.context_quality import ContextRelevance
+    from uptrain.operators.language.factual_accuracy import ResponseFactualScore
+
+    def grade_facts(messages, **kwargs):
+        prompt = messages[0]["content"]
+        if "[Facts]:" in prompt:
+            result = [
+                {"Fact": fact, "Reasoning": "ok", "Judgement": "yes"}
+                for fact in ["A fact.", "Another fact."]
+            ]
+            return json.dumps({"Result": result})
+        if "independent facts" in prompt:
+            return json.dumps({"Facts": ["A fact.", "Another fact."]})
+        return '{"Choice": "A", "Reasoning": "ok"}'
+
+    data = pl.DataFrame(
+        {
+            "question": [f"Question {idx}?" for idx in range(4)],
+            "context": ["Context."] * 4,
+            "response": ["Response."] * 4,
+        }
+    )
+
+    def make_op(op_cls, aclient):
+        op = op_cls().setup(Settings(openai_api_key="sk-test"))
+        op._api_client = make_client(aclient)
+        return op
+
+    # factual accuracy requests the facts of the responses, then grades them
+    for op_cls, col in [
+        (ContextRelevance, "score_context_relevance"),
+        (ResponseFactualScore, "score_factual_accuracy"),
+    ]:
+        sync_client = make_aclient(respond=grade_facts)
+        async_client = make_aclient(respond=grade_facts)
+        expected = make_op(op_cls, sync_client).run(data)["output"]
+
+        async def main():
+            return threading.get_ident(), await make_op(op_cls, async_client).arun(data)
+
+        loop_thread, output = asyncio.run(main())
+        assert output["output"][col].to_list() == expected[col].to_list() == [1.0] * 4
+        assert len(async_client.calls) == len(sync_client.calls)
+        # awaited on the loop of the caller, not on the background loop of `run`
+        assert async_client.threads == {loop_thread}
+        assert sync_client.threads != {threading.get_ident()}
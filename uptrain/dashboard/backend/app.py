@@ -673,6 +673,7 @@ async def find_common_topic(
     settings_data = {}
     settings_data["model"] = args.model
     settings_data["uptrain_local_url"] = os.environ["UPTRAIN_LOCAL_URL"]
+    settings_data["request_priority"] = "interactive"
     settings_data.update(args.metadata[args.model])
 
     try:
@@ -735,6 +736,7 @@ async def create_project(
     settings_data = {}
     settings_data["model"] = model
     settings_data["uptrain_local_url"] = os.environ["UPTRAIN_LOCAL_URL"]
+    settings_data["request_priority"] = "interactive"
     settings_data.update(metadata[model])
 
     if "exp_column" in metadata:
@@ -813,6 +815,7 @@ async def new_run(
     settings_data = {}
     settings_data["model"] = model
     settings_data["uptrain_local_url"] = os.environ["UPTRAIN_LOCAL_URL"]
+    settings_data["request_priority"] = "interactive"
     settings_data.update(metadata[model])
 
     if "exp_column" in metadata:
@@ -896,6 +899,7 @@ async def add_default_run(
     settings_data = {}
     settings_data["model"] = eval_args.model
     settings_data["uptrain_local_url"] = os.environ["UPTRAIN_LOCAL_URL"]
+    settings_data["request_priority"] = "interactive"
     settings_data.update(metadata[eval_args.model])
 
     if "exp_column" in metadata:
@@ -980,6 +984,7 @@ async def add_prompts(
     settings_data = {}
     settings_data["model"] = model
     settings_data["uptrain_local_url"] = os.environ["UPTRAIN_LOCAL_URL"]
+    settings_data["request_priority"] = "interactive"
     settings_data.update(metadata[model])
     prompt_id = get_uuid()
 
@@ -1121,6 +1126,7 @@ async def add_default_prompt(
     settings_data = {}
     settings_data["model"] = eval_args.model
     settings_data["uptrain_local_url"] = os.environ["UPTRAIN_LOCAL_URL"]
+    settings_data["request_priority"] = "interactive"
     settings_data.update(metadata[eval_args.model])
 
 
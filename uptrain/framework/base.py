@@ -34,10 +34,92 @@ class Settings(BaseSettings):
         response_format: Response format for evaluations.
         evaluate_locally: Flag for local evaluation.
         eval_type: Type of evaluation.
+        grading_pack_size: Number of rows graded in one request by the classify evals (eval_type basic),
+            which then share the instructions and few-shot examples of the prompt. 1 disables packing.
 
         # Rate limits
         rpm_limit: "Requests Per Minute" limit for the API.
         tpm_limit: "Tokens Per Minute" limit for the API.
+        adaptive_rate_limit: Flag to adapt the rate limits to the `x-ratelimit-*` headers sent by the API, never
+            above `rpm_limit`/`tpm_limit`, and to grow/shrink the number of concurrent requests (up to
+            `max_concurrency`) based on successes and 429s. Off by default, requests are then paced by
+            `rpm_limit`/`tpm_limit` alone.
+        max_concurrency: Maximum number of concurrent requests when the rate limit is adaptive.
+        max_in_flight: Maximum number of payloads held in memory by streaming fetches (`iter_responses`),
+            which then pull payloads lazily and drop their copies of the prompts once answered. None schedules all of them
+            up front, unless the payloads come from an iterator.
+        share_rate_limits: Flag to share one rate limiter between all operators using the same API key,
+            so that operators running concurrently or back to back don't overshoot the quota together. The limits
+            and flags of the most recently created operator apply to the shared limiter.
+        request_priority: Priority class of the LLM requests of an evaluation: interactive, default or bulk.
+            Higher classes are admitted first, and concurrent evaluations of a class share the rate limits
+            fairly. None means default for `EvalLLM.evaluate` and bulk for `CheckSet.run`.
+        check_concurrency: Number of checks `EvalLLM.evaluate` runs at the same time, so that the requests of
+            all of them share the rate limits and the evaluation takes about as long as its slowest check.
+            1 runs the checks one after another.
+
+        # Retries
+        retry_max_attempts: Maximum number of attempts for a request, including the first one.
+        retry_base_delay: Backoff delay in seconds before the first retry, doubled for every retry after.
+        retry_max_delay: Cap on the delay before a retry in seconds, also when the API asks for a longer one through `Retry-After`.
+        retry_deadline: Seconds after the start of a run beyond which failed requests aren't retried. None means no deadline.
+        retry_budgets: Maximum number of retries per error class (rate_limit, timeout, connection, server, validation).
+        circuit_breaker_threshold: Consecutive timeouts, connection or server errors from a provider after which
+            requests to it fail fast, until a probe request succeeds. 0 (the default) disables the circuit breaker.
+        circuit_breaker_reset_timeout: Seconds after which a tripped circuit breaker sends a probe request.
+        fallback_model: Model to send requests to (through litellm) while the circuit breaker of their provider
+            is open, instead of failing them. Needs `circuit_breaker_threshold` to be set.
+
+        # Response cache
+        response_cache: Flag to cache LLM responses on disk and reuse them across runs.
+        response_cache_path: Path of the cache database. Defaults to a file in the logs folder.
+        response_cache_ttl: Seconds after which a cached response expires. None means never.
+        response_cache_max_size_mb: Size limit of the cache, least recently used entries are evicted first.
+        response_cache_bypass: Flag to skip cache lookups while still refreshing the stored responses.
+        coalesce_requests: Flag to send identical requests that are in flight at the same time only once.
+
+        # Endpoints
+        llm_endpoints: API keys or deployments to spread the requests over, each a dict with the keys
+            provider (openai, azure or litellm), api_key, base_url, api_version, model, rpm_limit, tpm_limit,
+            weight and name. Requests go to the least loaded healthy endpoint. Empty means a single endpoint
+            configured by the settings above.
+
+        # Batch execution
+        execution_mode: How LLM requests are sent, "online" for the regular API or "batch" for the provider's
+            batch API, which is cheaper but can take up to 24 hours. Batch is supported for OpenAI and Azure.
+        batch_poll_interval: Seconds between status checks of a submitted batch.
+
+        # Hedged requests
+        hedge_requests: Flag to send a backup request when a request is slower than usual, keeping the first response.
+        hedge_quantile: Quantile of the observed latencies after which a backup request is sent.
+        hedge_budget: Maximum number of backup requests, as a fraction of all requests. An operator may always send one.
+        hedge_min_delay: Minimum number of seconds to wait for a request before sending a backup.
+        hedge_min_samples: Number of latencies to observe for a model before hedging its requests. The latencies
+            are shared by all operators of the process. 0 hedges from the first request, after `hedge_min_delay`.
+
+        # Context windows
+        context_overflow: What to do with prompts that don't fit the context window of the model, checked
+            before sending them: truncate the context, grade it in chunks (for the evals that allow it), or
+            route the request to a model with a larger context window. None (the default) sends prompts as they
+            are, without counting their tokens.
+        context_windows: Context window in tokens per model (prefix), on top of the built-in table.
+
+        # Costs
+        max_cost: Budget in USD for the LLM requests of an evaluation (or of an operator run outside one).
+            Once spent, the remaining requests are cancelled and partial results returned. None means no limit.
+        model_prices: Prices in USD per million prompt and completion tokens, as `{model: [prompt, completion]}`,
+            for models missing from (or priced differently than) the built-in table.
+
+        # Checkpointing
+        journal_responses: Flag to journal the LLM responses of `EvalLLM.evaluate` to the logs folder as they
+            complete, so that an interrupted evaluation can be resumed with `resume=True`. The journal is
+            deleted once the evaluation completes. Off by default, as it keeps the responses on disk.
+        result_store_path: Path of the database of graded rows, reused by `EvalLLM.evaluate` with
+            `incremental=True`. Defaults to a file in the logs folder.
+
+        # HTTP connections
+        http_keepalive_connections: Maximum number of idle connections kept open to an API, for reuse across calls.
+        http_keepalive_expiry: Seconds after which an idle connection is closed.
 
         # UpTrain managed service
         uptrain_access_token: Access token for Uptrain API.
@@ -87,10 +169,65 @@ class Settings(BaseSettings):
     # cot -> We will use chain of thought prompting to evaluate and get the grade
     # basic -> We will simply prompt the LLM to return the grade without any reasoning
     eval_type: t.Literal["basic", "cot"] = "cot"
+    grading_pack_size: int = 1
 
     # Rate limits
     rpm_limit: int = 100
     tpm_limit: int = 90_000
+    adaptive_rate_limit: bool = False
+    max_concurrency: int = 256
+    max_in_flight: t.Optional[int] = None
+    share_rate_limits: bool = True
+    request_priority: t.Optional[t.Literal["interactive", "default", "bulk"]] = None
+    check_concurrency: int = 1
+
+    # Retries
+    retry_max_attempts: int = 4
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 60.0
+    retry_deadline: t.Optional[float] = None
+    retry_budgets: dict[str, int] = Field(default_factory=dict)
+    circuit_breaker_threshold: int = 0
+    circuit_breaker_reset_timeout: float = 30.0
+    fallback_model: t.Optional[str] = None
+
+    # Response cache
+    response_cache: bool = False
+    response_cache_path: t.Optional[str] = None
+    response_cache_ttl: t.Optional[float] = None
+    response_cache_max_size_mb: float = 512
+    response_cache_bypass: bool = False
+    coalesce_requests: bool = True
+
+    # Endpoints
+    llm_endpoints: list[dict] = Field(default_factory=list)
+
+    # Batch execution
+    execution_mode: t.Literal["online", "batch"] = "online"
+    batch_poll_interval: float = 30.0
+
+    # Hedged requests
+    hedge_requests: bool = False
+    hedge_quantile: float = 0.95
+    hedge_budget: float = 0.05
+    hedge_min_delay: float = 0.5
+    hedge_min_samples: int = 20
+
+    # Context windows
+    context_overflow: t.Optional[t.Literal["truncate", "chunk", "route"]] = None
+    context_windows: dict[str, int] = Field(default_factory=dict)
+
+    # Costs
+    max_cost: t.Optional[float] = None
+    model_prices: dict[str, list[float]] = Field(default_factory=dict)
+
+    # Checkpointing
+    journal_responses: bool = False
+    result_store_path: t.Optional[str] = None
+
+    # HTTP connections
+    http_keepalive_connections: int = 64
+    http_keepalive_expiry: float = 60.0
 
     # UpTrain managed service
     uptrain_access_token: t.Optional[str] = Field(
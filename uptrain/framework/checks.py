@@ -18,6 +18,7 @@ from uptrain.operators.base import (
 )
 from uptrain.utilities import jsonload, jsondump, to_py_types, clear_directory
 from uptrain.framework.base import OperatorDAG, Settings
+from uptrain.operators.language.llm_scheduler import scheduling_session
 
 __all__ = ["Check", "CheckSet", "ExperimentArgs"]
 
@@ -180,18 +181,20 @@ class CheckSet:
         logger.info("CheckSet Status: Preprocessing Done")
 
         consolidated_output = {}
-        for check in self.checks:
-            logger.info(f"CheckSet Status: Check {check.name} Started")
-            check_output = check.run(source_output)
-            assert check_output is not None, f"Output of check {check.name} is None"
-            self._get_sink_for_check(self._settings, check).run(check_output)
-            logger.info(f"CheckSet Status: Check {check.name} Completed")
-
-            if len(self.postprocessors):
-                if not all(isinstance(op, ColumnOp) for op in check.operators):
-                    continue
-                for col in check_output.columns:
-                    consolidated_output[col] = check_output[col]
+        # offline runs yield the rate limits to interactive evaluations
+        with scheduling_session(self._settings.request_priority or "bulk", name="checkset"):
+            for check in self.checks:
+                logger.info(f"CheckSet Status: Check {check.name} Started")
+                check_output = check.run(source_output)
+                assert check_output is not None, f"Output of check {check.name} is None"
+                self._get_sink_for_check(self._settings, check).run(check_output)
+                logger.info(f"CheckSet Status: Check {check.name} Completed")
+
+                if len(self.postprocessors):
+                    if not all(isinstance(op, ColumnOp) for op in check.operators):
+                        continue
+                    for col in check_output.columns:
+                        consolidated_output[col] = check_output[col]
         logger.info("CheckSet Status: All Checks Completed")
 
         if len(self.postprocessors):
@@ -3,6 +3,7 @@ This module implements a simple LLM wrapper that can be used to evaluate perform
 of LLM applications. 
 """
 
+import asyncio
 import typing as t
 from datetime import datetime
 from loguru import logger
@@ -10,14 +11,19 @@ import httpx
 import polars as pl
 import pandas as pd
 import pydantic
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
 import copy
 import os
 import httpx
-from uptrain.operators.base import ColumnOp
+from uptrain.operators.base import ColumnOp, adrive_steps, drive_steps
 from uptrain.utilities.utils import parse_prompt, check_openai_api_key
 from uptrain.framework.remote import APIClientWithoutAuth, DataSchema
 from uptrain.framework.base import Settings
 from uptrain.framework.checks import Check
+from uptrain.framework.result_store import ResultStore, row_fingerprints
 from uptrain.framework.evals import (
     Evals,
     JailbreakDetection,
@@ -59,7 +65,18 @@ from uptrain.operators import (
 )
 
 from uptrain.framework.rca_templates import RcaTemplate
-from uptrain.operators import RagWithCitation
+from uptrain.operators.language.llm_cache import canonical_hash
+from uptrain.operators.language.llm_cost import (
+    CostEstimate,
+    CostTracker,
+    capture_payloads,
+    cost_budget,
+    get_cost_tracker,
+    get_payload_capture,
+)
+from uptrain.operators.language.llm_journal import ResponseJournal, journal_session
+from uptrain.operators.language.llm_scheduler import scheduling_session
+from uptrain.operators import RagWithCitation, CsvReader, JsonReader, DeltaReader
 
 RCA_TEMPLATE_TO_OPERATOR_MAPPING = {RcaTemplate.RAG_WITH_CITATION: RagWithCitation()}
 
@@ -99,6 +116,170 @@ def get_uuid():
     import uuid
     return str(uuid.uuid4().hex)
 
+
+def _rows_to_frame(rows: list[dict]) -> pl.DataFrame:
+    # rows from the server may not all have the same keys
+    return pl.from_dicts(rows, infer_schema_length=None)
+
+
+def _as_rows(data: t.Union[list[dict], pl.DataFrame]) -> list[dict]:
+    return data.to_dicts() if isinstance(data, pl.DataFrame) else data
+
+
+def _is_local_check(check: t.Any, ser_check: dict) -> bool:
+    """Whether a check is run by a local operator, rather than on the UpTrain server."""
+    if isinstance(check, ParametricEval) and ser_check["check_name"] in PARAMETRIC_EVAL_TO_OPERATOR_MAPPING:
+        return True
+    if isinstance(check, Evals) and check in EVAL_TO_OPERATOR_MAPPING:
+        return True
+    return isinstance(check, (ColumnOp, list))
+
+
+def _iter_chunks(
+    source: t.Any, chunk_size: int, settings: Settings
+) -> t.Iterator[t.Union[list[dict], pl.DataFrame, pd.DataFrame]]:
+    """Split the source of `EvalLLM.evaluate_stream` into chunks of at most
+    `chunk_size` rows, reading it only as the chunks are consumed."""
+    if isinstance(source, (CsvReader, JsonReader, DeltaReader)):
+        reader = source.setup(settings)
+        while True:
+            batch = reader.run()["output"]
+            if batch is None:
+                return
+            yield from _iter_chunks(batch, chunk_size, settings)
+            if not reader.is_incremental:
+                return
+    elif isinstance(source, (pl.DataFrame, pd.DataFrame)):
+        for start in range(0, len(source), chunk_size):
+            yield source[start : start + chunk_size]
+    else:
+        rows = []
+        for item in source:
+            if isinstance(item, (pl.DataFrame, pd.DataFrame)):
+                if rows:
+                    yield rows
+                    rows = []
+                yield from _iter_chunks(item, chunk_size, settings)
+                continue
+            rows.append(item)
+            if len(rows) == chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def _is_graded(result: dict) -> bool:
+    """Whether a row got a score from a check, rows that errored have none."""
+    scores = [value for key, value in result.items() if key.startswith("score")]
+    return not scores or any(value is not None for value in scores)
+
+
+def _merge_outputs(
+    data: t.Union[list[dict], pl.DataFrame],
+    outputs: list[t.Union[list[dict], pl.DataFrame, None]],
+) -> t.Union[list[dict], pl.DataFrame]:
+    """The data along with the result columns of every check, in order. Rows (of
+    checks graded on the server) are merged as they are, without a DataFrame."""
+    if not isinstance(data, pl.DataFrame):
+        results = [dict(row) for row in data]
+        for res in outputs:
+            for row, res_row in zip(results, res or []):
+                row.update(res_row)
+        return results
+    results = data
+    for res in outputs:
+        if res is None:
+            continue
+        # a later check overwrites the columns of the same name, the others are
+        # shared with the check output without copying
+        results = results.with_columns(res.get_columns())
+    return results
+
+
+class _LocalRun(t.NamedTuple):
+    """The local run of the checks of an evaluation, yielded from
+    `EvalLLM._evaluation_steps`."""
+
+    evaluator: "EvalLLM"
+    args: tuple
+
+    def fetch(self) -> pl.DataFrame:
+        return self.evaluator._evaluate_locally(*self.args)
+
+    async def afetch(self) -> pl.DataFrame:
+        return await self.evaluator._aevaluate_locally(*self.args)
+
+
+class _ProjectDataPost(t.NamedTuple):
+    """The request logging the results of an evaluation to the local dashboard,
+    yielded from `EvalLLM._evaluation_steps`."""
+
+    evaluator: "EvalLLM"
+    args: tuple
+
+    def _client_kwargs(self) -> dict:
+        return {
+            "headers": {"uptrain-access-token": "default_key"},
+            "timeout": httpx.Timeout(7200, connect=5),
+        }
+
+    def fetch(self) -> None:
+        try:
+            url, body = self.evaluator._project_data_request(*self.args)
+            with httpx.Client(**self._client_kwargs()) as client:
+                client.post(url, json=body)
+        except Exception:
+            logger.info("Local server not running, start the server to log data and visualize in the dashboard!")
+
+    async def afetch(self) -> None:
+        try:
+            url, body = self.evaluator._project_data_request(*self.args)
+            async with httpx.AsyncClient(**self._client_kwargs()) as client:
+                await client.post(url, json=body)
+        except Exception:
+            logger.info("Local server not running, start the server to log data and visualize in the dashboard!")
+
+
+def _required_attributes(check: t.Any, schema: DataSchema) -> set[str]:
+    """Attributes of a row that a check reads, empty if unknown."""
+    if check in [Evals.SUB_QUERY_COMPLETENESS]:
+        return {schema.sub_questions, schema.question}
+    elif check in [Evals.CONTEXT_CONCISENESS]:
+        return {schema.question, schema.context, schema.concise_context}
+    elif check in [Evals.CONTEXT_RERANKING]:
+        return {schema.question, schema.context, schema.reranked_context}
+    elif check in [
+        Evals.FACTUAL_ACCURACY,
+        Evals.RESPONSE_COMPLETENESS_WRT_CONTEXT,
+        Evals.RESPONSE_CONSISTENCY,
+        Evals.CODE_HALLUCINATION,
+    ]:
+        return {schema.question, schema.context, schema.response}
+    elif check in [
+        Evals.RESPONSE_RELEVANCE,
+        Evals.VALID_RESPONSE,
+        Evals.RESPONSE_COMPLETENESS,
+        Evals.RESPONSE_CONCISENESS,
+    ]:
+        return {schema.question, schema.response}
+    elif check in [Evals.CONTEXT_RELEVANCE]:
+        return {schema.question, schema.context}
+    elif (
+        check in [Evals.CRITIQUE_LANGUAGE]
+        or isinstance(check, CritiqueTone)
+        or isinstance(check, GuidelineAdherence)
+    ):
+        return {schema.response}
+    elif isinstance(check, ResponseMatching):
+        return {schema.question, schema.response, schema.ground_truth}
+    elif isinstance(check, t.Union[ConversationSatisfaction, ConversationGuidelineAdherence, ConversationNumberOfTurns, QueryResolution]):
+        return {schema.conversation}
+    elif check in [Evals.PROMPT_INJECTION] or isinstance(check, JailbreakDetection):
+        return {schema.question}
+    return set()
+
+
 class EvalLLM:
     def __init__(self, settings: Settings = None, openai_api_key: str = None) -> None:
         if (openai_api_key is None) and (settings is None):
@@ -196,6 +377,9 @@ class EvalLLM:
         scenario_description: t.Optional[str] = None,
         schema: t.Union[DataSchema, dict[str, str], None] = None,
         metadata: t.Optional[dict[str, str]] = None,
+        resume: bool = False,
+        return_dataframe: bool = False,
+        incremental: bool = False,
     ):
         """Run an evaluation on the UpTrain server using user's openai keys.
         NOTE: This api doesn't log any data.
@@ -206,25 +390,370 @@ class EvalLLM:
             checks: List of checks to evaluate on.
             schema: Schema of the data. Only required if the data attributes aren't typical (question, response, context).
             metadata: Attributes to attach to this dataset. Useful for filtering and grouping in the UI.
+            resume: Replay the LLM responses journaled by an earlier, interrupted run of the same
+                evaluation (same data, checks and model) with `Settings.journal_responses` on, and
+                only send the missing requests. The resumed run is journaled too, in case it gets
+                interrupted again.
+            return_dataframe: Return the results as a Polars DataFrame, which skips converting
+                every row to a dictionary.
+            incremental: Reuse the results of rows graded by earlier evaluations, and only grade
+                the new or changed rows. A row is regraded by a check when an attribute the check
+                reads (as per the schema), the check, the model or the eval type changes. Results
+                are kept in `Settings.result_store_path`.
         Returns:
-            results: List of dictionaries with each data point and corresponding evaluation results.
+            results: List of dictionaries with each data point and corresponding evaluation results,
+                or a Polars DataFrame with `return_dataframe`.
+        """
+        return drive_steps(
+            self._evaluation_steps(
+                data,
+                checks,
+                project_name,
+                evaluation_name,
+                scenario_description,
+                schema,
+                metadata,
+                resume,
+                return_dataframe,
+                incremental,
+            )
+        )
+
+    async def aevaluate(
+        self,
+        data: t.Union[list[dict], pl.DataFrame, pd.DataFrame],
+        checks: list[t.Union[str, Evals, ParametricEval]],
+        project_name: str = "Project - " + str(datetime.utcnow()),
+        evaluation_name: t.Optional[str] = None,
+        scenario_description: t.Optional[str] = None,
+        schema: t.Union[DataSchema, dict[str, str], None] = None,
+        metadata: t.Optional[dict[str, str]] = None,
+        resume: bool = False,
+        return_dataframe: bool = False,
+        incremental: bool = False,
+    ):
+        """Async version of `evaluate`, to be awaited from a running event loop (e.g. a
+        notebook, or a web server) instead of blocking it.
+
+        The LLM calls of the checks are awaited on the running loop, `check_concurrency`
+        checks at a time. Checks run by operators that don't call an LLM themselves
+        (custom operators, lists of operators), and evaluations on the UpTrain server,
+        still run synchronously on the loop.
+
+        Takes the same arguments as `evaluate`, and returns the same results.
         """
+        return await adrive_steps(
+            self._evaluation_steps(
+                data,
+                checks,
+                project_name,
+                evaluation_name,
+                scenario_description,
+                schema,
+                metadata,
+                resume,
+                return_dataframe,
+                incremental,
+            )
+        )
+
+    def _evaluation_steps(
+        self,
+        data,
+        checks,
+        project_name,
+        evaluation_name,
+        scenario_description,
+        schema,
+        metadata,
+        resume,
+        return_dataframe,
+        incremental,
+        chunk_index=None,
+    ):
+        """`evaluate` as a generator (see `ColumnOp.run_steps`), which yields the local
+        run of the checks and the request logging the results to the dashboard, for
+        `evaluate` to run and `aevaluate` to await. `chunk_index` is the position of
+        the data in the stream of `evaluate_stream`."""
         if evaluation_name is None:
             evaluation_name = "Eval - " + str(datetime.utcnow())
         
+        if metadata is None:
+            metadata = {}
+
+        data, checks, ser_checks, schema = self._prepare_checks(
+            data, checks, scenario_description, schema
+        )
+        server_checks = copy.deepcopy(ser_checks)
+        if incremental and not self.settings.evaluate_locally:
+            raise ValueError("Incremental evaluations are only supported locally")
+        if self.settings.evaluate_locally:
+            # the result store fingerprints the rows of a DataFrame
+            data = self._local_data(data, checks, ser_checks, force_frame=incremental)
+            with self._local_evaluation(
+                data, server_checks, evaluation_name, resume, incremental, chunk_index
+            ) as store:
+                results = yield _LocalRun(
+                    self, (data, checks, ser_checks, scenario_description, schema, store)
+                )
+        else:
+            results = self.evaluate_on_server(_as_rows(data), ser_checks, schema)
+        ## local server calls
+        yield _ProjectDataPost(
+            self,
+            (data, results, server_checks, metadata, schema, project_name, evaluation_name),
+        )
+        if not isinstance(results, pl.DataFrame):
+            return _rows_to_frame(results) if return_dataframe else results
+        if return_dataframe:
+            return results
+        return results.to_dicts()
+
+    @staticmethod
+    def _local_data(data, checks, ser_checks, force_frame=False):
+        """The data as a DataFrame, as the operators of local checks take it. Left as
+        rows if all the checks are graded on the server."""
         if isinstance(data, pl.DataFrame):
-            data = data.to_dicts()
-        elif isinstance(data, pd.DataFrame):
-            data = data.to_dict(orient="records")
+            return data
+        if force_frame or any(
+            _is_local_check(check, ser_checks[idx]) for idx, check in enumerate(checks)
+        ):
+            return pl.DataFrame(data)
+        return data
+
+    @contextlib.contextmanager
+    def _local_evaluation(
+        self, data, server_checks, evaluation_name, resume, incremental, chunk_index=None
+    ):
+        """Sessions of a local evaluation: the response journal, cost budget and
+        scheduling. Yields the result store of an incremental evaluation, else None."""
+        session_name = evaluation_name
+        if chunk_index is not None:
+            session_name = f"{evaluation_name} [chunk {chunk_index}]"
+        journal = None
+        if resume or self.settings.journal_responses:
+            fingerprint = {
+                # unlike `hash_rows`, stable across polars versions and processes
+                "data": _as_rows(data),
+                "checks": server_checks,
+                "model": self.settings.model,
+                "eval_type": self.settings.eval_type,
+            }
+            if chunk_index is not None:
+                # chunks of a stream can hold the same rows, and run at the same time
+                fingerprint["chunk"] = chunk_index
+            fingerprint = canonical_hash(fingerprint)
+            journal = ResponseJournal.for_run(self.settings, fingerprint, resume)
+        store = ResultStore.from_settings(self.settings) if incremental else None
+        try:
+            # within a budget already (see `evaluate_stream`), spend from it
+            with cost_budget(
+                self.settings.max_cost,
+                self.settings.model_prices,
+                tracker=get_cost_tracker(),
+            ) as tracker, journal_session(journal), scheduling_session(
+                self.settings.request_priority or "default", name=session_name
+            ):
+                yield store
+        except BaseException:
+            if journal is not None:
+                journal.close()
+                logger.info(
+                    f"Evaluation interrupted, {len(journal)} LLM responses are journaled. "
+                    "Run it again with `resume=True` to pick up from there."
+                )
+            raise
+        finally:
+            if store is not None:
+                store.close()
+        if journal is not None:
+            journal.close(remove=True)
+        logger.info(f"Spent ${tracker.spent:.4f} on LLM requests")
+
+    def _project_data_request(
+        self, data, results, server_checks, metadata, schema, project_name, evaluation_name
+    ):
+        """URL and body of the request logging the results to the local dashboard."""
+        if isinstance(results, pl.DataFrame):
+            sink_columns = [
+                pl.Series("row_uuid", [get_uuid() for _ in range(results.height)])
+            ]
+            for key_dict in results.columns:
+                if "confidence" in key_dict:
+                    sink_columns.append(
+                        results[key_dict].alias(
+                            "score_confidence" + "_" + key_dict.split("confidence_")[-1]
+                        )
+                    )
+                if key_dict.startswith("score") and "confidence" not in key_dict:
+                    sink_columns.append(
+                        pl.repeat("not updated", results.height, eager=True).alias(
+                            "status_" + key_dict
+                        )
+                    )
+            sink_data = results.with_columns(sink_columns).to_dicts()
+        else:
+            sink_data = copy.deepcopy(results)
+            for data_point in sink_data:
+                data_point["row_uuid"] = get_uuid()
+                for key_dict in list(data_point.keys()):
+                    if "confidence" in key_dict:
+                        data_point["score_confidence" + "_" + key_dict.split("confidence_")[-1]] = data_point[key_dict]
+                    if key_dict.startswith("score") and "confidence" not in key_dict:
+                        data_point["status_" + key_dict] = "not updated"
+
+        url = self.settings.uptrain_local_url + "/api/public/add_project_data"
+        body = {
+            "data": _as_rows(data),
+            "sink_data": sink_data,
+            "checks": server_checks,
+            "metadata": metadata,
+            "schema_dict": schema.model_dump(),
+            "project": project_name,
+            "evaluation": evaluation_name,
+            "exp_column": None if metadata.get("uptrain_experiment_columns", None) is None else metadata.get("uptrain_experiment_columns", None)[0]
+        }
+        return url, body
+
+    def evaluate_stream(
+        self,
+        source: t.Union[
+            t.Iterable[t.Union[dict, pl.DataFrame, pd.DataFrame]],
+            pl.DataFrame,
+            pd.DataFrame,
+            CsvReader,
+            JsonReader,
+            DeltaReader,
+        ],
+        checks: list[t.Union[str, Evals, ParametricEval]],
+        chunk_size: int = 1000,
+        project_name: str = "Project - " + str(datetime.utcnow()),
+        evaluation_name: t.Optional[str] = None,
+        scenario_description: t.Optional[str] = None,
+        schema: t.Union[DataSchema, dict[str, str], None] = None,
+        metadata: t.Optional[dict[str, str]] = None,
+        resume: bool = False,
+        return_dataframe: bool = False,
+        incremental: bool = False,
+    ) -> t.Iterator[t.Union[list[dict], pl.DataFrame]]:
+        """Run an evaluation chunk by chunk, yielding the results of every chunk as soon
+        as it is graded, so datasets larger than memory can be evaluated.
+
+        Every chunk is evaluated like `evaluate`, and logged to the dashboard under the
+        same evaluation name. Each chunk has its own response journal and scheduling
+        session though. While the results of a chunk are processed by the caller, the
+        LLM calls of the next chunk are already in flight. At most two chunks are held
+        in memory at a time.
+
+        When the caller stops early (or a chunk fails), the chunk being graded at the
+        time is not waited on: it finishes in the background, and its results, which
+        count towards `max_cost`, are dropped.
+
+        Args:
+            source: Data to evaluate on. An iterator of dicts (or of DataFrames), a
+                DataFrame, or a reader - `CsvReader`/`JsonReader` read `batch_size` rows
+                at a time, and `DeltaReader` a record batch at a time with `batch_split`.
+            checks: List of checks to evaluate on.
+            chunk_size: Maximum number of rows per chunk. Batches of a reader larger than
+                this are split.
+            Other arguments are the same as for `evaluate`, and apply to every chunk.
+        Returns:
+            results: Iterator over the results of the chunks, in order, as lists of
+                dictionaries or Polars DataFrames with `return_dataframe`.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+        if evaluation_name is None:
+            evaluation_name = "Eval - " + str(datetime.utcnow())
+
+        # `max_cost` is for the whole stream, not every chunk
+        tracker = CostTracker(self.settings.max_cost, self.settings.model_prices)
+
+        def evaluate_chunk(chunk_index, chunk):
+            with cost_budget(None, tracker=tracker):
+                return drive_steps(
+                    self._evaluation_steps(
+                        chunk,
+                        checks,
+                        project_name,
+                        evaluation_name,
+                        scenario_description,
+                        schema,
+                        metadata,
+                        resume,
+                        return_dataframe,
+                        incremental,
+                        chunk_index=chunk_index,
+                    )
+                )
+
+        # the next chunk is read and submitted before waiting on the current one
+        pending = collections.deque()
+        pool = concurrent.futures.ThreadPoolExecutor(2)
+        try:
+            for chunk_index, chunk in enumerate(
+                _iter_chunks(source, chunk_size, self.settings)
+            ):
+                pending.append(
+                    pool.submit(
+                        contextvars.copy_context().run, evaluate_chunk, chunk_index, chunk
+                    )
+                )
+                if len(pending) > 1:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # if the caller stopped early or a chunk failed, the chunk being graded
+            # can't be cancelled, don't wait on it
+            pool.shutdown(wait=not pending, cancel_futures=True)
+
+    def estimate_cost(
+        self,
+        data: t.Union[list[dict], pl.DataFrame, pd.DataFrame],
+        checks: list[t.Union[str, Evals, ParametricEval]],
+        scenario_description: t.Optional[str] = None,
+        schema: t.Union[DataSchema, dict[str, str], None] = None,
+    ) -> CostEstimate:
+        """Estimate the tokens and cost of evaluating the checks, without sending any
+        request to the LLM. Takes the same arguments as `evaluate`.
+
+        The prompts are rendered by the same operators as in `evaluate`, and counted
+        per model. Cached responses are not counted, since they are free.
+
+        Returns:
+            estimate: Requests, prompt and completion tokens, and cost per model and per
+                operator, see `CostEstimate.total_cost`.
+        """
+        if not self.settings.evaluate_locally:
+            raise ValueError("Costs can only be estimated for local evaluations")
+        data, checks, ser_checks, schema = self._prepare_checks(
+            data, checks, scenario_description, schema
+        )
+        data = self._local_data(data, checks, ser_checks)
+        # operators don't log the missing responses of a dry run as errors
+        with capture_payloads() as capture:
+            self._evaluate_locally(data, checks, ser_checks, scenario_description, schema)
+        return capture.estimate(
+            self.settings.model_prices,
+            batch=self.settings.execution_mode == "batch",
+        )
+
+    def _prepare_checks(self, data, checks, scenario_description, schema):
+        """Normalize the data (into a Polars DataFrame or a list of rows), checks and
+        schema of an evaluation, and serialize the checks. Raises if a row misses an
+        attribute required by the checks."""
+        rows = None
+        if isinstance(data, pd.DataFrame):
+            data = rows = data.to_dict(orient="records")
+        elif not isinstance(data, pl.DataFrame):
+            rows = data
 
         if schema is None:
             schema = DataSchema()
         elif isinstance(schema, dict):
             schema = DataSchema(**schema)
 
-        if metadata is None:
-            metadata = {}
-
         checks = [Evals(m) if isinstance(m, str) else m for m in checks]
         for m in checks:
             assert isinstance(m, (Evals, ParametricEval, ColumnOp, list))
@@ -234,46 +763,7 @@ class EvalLLM:
 
         req_attrs, ser_checks = set(), []
         for idx, m in enumerate(checks):
-            if m in [Evals.SUB_QUERY_COMPLETENESS]:
-                req_attrs.update([schema.sub_questions, schema.question])
-            elif m in [Evals.CONTEXT_CONCISENESS]:
-                req_attrs.update(
-                    [schema.question, schema.context, schema.concise_context]
-                )
-            elif m in [Evals.CONTEXT_RERANKING]:
-                req_attrs.update(
-                    [schema.question, schema.context, schema.reranked_context]
-                )
-            elif m in [
-                Evals.FACTUAL_ACCURACY,
-                Evals.RESPONSE_COMPLETENESS_WRT_CONTEXT,
-                Evals.RESPONSE_CONSISTENCY,
-                Evals.CODE_HALLUCINATION,
-            ]:
-                req_attrs.update([schema.question, schema.context, schema.response])
-            elif m in [
-                Evals.RESPONSE_RELEVANCE,
-                Evals.VALID_RESPONSE,
-                Evals.RESPONSE_COMPLETENESS,
-                Evals.RESPONSE_CONCISENESS,
-            ]:
-                req_attrs.update([schema.question, schema.response])
-            elif m in [Evals.CONTEXT_RELEVANCE]:
-                req_attrs.update([schema.question, schema.context])
-            elif (
-                m in [Evals.CRITIQUE_LANGUAGE]
-                or isinstance(m, CritiqueTone)
-                or isinstance(m, GuidelineAdherence)
-            ):
-                req_attrs.update([schema.response])
-            elif isinstance(m, ResponseMatching):
-                req_attrs.update(
-                    [schema.question, schema.response, schema.ground_truth]
-                )
-            elif isinstance(m, t.Union[ConversationSatisfaction, ConversationGuidelineAdherence, ConversationNumberOfTurns, QueryResolution]):
-                req_attrs.update([schema.conversation])
-            elif m in [Evals.PROMPT_INJECTION] or isinstance(m, JailbreakDetection):
-                req_attrs.update([schema.question])
+            req_attrs.update(_required_attributes(m, schema))
 
             this_scenario_description = (
                 scenario_description
@@ -296,94 +786,160 @@ class EvalLLM:
             else:
                 raise ValueError(f"Invalid metric: {m}")
 
-        for idx, row in enumerate(data):
-            if not req_attrs.issubset(row.keys()):
+        # the columns of a DataFrame are there for all rows, unlike the keys of dicts
+        for idx, row in enumerate(rows if rows is not None else [data.columns]):
+            if not req_attrs.issubset(row):
                 raise ValueError(
                     f"Row {idx} is missing required all required attributes for evaluation: {req_attrs}"
                 )
-        server_checks = copy.deepcopy(ser_checks)
-        if self.settings.evaluate_locally:
-            results = copy.deepcopy(data)
-            for idx, check in enumerate(checks):
-                if (
-                    isinstance(check, ParametricEval)
-                    and ser_checks[idx]["check_name"]
-                    in PARAMETRIC_EVAL_TO_OPERATOR_MAPPING
-                ):
-                    # Use the check_name field to get the operator and remove it from ser_checks
-                    op = PARAMETRIC_EVAL_TO_OPERATOR_MAPPING[
-                        ser_checks[idx].pop("check_name")
-                    ](**ser_checks[idx])
-                    res = (
-                        op.setup(self.settings)
-                        .run(pl.DataFrame(data))["output"]
-                        .to_dicts()
-                    )
-                elif isinstance(check, Evals) and check in EVAL_TO_OPERATOR_MAPPING:
-                    op = EVAL_TO_OPERATOR_MAPPING[check]
-                    op.scenario_description = (
-                        scenario_description
-                        if not isinstance(scenario_description, list)
-                        else scenario_description[idx]
-                    )
-                    res = (
-                        op.setup(self.settings)
-                        .run(pl.DataFrame(data))["output"]
-                        .to_dicts()
-                    )
-                elif isinstance(check, ColumnOp):
-                    op = Check(name = "dummy", operators = [check])
-                    res = (
-                        op.setup(self.settings)
-                        .run(pl.DataFrame(data))
-                    ).to_dicts()
-                elif isinstance(check, list):
-                    op = Check(name = "dummy", operators = check)
-                    res = (
-                        op.setup(self.settings)
-                        .run(pl.DataFrame(data))
-                    ).to_dicts()
-                else:
-                    res = self.evaluate_on_server(data, [ser_checks[idx]], schema)
-                for idx, row in enumerate(res):
-                    results[idx].update(row)
+        return data, checks, ser_checks, schema
+
+    def _evaluate_locally(
+        self, data, checks, ser_checks, scenario_description, schema, store=None
+    ):
+        """Run the checks on the data (a DataFrame, or rows if all checks are graded
+        on the server), returning the data along with the result columns of every
+        check. With a result store, only the rows missing from it are graded."""
+        args = self._check_args(data, checks, ser_checks, scenario_description, schema, store)
+        concurrency = min(self.settings.check_concurrency, len(checks))
+        if concurrency > 1:
+            # the operators block on the shared event loop, so their requests all go
+            # out together, under the shared rate limiters
+            with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_check, *arg)
+                    for arg in args
+                ]
+                try:
+                    outputs = [future.result() for future in futures]
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
         else:
-            results = self.evaluate_on_server(data, ser_checks, schema)
-        ## local server calls
-        try:
-            client = httpx.Client(
-                headers={"uptrain-access-token": "default_key"},
-                timeout=httpx.Timeout(7200, connect=5),
+            outputs = [self._run_check(*arg) for arg in args]
+        return _merge_outputs(data, outputs)
+
+    async def _aevaluate_locally(
+        self, data, checks, ser_checks, scenario_description, schema, store=None
+    ):
+        """Async version of `_evaluate_locally`, runs the checks as tasks of the
+        running loop."""
+        args = self._check_args(data, checks, ser_checks, scenario_description, schema, store)
+        semaphore = asyncio.Semaphore(max(1, self.settings.check_concurrency))
+
+        async def run_check(*arg):
+            async with semaphore:
+                return await adrive_steps(self._check_steps(*arg))
+
+        outputs = await asyncio.gather(*[run_check(*arg) for arg in args])
+        return _merge_outputs(data, outputs)
+
+    def _check_args(self, data, checks, ser_checks, scenario_description, schema, store):
+        return [
+            (store, idx, check, data, ser_checks, scenario_description, schema)
+            for idx, check in enumerate(checks)
+        ]
+
+    def _run_check(self, store, idx, check, data, ser_checks, scenario_description, schema):
+        """Run a check on the data, returning the DataFrame it outputs, None if it
+        has nothing to run. With a result store, only the rows missing from it are
+        graded."""
+        return drive_steps(
+            self._check_steps(
+                store, idx, check, data, ser_checks, scenario_description, schema
             )
+        )
 
-            sink_data = copy.deepcopy(results)
-            for idx, data_point in enumerate(sink_data):
-                row_uuid= get_uuid()
-                data_point["row_uuid"] = row_uuid
-                for key_dict in list(data_point.keys()):
-                    if "confidence" in key_dict:
-                        data_point['score_confidence' + '_' + key_dict.split("confidence_")[-1]] = data_point[key_dict]
-                    if key_dict.startswith("score") and "confidence" not in key_dict:
-                        data_point["status_" + key_dict] = "not updated"
+    def _check_steps(
+        self, store, idx, check, data, ser_checks, scenario_description, schema
+    ):
+        """`_run_check` as a generator of LLM requests (see `ColumnOp.run_steps`)."""
+        if store is not None:
+            return (
+                yield from self._check_steps_incremental(
+                    store, idx, check, data, ser_checks, scenario_description, schema
+                )
+            )
+        if (
+            isinstance(check, ParametricEval)
+            and ser_checks[idx]["check_name"]
+            in PARAMETRIC_EVAL_TO_OPERATOR_MAPPING
+        ):
+            # Use the check_name field to get the operator, without changing ser_checks,
+            # which is shared by the checks running at the same time
+            ser_check = ser_checks[idx]
+            op = PARAMETRIC_EVAL_TO_OPERATOR_MAPPING[ser_check["check_name"]](
+                **{k: v for k, v in ser_check.items() if k != "check_name"}
+            )
+            res = (yield from op.setup(self.settings).run_steps(data))["output"]
+        elif isinstance(check, Evals) and check in EVAL_TO_OPERATOR_MAPPING:
+            # a copy, as the operators of the mapping are shared between runs
+            op = copy.copy(EVAL_TO_OPERATOR_MAPPING[check])
+            op.scenario_description = (
+                scenario_description
+                if not isinstance(scenario_description, list)
+                else scenario_description[idx]
+            )
+            res = (yield from op.setup(self.settings).run_steps(data))["output"]
+        elif isinstance(check, ColumnOp):
+            op = Check(name = "dummy", operators = [check])
+            res = op.setup(self.settings).run(data)
+        elif isinstance(check, list):
+            op = Check(name = "dummy", operators = check)
+            res = op.setup(self.settings).run(data)
+        elif get_payload_capture() is not None:
+            # graded on the server, there are no LLM calls to estimate
+            return None
+        else:
+            res = self.evaluate_on_server(_as_rows(data), [ser_checks[idx]], schema)
+            if isinstance(data, pl.DataFrame):
+                # only the result columns, the data columns are there already
+                res = _rows_to_frame(
+                    [
+                        {key: value for key, value in row.items() if key not in data.columns}
+                        for row in res
+                    ]
+                )
+        return res
 
-            url = self.settings.uptrain_local_url + "/api/public/add_project_data"
-            response = client.post(
-                url,
-                json={
-                    "data": data,
-                    "sink_data": sink_data,
-                    "checks": server_checks,
-                    "metadata": metadata,
-                    "schema_dict": schema.model_dump(),
-                    "project": project_name,
-                    "evaluation": evaluation_name,
-                    "exp_column": None if metadata.get("uptrain_experiment_columns", None) is None else metadata.get("uptrain_experiment_columns", None)[0]
-                },
+    def _check_steps_incremental(
+        self, store, idx, check, data, ser_checks, scenario_description, schema
+    ):
+        """Run a check on the rows of the data missing from the result store, returning
+        the result columns of all the rows."""
+        fields = sorted(_required_attributes(check, schema)) or data.columns
+        config = {
+            "check": ser_checks[idx],
+            "model": self.settings.model,
+            "eval_type": self.settings.eval_type,
+        }
+        if isinstance(check, list):
+            # lists of operators are all serialized as the same dummy check
+            config["operators"] = [
+                {"op_name": op.__class__.__name__, **op.model_dump()} for op in check
+            ]
+        keys = row_fingerprints(data, fields, config)
+        results = store.get_many(keys)
+        missing = [row_idx for row_idx, key in enumerate(keys) if key not in results]
+        logger.info(
+            f"Reusing the stored results of {len(keys) - len(missing)} of {len(keys)} rows "
+            f"for check {ser_checks[idx]['check_name']}"
+        )
+        if missing:
+            res = yield from self._check_steps(
+                None, idx, check, data[missing], ser_checks, scenario_description, schema
             )
-        except Exception:
-            #user_id = "default_key"
-            logger.info("Local server not running, start the server to log data and visualize in the dashboard!")
-        return results
+            if res is None:
+                return None
+            graded = res.select(
+                [col for col in res.columns if col not in data.columns]
+            ).to_dicts()
+            graded = {keys[row_idx]: row for row_idx, row in zip(missing, graded)}
+            # rows that failed to grade are graded again next time
+            store.set_many({key: row for key, row in graded.items() if _is_graded(row)})
+            results.update(graded)
+        return _rows_to_frame([results[key] for key in keys])
 
     def evaluate_on_server(self, data, ser_checks, schema):
         # send in chunks of 50, so the connection doesn't time out waiting for the server
@@ -423,6 +979,7 @@ class EvalLLM:
         evaluation_name: t.Optional[str] = None,
         schema: t.Union[DataSchema, dict[str, str], None] = None,
         metadata: t.Optional[dict[str, t.Any]] = None,
+        incremental: bool = False,
     ):
         """Evaluate experiments on the given data.
 
@@ -433,6 +990,7 @@ class EvalLLM:
             exp_columns: List of columns/keys which denote different experiment configurations.
             schema: Schema of the data. Only required if the data attributes aren't typical (question, response, context).
             metadata: Attributes to attach to this dataset. Useful for filtering and grouping in the UI.
+            incremental: Only grade the rows not graded by earlier evaluations, see `evaluate`.
 
         Returns:
             results: List of dictionaries with each data point and corresponding evaluation results for all the experiments.
@@ -456,6 +1014,7 @@ class EvalLLM:
             checks=checks,
             schema=schema,
             metadata=metadata,
+            incremental=incremental,
         )
 
         results = pl.DataFrame(results)
@@ -0,0 +1,114 @@
+"""
+Local store of the results of `EvalLLM.evaluate` per row and check, so that an
+incremental evaluation only grades the rows it hasn't graded before.
+"""
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing as t
+
+import polars as pl
+from loguru import logger
+
+from uptrain.operators.language.llm_cache import canonical_hash
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+# keys per query, below the limit of sqlite on bound parameters
+_QUERY_BATCH = 500
+
+
+def row_fingerprints(data: pl.DataFrame, fields: list[str], config: dict) -> list[str]:
+    """Fingerprint of every row for a check: the fields of the row the check reads,
+    along with the config of the check (and whatever else changes its grades)."""
+    config_hash = canonical_hash(config)
+    return [
+        canonical_hash({"config": config_hash, "row": row})
+        for row in data.select(fields).to_dicts()
+    ]
+
+
+class ResultStore:
+    """A SQLite backed store of the result columns of graded rows, keyed on their
+    fingerprints (see `row_fingerprints`).
+
+    Attributes:
+        fpath: Path to the SQLite database file.
+        hits/misses: Counters of the rows found in and missing from the store, for the
+            lifetime of this object.
+    """
+
+    def __init__(self, fpath: str):
+        self.fpath = fpath
+        self.hits = 0
+        self.misses = 0
+
+        dirname = os.path.dirname(fpath)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(fpath, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "ResultStore":
+        fpath = settings.result_store_path
+        if fpath is None:
+            fpath = os.path.join(settings.logs_folder, "eval_results.sqlite")
+        return cls(fpath)
+
+    def get_many(self, keys: t.Sequence[str]) -> dict[str, dict]:
+        """The stored results of the keys found in the store."""
+        unique = list(dict.fromkeys(keys))
+        found: dict[str, dict] = {}
+        with self._lock:
+            for start in range(0, len(unique), _QUERY_BATCH):
+                batch = unique[start : start + _QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, value in rows:
+                    try:
+                        found[key] = json.loads(value)
+                    except ValueError:
+                        logger.warning(f"Skipping a corrupt entry of the result store {key}")
+        self.hits += len(found)
+        self.misses += len(unique) - len(found)
+        return found
+
+    def set_many(self, results: t.Mapping[str, dict]) -> None:
+        now = time.time()
+        rows = [
+            (key, json.dumps(value, default=str), now) for key, value in results.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -18,6 +18,7 @@ if t.TYPE_CHECKING:
 
 __all__ = [
     "TYPE_TABLE_OUTPUT",
+    "TYPE_TABLE_STEPS",
     "Operator",
     "OpBaseModel",
     "ColumnOp",
@@ -26,6 +27,8 @@ __all__ = [
     "register_op",
     "deserialize_operator",
     "get_output_col_name_at",
+    "drive_steps",
+    "adrive_steps",
 ]
 
 # -----------------------------------------------------------
@@ -52,6 +55,10 @@ class TYPE_TABLE_OUTPUT(te.TypedDict):
     extra: te.NotRequired[dict]
 
 
+# see `ColumnOp.run_steps`
+TYPE_TABLE_STEPS = t.Generator[t.Any, t.Any, TYPE_TABLE_OUTPUT]
+
+
 class Operator(t.Protocol):
     """
     All operator implementations must implement this protocol.
@@ -114,6 +121,7 @@ class ColumnOp(OpBaseModel):
     def run(self, *args: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
         """
         Runs the operator on the input dataset, and returns it with new columns added.
+        Operators that call an LLM implement `run_steps` instead, which this drives.
 
         Args:
             data (pl.DataFrame): Zero or one dataframe as input.
@@ -122,7 +130,69 @@ class ColumnOp(OpBaseModel):
             A dictionary with the `output` key set to the computed Table. Any extra
                 information can be put in the `extra` key.
         """
-        raise NotImplementedError
+        if type(self).run_steps is ColumnOp.run_steps:
+            raise NotImplementedError
+        return drive_steps(self.run_steps(*args))
+
+    def run_steps(self, *args: pl.DataFrame) -> TYPE_TABLE_STEPS:
+        """
+        `run` as a generator, for operators that call an LLM. Whenever it needs LLM
+        responses, it yields an `LLMRequest` (see `uptrain.operators.language.llm`)
+        and is sent back the payloads with their responses. Its return value is the
+        output of `run`.
+
+        By default, runs `run` without requesting anything.
+        """
+        return self.run(*args)
+        yield  # makes this a generator
+
+    async def arun(self, *args: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+        """
+        Async version of `run`, which awaits the LLM responses on the running event
+        loop instead of blocking on them. Operators that don't implement `run_steps`
+        just run.
+        """
+        return await adrive_steps(self.run_steps(*args))
+
+    def evaluate_local(self, data: list[dict]) -> list[dict]:
+        """Grades the rows with an LLM, for operators that implement it as the
+        generator `evaluate_local_steps` (see `run_steps`)."""
+        return drive_steps(self.evaluate_local_steps(data))
+
+
+def drive_steps(steps: t.Generator[t.Any, t.Any, t.Any]) -> t.Any:
+    """Runs a generator like `ColumnOp.run_steps` to completion, fetching the
+    requests it yields one after the other. Returns its return value."""
+    try:
+        responses, error = None, None
+        while True:
+            try:
+                request = steps.throw(error) if error else steps.send(responses)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                responses, error = request.fetch(), None
+            except Exception as exc:
+                responses, error = None, exc
+    finally:
+        steps.close()
+
+
+async def adrive_steps(steps: t.Generator[t.Any, t.Any, t.Any]) -> t.Any:
+    """Async version of `drive_steps`, awaits the requests on the running loop."""
+    try:
+        responses, error = None, None
+        while True:
+            try:
+                request = steps.throw(error) if error else steps.send(responses)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                responses, error = await request.afetch(), None
+            except Exception as exc:
+                responses, error = None, exc
+    finally:
+        steps.close()
 
 
 class TransformOp(OpBaseModel):
@@ -3,12 +3,11 @@ Implement operator to detect code in a response.
 """
 
 from __future__ import annotations
-import json
 import typing as t
 
 from loguru import logger
 import polars as pl
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.prompts.classic import (
     CODE_HALLUCINATION_PROMPT_TEMPLATE,
 )
@@ -27,6 +26,7 @@ from uptrain.operators.base import (
     ColumnOp,
     register_op,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 from uptrain.framework.base import Settings
 
@@ -68,12 +68,14 @@ class CodeHallucinationScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -85,7 +87,7 @@ class CodeHallucinationScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate("code_hallucination", data_send)
         except Exception as e:
@@ -112,7 +114,7 @@ class CodeHallucinationScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -156,8 +158,8 @@ class CodeHallucinationScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -170,9 +172,9 @@ class CodeHallucinationScore(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
-                snippet = json.loads(res.response.choices[0].message.content).get(
+                snippet = res.get_output().get(
                     "Snippet", None
                 )
                 output["score_code_hallucination"] = float(score)
@@ -182,9 +184,7 @@ class CodeHallucinationScore(ColumnOp):
                 if snippet:
                     output["code_snippet"] = snippet
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -1,6 +1,8 @@
 """Basic IO operators for reading and writing data from Uptrain."""
 
 from __future__ import annotations
+import io
+import itertools
 import typing as t
 
 import polars as pl
@@ -38,6 +40,10 @@ class CsvReader(TransformOp):
         self._executor = TextReaderExecutor(self)
         return self
 
+    @property
+    def is_incremental(self) -> bool:
+        return self.batch_size is not None
+
     def run(self) -> TYPE_TABLE_OUTPUT:
         return {"output": self._executor.run()}
 
@@ -59,29 +65,39 @@ class JsonReader(TransformOp):
         self._executor = TextReaderExecutor(self)
         return self
 
+    @property
+    def is_incremental(self) -> bool:
+        return self.batch_size is not None
+
     def run(self) -> TYPE_TABLE_OUTPUT:
         return {"output": self._executor.run()}
 
 
 class TextReaderExecutor:
+    """Reads the file of a text reader, all at once or `batch_size` rows per run.
+
+    In batches, the file is streamed instead of loaded in memory. The batches of a csv
+    file are only approximately `batch_size` rows long, as polars parses it in blocks.
+    """
+
     op: t.Union[CsvReader, JsonReader]
-    dataset: pl.DataFrame
+    dataset: t.Optional[pl.DataFrame]
     rows_read: int
 
     def __init__(self, op: t.Union[CsvReader, JsonReader]):
         self.op = op
         self.rows_read = 0
-        if isinstance(self.op, CsvReader):
+        self.dataset = None
+        self._batches: t.Optional[t.Iterator[pl.DataFrame]] = None
+        if self.is_incremental:
+            if isinstance(self.op, CsvReader):
+                self._batches = _iter_csv_batches(self.op.fpath, self.op.batch_size)
+            elif isinstance(self.op, JsonReader):
+                self._batches = _iter_ndjson_batches(self.op.fpath, self.op.batch_size)
+        elif isinstance(self.op, CsvReader):
             self.dataset = pl.read_csv(self.op.fpath)
         elif isinstance(self.op, JsonReader):
-            self.dataset = pl.read_ndjson(self.op.fpath)
-            null_count = self.dataset.null_count().to_dicts()[0]
-            for _, value in null_count.items():
-                if value == self.dataset.shape[0]:
-                    ## read from pandas
-                    pd_df = pd.read_json(self.op.fpath, lines=True)
-                    self.dataset = pl.DataFrame(pd_df)
-                    break
+            self.dataset = _read_ndjson(self.op.fpath)
 
     @property
     def is_incremental(self) -> bool:
@@ -89,17 +105,51 @@ class TextReaderExecutor:
 
     def run(self) -> pl.DataFrame | None:
         if not self.is_incremental:
-            data = self.dataset
-        else:
-            if self.rows_read >= len(self.dataset):
-                data = None
-            else:
-                assert self.op.batch_size is not None
-                self.rows_read += self.op.batch_size
-                data = self.dataset.slice(self.rows_read, self.op.batch_size)
+            return self.dataset
+        assert self._batches is not None
+        data = next(self._batches, None)
+        if data is not None:
+            self.rows_read += len(data)
         return data
 
 
+def _read_ndjson(source: t.Union[str, io.BytesIO]) -> pl.DataFrame:
+    dataset = pl.read_ndjson(source)
+    null_count = dataset.null_count().to_dicts()[0]
+    for _, value in null_count.items():
+        if value == dataset.shape[0]:
+            ## read from pandas
+            if isinstance(source, io.BytesIO):
+                source.seek(0)
+            pd_df = pd.read_json(source, lines=True)
+            return pl.DataFrame(pd_df)
+    return dataset
+
+
+def _iter_ndjson_batches(fpath: str, batch_size: int) -> t.Iterator[pl.DataFrame]:
+    # one record per line, so the file can be cut at any line
+    with open(fpath, "rb") as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if not batch:
+                return
+            yield _read_ndjson(io.BytesIO(b"".join(batch)))
+
+
+def _iter_csv_batches(fpath: str, batch_size: int) -> t.Iterator[pl.DataFrame]:
+    # rows can span several lines within quotes, so leave the splitting to polars
+    if hasattr(pl, "read_csv_batched"):
+        reader = pl.read_csv_batched(fpath, batch_size=batch_size)
+        while True:
+            batches = reader.next_batches(1)
+            if not batches:
+                return
+            yield from batches
+    else:
+        yield from pl.scan_csv(fpath).collect_batches(chunk_size=batch_size)
+
+
 # -----------------------------------------------------------
 # Read from a Delta Table, which uses parquet files under the hood
 # -----------------------------------------------------------
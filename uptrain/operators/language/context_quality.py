@@ -4,7 +4,6 @@ Implement operators to evaluate retrieval quality i.e. quality of the extracted
 
 from __future__ import annotations
 import typing as t
-import json
 
 from loguru import logger
 import polars as pl
@@ -13,9 +12,14 @@ from uptrain.utilities.prompt_utils import parse_scenario_description
 
 if t.TYPE_CHECKING:
     from uptrain.framework import Settings
-from uptrain.operators.base import register_op, ColumnOp, TYPE_TABLE_OUTPUT
+from uptrain.operators.base import (
+    register_op,
+    ColumnOp,
+    TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
+)
 from uptrain.utilities import polars_to_json_serializable_dict
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 
 from uptrain.operators.language.prompts.classic import (
     CONTEXT_CONCISENESS_PROMPT_TEMPLATE,
@@ -82,12 +86,14 @@ class ContextRelevance(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -98,7 +104,7 @@ class ContextRelevance(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "context_relevance",
@@ -127,7 +133,7 @@ class ContextRelevance(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -169,10 +175,15 @@ class ContextRelevance(ColumnOp):
                     f"Missing required attribute(s) for scenario description: {e}"
                 )
             input_payloads.append(
-                self._api_client.make_payload(idx, grading_prompt_template)
+                self._api_client.make_payload(
+                    idx, grading_prompt_template, context=row["context"], chunkable=True
+                )
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -184,16 +195,14 @@ class ContextRelevance(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_context_relevance"] = float(score)
                 output["explanation_context_relevance"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -234,12 +243,14 @@ class ResponseCompletenessWrtContext(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -251,7 +262,7 @@ class ResponseCompletenessWrtContext(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "response_completeness_wrt_context",
@@ -286,7 +297,7 @@ class ResponseCompletenessWrtContext(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -332,10 +343,15 @@ class ResponseCompletenessWrtContext(ColumnOp):
                     f"Missing required attribute(s) for scenario description: {e}"
                 )
             input_payloads.append(
-                self._api_client.make_payload(idx, grading_prompt_template)
+                self._api_client.make_payload(
+                    idx, grading_prompt_template, context=row["context"]
+                )
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -347,16 +363,14 @@ class ResponseCompletenessWrtContext(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_response_completeness_wrt_context"] = float(score)
                 output["explanation_response_completeness_wrt_context"] = (
                     res.response.choices[0].message.content
                 )
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -398,12 +412,14 @@ class ContextReranking(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -415,7 +431,7 @@ class ContextReranking(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "context_reranking",
@@ -444,7 +460,7 @@ class ContextReranking(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -488,8 +504,11 @@ class ContextReranking(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -501,16 +520,14 @@ class ContextReranking(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_context_reranking"] = float(score)
                 output["explanation_context_reranking"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -552,12 +569,14 @@ class ContextConciseness(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -569,7 +588,7 @@ class ContextConciseness(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "context_conciseness",
@@ -600,7 +619,7 @@ class ContextConciseness(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -644,8 +663,11 @@ class ContextConciseness(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -657,16 +679,14 @@ class ContextConciseness(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_context_conciseness"] = float(score)
                 output["explanation_context_conciseness"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
 
             results.append((idx, output))
 
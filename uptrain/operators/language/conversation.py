@@ -4,13 +4,12 @@ LLM-powered agent pipeline.
 """
 
 from __future__ import annotations
-import json
 import typing as t
 
 from loguru import logger
 import polars as pl
 
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.prompts.classic import (
     CONVERSATION_SATISFACTION_PROMPT_TEMPLATE,
     QUERY_RESOLUTION_PROMPT_TEMPLATE,
@@ -46,6 +45,7 @@ from uptrain.operators.base import (
     register_op,
     ColumnOp,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 
 from uptrain.utilities import polars_to_json_serializable_dict
@@ -86,12 +86,14 @@ class ConversationSatisfactionScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["conversation"] = row[self.col_conversation]
@@ -101,7 +103,7 @@ class ConversationSatisfactionScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "ConversationSatisfaction",
@@ -138,7 +140,7 @@ class ConversationSatisfactionScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -187,8 +189,8 @@ class ConversationSatisfactionScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -200,16 +202,14 @@ class ConversationSatisfactionScore(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_conversation_satisfaction"] = float(score)
                 output["explanation_conversation_satisfaction"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -244,12 +244,14 @@ class QueryResolutionScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["conversation"] = row[self.col_conversation]
@@ -259,7 +261,7 @@ class QueryResolutionScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "QueryResolution",
@@ -296,7 +298,7 @@ class QueryResolutionScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -344,8 +346,8 @@ class QueryResolutionScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -357,16 +359,14 @@ class QueryResolutionScore(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_query_resolution"] = float(score)
                 output["explanation_query_resolution"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -398,12 +398,14 @@ class ConversationNumberOfTurnsScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
     
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["conversation"] = row[self.col_conversation]
@@ -413,7 +415,7 @@ class ConversationNumberOfTurnsScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "ConversationNumberOfTurns",
@@ -450,7 +452,7 @@ class ConversationNumberOfTurnsScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
     
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -486,8 +488,8 @@ class ConversationNumberOfTurnsScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -499,13 +501,11 @@ class ConversationNumberOfTurnsScore(ColumnOp):
                 "conversation_length": len(data[idx]["conversation"]),
             }
             try:
-                resp_content = json.loads(res.response.choices[0].message.content)
+                resp_content = res.get_output()
                 output["score_conversation_number_of_turns"] = resp_content["Turns"]
                 output["explanation_conversation_number_of_turns"] = resp_content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -543,12 +543,14 @@ class ConversationGuidelineAdherenceScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["conversation"] = row[self.col_conversation]
@@ -558,7 +560,7 @@ class ConversationGuidelineAdherenceScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "ConversationGuidelineAdherence",
@@ -595,7 +597,7 @@ class ConversationGuidelineAdherenceScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -631,8 +633,8 @@ class ConversationGuidelineAdherenceScore(ColumnOp):
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
 
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -644,15 +646,13 @@ class ConversationGuidelineAdherenceScore(ColumnOp):
                 "explanation_conversation_guideline_adherence": None,
             }
             try:
-                score = 0.0 if json.loads(res.response.choices[0].message.content)["Choice"] == "A" else 1.0
+                score = 0.0 if res.get_output()["Choice"] == "A" else 1.0
                 output["score_conversation_guideline_adherence"] = float(score)
                 output["explanation_conversation_guideline_adherence"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
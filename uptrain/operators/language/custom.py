@@ -14,9 +14,14 @@ from uptrain.utilities.prompt_utils import parse_scenario_description
 
 if t.TYPE_CHECKING:
     from uptrain.framework import Settings
-from uptrain.operators.base import register_op, ColumnOp, TYPE_TABLE_OUTPUT
+from uptrain.operators.base import (
+    register_op,
+    ColumnOp,
+    TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
+)
 from uptrain.utilities import polars_to_json_serializable_dict
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.prompts.output_format import (
     CLASSIFY_JSON_OUTPUT_FORMAT,
     COT_CLASSIFY_JSON_OUTPUT_FORMAT,
@@ -61,12 +66,14 @@ class CustomPromptEvalScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
 
         try:
@@ -74,7 +81,7 @@ class CustomPromptEvalScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 
                 results = self._api_client.evaluate("CustomPromptEval", data_send, {
@@ -95,7 +102,7 @@ class CustomPromptEvalScore(ColumnOp):
             )
         }
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -126,8 +133,8 @@ class CustomPromptEvalScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, lambda x: True
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, lambda x: True
         )
         results = []
         for res in output_payloads:
@@ -137,13 +144,11 @@ class CustomPromptEvalScore(ColumnOp):
                 # score_mapping is a mapping from choices to choice_scores
                 score_mapping = dict(zip(self.choices, self.choice_scores))
                 score = score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_custom_prompt"] = float(score)
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -17,9 +17,10 @@ from uptrain.operators.base import (
     register_op,
     ColumnOp,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 from uptrain.utilities import polars_to_json_serializable_dict
-from uptrain.operators.language.llm import LLMMulticlient, parse_json
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 
 from uptrain.operators.language.prompts.classic import (
     FACT_EVAL_PROMPT_TEMPLATE,
@@ -73,12 +74,14 @@ class ResponseFactualScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -90,7 +93,7 @@ class ResponseFactualScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "factual_accuracy",
@@ -133,7 +136,7 @@ class ResponseFactualScore(ColumnOp):
             is_correct = is_correct and min([x in row for x in ["Reasoning"]]) > 0
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on https://arxiv.org/abs/2305.14251
         FActScore: Fine-grained Atomic Evaluation of Factual Precision in Long Form Text Generation
@@ -165,20 +168,18 @@ class ResponseFactualScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, self.fact_generate_validate_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, self.fact_generate_validate_func
         )
 
         fact_results = []
         for res in output_payloads:
             idx = res.metadata["index"]
             try:
-                facts = parse_json(res.response.choices[0].message.content)
+                facts = res.get_output()
                 fact_results.append((idx, facts))
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
                 fact_results.append((idx, []))
         fact_results = [val for _, val in sorted(fact_results, key=lambda x: x[0])]
 
@@ -216,10 +217,12 @@ class ResponseFactualScore(ColumnOp):
                     f"Missing required attribute(s) for scenario description: {e}"
                 )
             input_payloads.append(
-                self._api_client.make_payload(idx, grading_prompt_template)
+                self._api_client.make_payload(
+                    idx, grading_prompt_template, context=row["context"]
+                )
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -230,14 +233,12 @@ class ResponseFactualScore(ColumnOp):
                 "explanation_factual_accuracy": None,
             }
             try:
-                judgements = [x["Judgement"] for x in parse_json(res.response.choices[0].message.content)["Result"]]
+                judgements = [x["Judgement"] for x in res.get_output()["Result"]]
                 score = np.mean([self.score_mapping[x.lower()] for x in judgements])
                 output["score_factual_accuracy"] = float(score)
                 output["explanation_factual_accuracy"] = res.response.choices[0].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -21,7 +21,7 @@ from uptrain.operators.base import (
     TYPE_TABLE_OUTPUT,
     ColumnOp,
 )
-from uptrain.operators.language.llm import LLMMulticlient, Payload
+from uptrain.operators.language.llm import LLMMulticlient, Payload, log_payload_error
 
 
 @register_op
@@ -131,7 +131,9 @@ class TextCompletion(TransformOp):
     _api_client: LLMMulticlient
 
     def setup(self, settings: Settings):
-        self._api_client = LLMMulticlient(settings=settings)
+        self._api_client = LLMMulticlient(
+            settings=settings, operator_name=self.__class__.__name__
+        )
         self._settings = settings
         return self
 
@@ -163,7 +165,7 @@ class TextCompletion(TransformOp):
             self._make_payload(idx, text, model)
             for idx, (text, model) in enumerate(zip(prompt_ser, model_ser))
         ]
-        output_payloads = self._api_client.fetch_responses(input_payloads)
+        output_payloads = self._api_client.iter_responses(input_payloads)
 
         results = []
         for res in output_payloads:
@@ -172,9 +174,7 @@ class TextCompletion(TransformOp):
             ), "Response should not be None, we should've handled exceptions beforehand."
             idx = res.metadata["index"]
             if res.error is not None:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
                 results.append((idx, None))
             else:
                 resp_text = res.response.choices[0].message.content
@@ -214,7 +214,9 @@ class TopicGenerator(ColumnOp):
     _api_client: LLMMulticlient
 
     def setup(self, settings: Settings):
-        self._api_client = LLMMulticlient(settings=settings)
+        self._api_client = LLMMulticlient(
+            settings=settings, operator_name=self.__class__.__name__
+        )
         self._settings = settings
         self.model = settings.model
         return self
@@ -292,7 +294,7 @@ class TopicGenerator(ColumnOp):
                 if len(text) > 0:
                     input_payloads.append(self._make_payload(index, prompt, self.model))
 
-            output_payloads = self._api_client.fetch_responses(input_payloads)
+            output_payloads = self._api_client.iter_responses(input_payloads)
 
             results = []
             for res in output_payloads:
@@ -301,9 +303,7 @@ class TopicGenerator(ColumnOp):
                 ), "Response should not be None, we should've handled exceptions beforehand."
                 idx = res.metadata["index"]
                 if res.error is not None:
-                    logger.error(
-                        f"Error when processing payload at index {idx}: {res.error}"
-                    )
+                    log_payload_error(idx, res)
                     results.append((idx, None))
                 else:
                     resp_text = res.response.choices[0].message.content
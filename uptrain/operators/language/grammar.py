@@ -20,7 +20,7 @@ from uptrain.operators.base import (
     register_op,
     TYPE_TABLE_OUTPUT,
 )
-from uptrain.operators.language.llm import LLMMulticlient, Payload
+from uptrain.operators.language.llm import LLMMulticlient, Payload, log_payload_error
 
 __all__ = ["GrammarScore"]
 
@@ -43,7 +43,9 @@ class GrammarScore(ColumnOp):
     col_out: str = "grammar_score"
 
     def setup(self, settings: t.Optional[Settings] = None):
-        self._api_client = LLMMulticlient(settings=settings)
+        self._api_client = LLMMulticlient(
+            settings=settings, operator_name=self.__class__.__name__
+        )
         self._settings = settings
         return self
 
@@ -76,7 +78,7 @@ class GrammarScore(ColumnOp):
         input_payloads = [
             self._make_payload(idx, text) for idx, text in enumerate(text_ser)
         ]
-        output_payloads = self._api_client.fetch_responses(input_payloads)
+        output_payloads = self._api_client.iter_responses(input_payloads)
 
         results = []
         for res in output_payloads:
@@ -85,9 +87,7 @@ class GrammarScore(ColumnOp):
             ), "Response should not be None, we should've handled exceptions beforehand."
             idx = res.metadata["index"]
             if res.error is not None:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
                 results.append((idx, None))
             else:
                 resp_text = res.response.choices[0].message.content
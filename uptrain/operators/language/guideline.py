@@ -6,11 +6,10 @@ LLM-powered agent pipeline.
 from __future__ import annotations
 from loguru import logger
 
-import json
 import polars as pl
 import typing as t
 
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.prompts.classic import (
     GUIDELINE_ADHERENCE_PROMPT_TEMPLATE,
 )
@@ -31,6 +30,7 @@ from uptrain.operators.base import (
     register_op,
     ColumnOp,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 from uptrain.utilities import polars_to_json_serializable_dict
 
@@ -73,12 +73,14 @@ class GuidelineAdherenceScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -89,7 +91,7 @@ class GuidelineAdherenceScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "GuidelineAdherence",
@@ -125,7 +127,7 @@ class GuidelineAdherenceScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -170,8 +172,11 @@ class GuidelineAdherenceScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -184,16 +189,14 @@ class GuidelineAdherenceScore(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output[f"score_{self.guideline_name}_adherence"] = float(score)
                 output[f"explanation_{self.guideline_name}_adherence"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -5,11 +5,10 @@ Implements operators related to jailbreaking of LLMs
 from __future__ import annotations
 from loguru import logger
 
-import json
 import polars as pl
 import typing as t
 
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.prompts.classic import (
     JAILBREAK_DETECTION_PROMPT_TEMPLATE,
     PROMPT_INJECTION_PROMPT_TEMPLATE,
@@ -35,6 +34,7 @@ from uptrain.operators.base import (
     register_op,
     ColumnOp,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 from uptrain.utilities import polars_to_json_serializable_dict
 
@@ -72,12 +72,14 @@ class JailbreakDetectionScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -87,7 +89,7 @@ class JailbreakDetectionScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "JailbreakDetection",
@@ -121,7 +123,7 @@ class JailbreakDetectionScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -166,8 +168,11 @@ class JailbreakDetectionScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -180,16 +185,14 @@ class JailbreakDetectionScore(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_jailbreak_attempted"] = float(score)
                 output["explanation_jailbreak_attempted"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -226,12 +229,14 @@ class PromptInjectionScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -241,7 +246,7 @@ class PromptInjectionScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "PromptInjection",
@@ -270,7 +275,7 @@ class PromptInjectionScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -314,8 +319,11 @@ class PromptInjectionScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -328,16 +336,14 @@ class PromptInjectionScore(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_prompt_injection"] = float(score)
                 output["explanation_prompt_injection"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -7,13 +7,12 @@ aspects on a scale of 0 to 1, along with an explanation for the score.
 """
 
 from __future__ import annotations
-import json5
 import typing as t
 
 from loguru import logger
 import polars as pl
 
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.prompts.classic import (
     LANGUAGE_COHERENCE_PROMPT_TEMPLATE,
     LANGUAGE_CRITIQUE_FLUENCY_PROMPT_TEMPLATE,
@@ -54,6 +53,7 @@ from uptrain.operators.base import (
     register_op,
     ColumnOp,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 
 from uptrain.utilities import polars_to_json_serializable_dict
@@ -91,12 +91,14 @@ class LanguageCritique(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["response"] = row.pop(self.col_response)
@@ -106,7 +108,7 @@ class LanguageCritique(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate("critique_language", data_send)
         except Exception as e:
@@ -131,7 +133,7 @@ class LanguageCritique(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -177,8 +179,11 @@ class LanguageCritique(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -190,17 +195,15 @@ class LanguageCritique(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json5.loads(res.response.choices[0].message.content)["Score"]
+                    res.get_output()["Score"]
                 ]
                 output["score_fluency"] = float(score)
-                output["explanation_fluency"] = json5.loads(res.response.choices[
-                    0
-                ].message.content)["Reasoning"]
+                output["explanation_fluency"] = res.get_output()["Reasoning"]
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
+        # responses arrive out of order, the steps below look them up by index
+        results.sort(key=lambda x: x[0])
 
         # Coherence
         input_payloads = []
@@ -239,8 +242,11 @@ class LanguageCritique(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         for res in output_payloads:
@@ -251,16 +257,12 @@ class LanguageCritique(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json5.loads(res.response.choices[0].message.content)["Score"]
+                    res.get_output()["Score"]
                 ]
                 output["score_coherence"] = float(score)
-                output["explanation_coherence"] = json5.loads(res.response.choices[
-                    0
-                ].message.content)["Reasoning"]
+                output["explanation_coherence"] = res.get_output()["Reasoning"]
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results[idx][1].update(output)
     
         # Grammar
@@ -300,8 +302,11 @@ class LanguageCritique(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         for res in output_payloads:
@@ -312,16 +317,12 @@ class LanguageCritique(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json5.loads(res.response.choices[0].message.content)["Score"]
+                    res.get_output()["Score"]
                 ]
                 output["score_grammar"] = float(score)
-                output["explanation_grammar"] = json5.loads(res.response.choices[
-                    0
-                ].message.content)["Reasoning"]
+                output["explanation_grammar"] = res.get_output()["Reasoning"]
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results[idx][1].update(output)
 
         # Politeness
@@ -361,8 +362,11 @@ class LanguageCritique(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         for res in output_payloads:
@@ -373,16 +377,12 @@ class LanguageCritique(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json5.loads(res.response.choices[0].message.content)["Score"]
+                    res.get_output()["Score"]
                 ]
                 output["score_politeness"] = float(score)
-                output["explanation_politeness"] = json5.loads(res.response.choices[
-                    0
-                ].message.content)["Reasoning"]
+                output["explanation_politeness"] = res.get_output()["Reasoning"]
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results[idx][1].update(output)
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -422,12 +422,14 @@ class ResponseCoherence(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["response"] = row.pop(self.col_response)
@@ -437,7 +439,7 @@ class ResponseCoherence(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate("critique_language", data_send)
         except Exception as e:
@@ -464,7 +466,7 @@ class ResponseCoherence(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -508,8 +510,11 @@ class ResponseCoherence(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -521,16 +526,14 @@ class ResponseCoherence(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json5.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_response_coherence"] = float(score)
                 output["explanation_response_coherence"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -4,27 +4,79 @@ Implement checks to test language quality.
 
 from __future__ import annotations
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-import random
+import json
+import queue
+import threading
+import time
 import typing as t
 import json5
 
 from loguru import logger
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 if t.TYPE_CHECKING:
     from uptrain.framework import Settings
 from uptrain.utilities import lazy_load_dep
+from uptrain.operators.language.llm_batch import (
+    BatchTransport,
+    OpenAIBatchTransport,
+    make_batch_requests,
+    parse_batch_result,
+    wait_for_batch,
+)
+from uptrain.operators.language.llm_cache import (
+    ResponseCache,
+    SingleFlight,
+    canonical_hash,
+    serialize_response,
+    deserialize_response,
+)
+from uptrain.operators.language.llm_context import (
+    LARGER_CONTEXT_MODELS,
+    ContextFitter,
+    grade_rank,
+)
+from uptrain.operators.language.llm_cost import (
+    CostBudgetExceeded,
+    CostTracker,
+    PayloadCapture,
+    get_cost_tracker,
+    get_payload_capture,
+)
+from uptrain.operators.language.llm_endpoints import Endpoint, EndpointPool
+from uptrain.operators.language.llm_hedge import Hedger
+from uptrain.operators.language.llm_journal import ResponseJournal, get_journal
+from uptrain.operators.language.llm_pack import (
+    make_item_response,
+    make_packs,
+    unpack_results,
+    validate_pack,
+)
+from uptrain.operators.language.llm_ratelimit import RateLimiter, get_response_headers
+from uptrain.operators.language.llm_runner import (
+    ClientConfig,
+    get_background_loop,
+    run_coroutine,
+)
+from uptrain.operators.language.llm_retry import (
+    OUTAGE_ERROR_CLASSES,
+    ResponseValidationError,
+    RetryPolicy,
+    RetryState,
+)
+from uptrain.operators.language.llm_scheduler import get_session, get_shared_limiter
+from uptrain.operators.language.llm_stats import STATS_REGISTRY, RequestStats
+from uptrain.operators.language.llm_tokens import (
+    TokenUsage,
+    count_message_tokens,
+    get_usage,
+)
 
 openai = lazy_load_dep("openai", "openai")
-aiolimiter = lazy_load_dep("aiolimiter", "aiolimiter>=1.1")
 tqdm_asyncio = lazy_load_dep("tqdm.asyncio", "tqdm>=4.0")
 
 
-from openai import AsyncOpenAI
-from openai import AsyncAzureOpenAI
 import openai
-from aiolimiter import AsyncLimiter
 
 # import openai.error
 
@@ -43,20 +95,63 @@ class Payload(BaseModel):
     metadata: dict = Field(default_factory=dict)
     response: t.Any = None
     error: t.Optional[str] = None
+    # the response and its parsed JSON output
+    _output: t.Optional[tuple[t.Any, dict]] = PrivateAttr(default=None)
+
+    def release_prompt(self) -> None:
+        """Drop the prompt messages, which dominate the memory of a payload, once
+        the response is in."""
+        self.data["messages"] = []
+
+    def get_output(self) -> dict:
+        """The JSON object returned by the LLM, parsed on first use and shared by the
+        validation function and the scoring code. Empty if there is no response or
+        it isn't valid JSON."""
+        if self.response is None:
+            return {}
+        if self._output is None or self._output[0] is not self.response:
+            self._output = (
+                self.response,
+                parse_json(self.response.choices[0].message.content),
+            )
+        return self._output[1]
+
+    def set_response(self, response: t.Any, output: t.Optional[dict] = None) -> None:
+        """Set the response, along with its parsed output if it is already known."""
+        self.response = response
+        self._output = (response, output) if output is not None else None
+
+
+def log_payload_error(idx: int, payload: Payload) -> None:
+    """Log that the response of a payload couldn't be processed. Quiet in a dry run
+    (see `llm_cost.capture_payloads`), in which no payload gets a response."""
+    if get_payload_capture() is not None:
+        return
+    logger.opt(depth=1).error(
+        f"Error when processing payload at index {idx}: {payload.error}"
+    )
 
 
 def parse_json(json_str: str) -> dict:
     first_brace_index = json_str.find('{')
     last_brace_index = json_str.rfind('}')
     json_str = json_str[first_brace_index:last_brace_index + 1]
+    try:
+        return json.loads(json_str)
+    except ValueError:
+        # json5 is much slower, only for the unquoted keys, trailing commas, etc.
+        # that some models return
+        pass
     try:
         return json5.loads(json_str)
     except Exception as e:
         logger.error(f"Error when parsing JSON: {e}")
         return {}
 
-def run_validation(llm_output, validation_func):
-    llm_output = parse_json(llm_output)
+
+def run_validation(llm_output: t.Union[str, dict], validation_func):
+    if isinstance(llm_output, str):
+        llm_output = parse_json(llm_output)
     try:
         return validation_func(llm_output)
     except Exception as e:
@@ -64,143 +159,497 @@ def run_validation(llm_output, validation_func):
         return False
 
 
+async def send_request(aclient: t.Any, data: dict) -> tuple[t.Any, t.Mapping]:
+    """Send a chat completion request, returning the response and its HTTP headers."""
+    if aclient is not None:
+        raw_api = getattr(aclient.chat.completions, "with_raw_response", None)
+        if raw_api is not None:
+            raw_response = await raw_api.create(**data, timeout=180)
+            return raw_response.parse(), raw_response.headers
+        return await aclient.chat.completions.create(**data, timeout=180), {}
+    else:
+        litellm = lazy_load_dep("litellm", "litellm")
+        response = await litellm.acompletion(**data)
+        return response, get_response_headers(response)
+
+
+def get_cached_response(
+    payload: Payload, cache: t.Optional[ResponseCache], validate_func: t.Callable = None
+) -> tuple[t.Optional[str], bool]:
+    """Look up the payload in the cache, setting its response on a (valid) hit.
+    Returns the cache key and whether it was a hit."""
+    if cache is None:
+        return None, False
+    cache_key = canonical_hash(payload.data)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        try:
+            payload.set_response(deserialize_response(cached))
+            if validate_func is None or run_validation(
+                payload.get_output(), validate_func
+            ):
+                payload.metadata["cache_hit"] = True
+                return cache_key, True
+            payload.set_response(None)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {cache_key}: {e}")
+    return cache_key, False
+
+
+def get_journaled_response(
+    payload: Payload,
+    journal: t.Optional[ResponseJournal],
+    operator: str,
+    validate_func: t.Callable = None,
+) -> tuple[t.Optional[str], bool]:
+    """Replay the response of the payload from the journal of an interrupted run, if
+    it is there (and valid). Returns the payload hash and whether it was replayed."""
+    if journal is None:
+        return None, False
+    payload_hash = canonical_hash(payload.data)
+    journaled = journal.get(operator, payload_hash)
+    if journaled is not None:
+        try:
+            payload.set_response(deserialize_response(journaled))
+            if validate_func is None or run_validation(
+                payload.get_output(), validate_func
+            ):
+                payload.metadata["replayed"] = True
+                journal.replayed += 1
+                return payload_hash, True
+            payload.set_response(None)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable journal entry {payload_hash}: {e}")
+    return payload_hash, False
+
+
+def store_cached_response(payload: Payload, cache: ResponseCache, cache_key: str) -> None:
+    serialized = serialize_response(payload.response)
+    if serialized is not None:
+        cache.set(cache_key, serialized)
+
+
+class _Target(t.NamedTuple):
+    """Where a single attempt of a request is sent."""
+
+    endpoint: t.Optional[Endpoint]
+    limiter: RateLimiter
+    aclient: t.Any
+    data: dict
+
+    @property
+    def provider_key(self) -> str:
+        """Identifies the provider, base url and model the request goes to. Not the
+        client object, whose id can be reused by another client once it is gone."""
+        model = self.data["model"]
+        if self.aclient is not None:
+            provider = type(self.aclient).__name__
+            base_url = getattr(self.aclient, "base_url", None)
+        else:
+            provider = self.data.get("custom_llm_provider") or (
+                model.split("/")[0] if "/" in model else "litellm"
+            )
+            base_url = self.data.get("api_base")
+        return f"{provider}:{base_url or 'default'}:{model}"
+
+
+def _select_target(
+    payload: Payload,
+    limiter: RateLimiter,
+    aclient: t.Any,
+    endpoints: t.Optional[EndpointPool],
+    exclude: t.Collection[Endpoint] = (),
+) -> _Target:
+    if endpoints is None:
+        return _Target(None, limiter, aclient, payload.data)
+    endpoint = endpoints.select(exclude=exclude)
+    return _Target(
+        endpoint, endpoint.limiter, endpoint.get_aclient(), endpoint.prepare(payload.data)
+    )
+
+
+async def _send_to_target(
+    target: _Target,
+    prompt_tokens: int,
+    reserved_tokens: int,
+    stats: t.Optional[RequestStats] = None,
+    cost_tracker: t.Optional[CostTracker] = None,
+    usage: t.Optional[TokenUsage] = None,
+    on_sent: t.Optional[t.Callable[[], None]] = None,
+) -> tuple[t.Any, t.Mapping, _Target]:
+    waits = await target.limiter.acquire(reserved_tokens, get_session())
+    if cost_tracker is not None and cost_tracker.exceeded:
+        # the budget ran out while waiting for the limiter
+        target.limiter.release()
+        cost_tracker.check()
+    if on_sent is not None:
+        on_sent()
+    start = time.monotonic()
+    try:
+        response, headers = await send_request(target.aclient, target.data)
+    except asyncio.CancelledError:
+        # cancelled in flight, e.g. a hedged request that lost the race. The provider
+        # may bill it all the same, so its reservation stays charged on the limiter,
+        # and is accounted for as spent.
+        completion_tokens = reserved_tokens - prompt_tokens
+        if usage is not None:
+            usage.add(prompt_tokens, completion_tokens)
+        if cost_tracker is not None:
+            cost_tracker.add(target.data["model"], prompt_tokens, completion_tokens)
+        raise
+    finally:
+        target.limiter.release()
+        if stats is not None:
+            stats.observe_limiter_waits(waits)
+            stats.observe("latency_seconds", time.monotonic() - start)
+            stats.increment("attempts")
+    return response, headers, target
+
+
+def _settle_usage(
+    response: t.Any,
+    target: _Target,
+    reserved_tokens: int,
+    usage: TokenUsage,
+    stats: t.Optional[RequestStats] = None,
+    cost_tracker: t.Optional[CostTracker] = None,
+) -> None:
+    """Account for the tokens a response used, and settle its limiter reservation."""
+    response_usage = get_usage(response)
+    if response_usage is None:
+        return
+    usage.add(*response_usage)
+    target.limiter.adjust_tokens(sum(response_usage) - reserved_tokens)
+    if stats is not None:
+        stats.observe("prompt_tokens", response_usage[0])
+        stats.observe("completion_tokens", response_usage[1])
+    if cost_tracker is not None:
+        cost_tracker.add(target.data["model"], *response_usage)
+
+
 async def async_process_payload(
     payload: Payload,
-    rpm_limiter: AsyncLimiter,
-    tpm_limiter: AsyncLimiter,
+    limiter: RateLimiter,
     aclient: t.Any,
     max_retries: int,
     validate_func: t.Callable = None,
+    cache: t.Optional[ResponseCache] = None,
+    usage: t.Optional[TokenUsage] = None,
+    retry_policy: t.Optional[RetryPolicy] = None,
+    retry_state: t.Optional[RetryState] = None,
+    endpoints: t.Optional[EndpointPool] = None,
+    hedger: t.Optional[Hedger] = None,
+    stats: t.Optional[RequestStats] = None,
+    cost_tracker: t.Optional[CostTracker] = None,
 ) -> Payload:
-    messages = payload.data["messages"]
-    total_chars = sum(len(msg["role"]) + len(msg["content"]) for msg in messages)
-    total_tokens = total_chars // 3  # average token length is 3, conservatively
-    await rpm_limiter.acquire(1)
-    # TODO: we should also count the response tokens, but this is a good baseline
-    # since our use-case is evaluations mostly, not generation
-    await tpm_limiter.acquire(total_tokens)
-
-    for count in range(max_retries):  # failed requests don't count towards rate limit
+    """Send the request of a payload, retrying as per the retry policy.
+
+    If an endpoint pool is passed, every attempt goes to the least loaded healthy
+    endpoint, with its own limiter and client, and `limiter`/`aclient` are unused.
+    With a hedger, slow attempts are duplicated (to another endpoint, if there is
+    one) and the first response wins. Requests to a provider whose circuit breaker
+    is open fail fast, or go to the fallback model of the retry policy. Once the
+    budget of the cost tracker is spent, the request isn't sent and the payload
+    gets an error.
+    """
+    cache_key, hit = get_cached_response(payload, cache, validate_func)
+    if hit:
+        return payload
+
+    if usage is None:
+        usage = TokenUsage()
+    prompt_tokens = payload.metadata.get("prompt_tokens") or count_message_tokens(
+        payload.data["messages"], payload.data["model"]
+    )
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy(max_attempts=max_retries)
+    if retry_state is None:
+        retry_state = retry_policy.new_state()
+    class_retries: dict[str, int] = {}
+    attempt = 0
+    failed_endpoint: t.Optional[Endpoint] = None
+
+    while True:
+        attempt += 1
+        target = _select_target(
+            payload,
+            limiter,
+            aclient,
+            endpoints,
+            exclude=(failed_endpoint,) if failed_endpoint else (),
+        )
+        breaker = retry_policy.get_circuit_breaker(target.provider_key)
+        if breaker is not None and not breaker.allow_request():
+            fallback_model = retry_policy.fallback_model
+            if fallback_model is None or payload.data["model"] == fallback_model:
+                payload.error = f"Circuit breaker for {target.provider_key} is open, not sending the request"
+                break
+            # the fallback goes through litellm, to whichever provider serves the model
+            data = {
+                key: value
+                for key, value in payload.data.items()
+                if key not in ("custom_llm_provider", "api_base")
+            }
+            data["model"] = fallback_model
+            target = _Target(None, target.limiter, None, data)
+            breaker = retry_policy.get_circuit_breaker(target.provider_key)
+            payload.metadata["fallback_model"] = fallback_model
+        # reserve budget for the completion too, and settle up once the usage is known
+        reserved_tokens = prompt_tokens + (
+            payload.data.get("max_tokens") or usage.expected_completion_tokens()
+        )
         try:
-            if aclient is not None:
-                payload.response = await aclient.chat.completions.create(
-                    **payload.data, timeout=180
+            if hedger is None:
+                payload.response, headers, target = await _send_to_target(
+                    target, prompt_tokens, reserved_tokens, stats, cost_tracker, usage
                 )
             else:
-                litellm = lazy_load_dep("litellm", "litellm")
-                payload.response = await litellm.acompletion(
-                    **payload.data,
+                primary = target
+                (payload.response, headers, target), hedged = await hedger.run(
+                    lambda on_sent: _send_to_target(
+                        primary,
+                        prompt_tokens,
+                        reserved_tokens,
+                        stats,
+                        cost_tracker,
+                        usage,
+                        on_sent,
+                    ),
+                    lambda on_sent: _send_to_target(
+                        _select_target(
+                            payload,
+                            limiter,
+                            aclient,
+                            endpoints,
+                            exclude=(primary.endpoint,) if primary.endpoint else (),
+                        ),
+                        prompt_tokens,
+                        reserved_tokens,
+                        stats,
+                        cost_tracker,
+                        usage,
+                        on_sent,
+                    ),
+                    key=primary.provider_key,
+                    # the losing response was paid for too
+                    discard=lambda result: _settle_usage(
+                        result[0], result[2], reserved_tokens, usage, None, cost_tracker
+                    ),
                 )
+                if hedged:
+                    payload.metadata["hedged"] = True
+                    breaker = retry_policy.get_circuit_breaker(target.provider_key)
+            if target.endpoint is not None:
+                payload.metadata["endpoint"] = target.endpoint.name
+                target.endpoint.record_success()
+            target.limiter.record_success(headers)
+            if breaker is not None:
+                breaker.record_success()
+            _settle_usage(
+                payload.response, target, reserved_tokens, usage, stats, cost_tracker
+            )
             if validate_func is not None:
-                if not run_validation(
-                    payload.response.choices[0].message.content, validate_func
-                ):
-                    raise Exception(
+                if not run_validation(payload.get_output(), validate_func):
+                    if stats is not None:
+                        stats.increment("validation_failures")
+                    raise ResponseValidationError(
                         f"Response doesn't pass the validation func.\nResponse: {payload.response.choices[0].message.content}"
                     )
+            if cache is not None:
+                # stored under the original key, so a fallback model switch is cached too
+                store_cached_response(payload, cache, cache_key)
+            break
+        except CostBudgetExceeded as exc:
+            payload.error = str(exc)
             break
         except Exception as exc:
             logger.error(f"Error when sending request to LLM API: {exc}")
-            sleep_and_retry = count < max_retries - 1
-            if aclient is not None:
-                if not (
-                    isinstance(
-                        exc,
-                        (
-                            openai.APIConnectionError,
-                            openai.APITimeoutError,
-                            openai.InternalServerError,
-                            openai.RateLimitError,
-                            openai.UnprocessableEntityError,
-                        ),
-                    )
-                ):
-                    sleep_and_retry = False
-            else:
-                litellm = lazy_load_dep("litellm", "litellm")
-                if not (
-                    isinstance(
-                        exc,
-                        (litellm.RateLimitError,),
-                    )
-                ):
-                    sleep_and_retry = False
+            error_class = retry_policy.classify(exc)
+            if error_class == "rate_limit":
+                target.limiter.record_rate_limited(get_response_headers(exc))
+            if breaker is not None:
+                if error_class in OUTAGE_ERROR_CLASSES:
+                    breaker.record_failure()
+                else:
+                    # the provider answered, so it is up
+                    breaker.record_success()
+            if target.endpoint is not None and error_class != "validation":
+                # prefer another endpoint for the retry
+                failed_endpoint = target.endpoint
+                if error_class in ("timeout", "connection", "server"):
+                    target.endpoint.record_failure()
 
-            if sleep_and_retry:
-                logger.info(
-                    f"Going to sleep before retrying for payload {payload.metadata['index']}"
-                )
-                await asyncio.sleep(random.uniform(5, 30) * count + 60)
-            elif (
+            if (
                 isinstance(exc, openai.BadRequestError)
                 and exc.code is not None
                 and "context_length" in exc.code
-                and count < max_retries - 1
+                and attempt < retry_policy.max_attempts
             ):
-                # refer - https://github.com/BerriAI/reliableGPT/
                 # if required to set token limit - https://learn.microsoft.com/en-us/azure/ai-services/openai/how-to/chatgpt?pivots=programming-language-chat-completions#managing-conversations
-
-                fallback = {
-                    "gpt-3.5-turbo": "gpt-3.5-turbo-16k",
-                    "gpt-3.5-turbo-0613": "gpt-3.5-turbo-16k-0613",
-                    "gpt-3.5-turbo-16k": "claude-instant-1.2",
-                    "gpt-3.5-turbo-16k-0613": "claude-instant-1.2",
-                    "gpt-4": "gpt-4-32k",
-                    "gpt-4-0613": "gpt-4-32k-0613",
-                    "gpt-4-32k": "claude-2.0",
-                    "gpt-4-32k-0613": "claude-2.0",
-                }
-                if payload.data["model"] in fallback.keys():
-                    payload.data["model"] = fallback[payload.data["model"]]
+                if payload.data["model"] in LARGER_CONTEXT_MODELS:
+                    payload.data["model"] = LARGER_CONTEXT_MODELS[payload.data["model"]]
                     logger.info(
                         f"Switching to larger context model for payload {payload.metadata['index']}"
                     )
-                else:
-                    payload.error = str(exc)
-                    break
-            elif "Response doesn't pass the validation func" in str(exc):
-                logger.info(f"Retrying for payload {payload.metadata['index']}")
-            else:
+                    continue
                 payload.error = str(exc)
                 break
 
+            delay = retry_policy.compute_delay(exc, class_retries.get(error_class, 0))
+            if not retry_policy.should_retry(
+                error_class, attempt, class_retries, delay, retry_state
+            ):
+                payload.error = str(exc)
+                break
+            class_retries[error_class] = class_retries.get(error_class, 0) + 1
+            retry_state.retries += 1
+            if stats is not None:
+                stats.increment("retries")
+            if breaker is not None and breaker.state == "open":
+                if retry_policy.fallback_model is None:
+                    payload.error = f"{exc} (circuit breaker for {target.provider_key} is open)"
+                    break
+                # no point waiting, the next attempt goes to the fallback
+                delay = 0.0
+            if delay > 0:
+                logger.info(
+                    f"Retrying payload {payload.metadata['index']} after {delay:.1f}s ({error_class})"
+                )
+                retry_state.sleep_time += delay
+                if stats is not None:
+                    stats.observe("retry_sleep_seconds", delay)
+                await asyncio.sleep(delay)
+            else:
+                logger.info(f"Retrying for payload {payload.metadata['index']}")
+
     return payload
 
 
+# payloads in flight for streaming fetches over an iterator, if not configured
+DEFAULT_MAX_IN_FLIGHT = 256
+
+# shared by all clients, so identical requests from different operators coalesce too
+_SINGLE_FLIGHT = SingleFlight()
+
+
+class _RunContext:
+    """State shared by the payloads of a single `fetch_responses` call."""
+
+    def __init__(
+        self,
+        endpoints: EndpointPool,
+        retry_state: RetryState,
+        cost_tracker: CostTracker,
+        capture: t.Optional[PayloadCapture] = None,
+        journal: t.Optional[ResponseJournal] = None,
+    ):
+        self.endpoints = endpoints
+        self.retry_state = retry_state
+        self.cost_tracker = cost_tracker
+        self.capture = capture
+        self.journal = journal
+        self.usage = TokenUsage()
+        self.stats = RequestStats()
+
+
 class LLMMulticlient:
-    """Uses asyncio to send requests to LLM APIs concurrently."""
+    """Uses asyncio to send requests to LLM APIs concurrently.
+
+    Telemetry of the requests (rate limiter waits, latencies, retries, tokens, cache
+    hits) is collected per run, see `fetch_responses(..., return_stats=True)`, and
+    aggregated per `operator_name` in `llm_stats.STATS_REGISTRY`.
+
+    Requests go to a single API client by default. To spread them over several API
+    keys or deployments, pass `endpoints` or configure `Settings.llm_endpoints`.
+    Clients of the same API key (or client object) share a process-wide rate
+    limiter, which admits requests by the priority and fair share of their
+    `llm_scheduler.scheduling_session`.
+
+    With `Settings.execution_mode` set to "batch" (or a `batch_transport` passed),
+    requests are instead submitted through the provider's batch API, and every
+    fetch waits for its batch to complete.
 
-    def __init__(self, settings: t.Optional[Settings] = None, aclient: t.Any = None):
-        self._max_tries = 4
+    The cost of the responses is tracked against `Settings.max_cost`, or against the
+    budget of an enclosing `llm_cost.cost_budget` block, shared with other clients.
+    Once it is spent, the remaining payloads aren't sent and get an error, while
+    those already answered keep their responses. Inside a `llm_cost.capture_payloads`
+    block nothing is sent: payloads are recorded, to estimate costs, and returned
+    without a response.
+
+    Inside a `llm_journal.journal_session` block, completed responses are journaled,
+    and those journaled by an earlier, interrupted run are replayed.
+    """
+
+    def __init__(
+        self,
+        settings: t.Optional[Settings] = None,
+        aclient: t.Any = None,
+        retry_policy: t.Optional[RetryPolicy] = None,
+        endpoints: t.Optional[list[Endpoint]] = None,
+        batch_transport: t.Optional[BatchTransport] = None,
+        operator_name: t.Optional[str] = None,
+    ):
+        self.retry_policy = (
+            retry_policy
+            if retry_policy is not None
+            else RetryPolicy.from_settings(settings)
+        )
         # TODO: consult for accurate limits - https://platform.openai.com/account/rate-limits
         self._rpm_limit = 200
         self._tpm_limit = 90_000
+        # an explicitly passed client is used as is, otherwise a pooled one is picked
+        # for the event loop the requests run on
         self.aclient = aclient
+        self._client_config: t.Optional[ClientConfig] = None
+        # created on the first run, so that the limits can still be changed until then
+        self._endpoints = EndpointPool(endpoints) if endpoints else None
         self.settings = settings
+        self.cache = None
+        self.hedger = Hedger.from_settings(settings)
+        self.context_fitter = ContextFitter.from_settings(settings)
+        self.batch_transport = batch_transport
+        self.operator_name = operator_name or "default"
+        # tokens used and request stats of the last `fetch_responses` call, and of all calls
+        self.last_run_usage = TokenUsage()
+        self.token_usage = TokenUsage()
+        self.last_run_stats = RequestStats()
+        self.stats = RequestStats()
+        self.cost_tracker = (
+            CostTracker(settings.max_cost, settings.model_prices)
+            if settings is not None
+            else CostTracker()
+        )
         if settings is not None:
+            self.cache = ResponseCache.from_settings(settings)
             if (
                 settings.model.startswith("gpt")
                 and settings.check_and_get("openai_api_key") is not None
             ):
                 openai.api_key = settings.check_and_get("openai_api_key")  # type: ignore
-                if self.aclient is None:
-                    self.aclient = AsyncOpenAI()
+                self._client_config = ClientConfig.from_settings(
+                    settings, "openai", api_key=settings.openai_api_key
+                )
 
             if (
                 settings.model.startswith("azure")
                 and settings.check_and_get("azure_api_key") is not None
             ):
-                self.aclient = AsyncAzureOpenAI(
+                self._client_config = ClientConfig.from_settings(
+                    settings,
+                    "azure",
                     api_key=settings.azure_api_key,
                     api_version=settings.azure_api_version,
-                    azure_endpoint=settings.azure_api_base,
+                    base_url=settings.azure_api_base,
                 )
 
             if (
                 settings.model.startswith("anyscale")
                 and settings.check_and_get("anyscale_api_key") is not None
             ):
-                self.aclient = AsyncOpenAI(
+                self._client_config = ClientConfig.from_settings(
+                    settings,
+                    "openai",
                     api_key=settings.anyscale_api_key,
                     base_url="https://api.endpoints.anyscale.com/v1",
                 )
@@ -208,23 +657,41 @@ class LLMMulticlient:
                 settings.model.startswith("together")
                 and settings.check_and_get("together_api_key") is not None
             ):
-                self.aclient = AsyncOpenAI(
+                self._client_config = ClientConfig.from_settings(
+                    settings,
+                    "openai",
                     api_key=settings.together_api_key,
                     base_url="https://api.together.xyz/v1",
                 )
             if (
                 settings.model.startswith("ollama")
             ):
-                self.aclient = None        
+                self.aclient = None
+                self._client_config = None
             self._rpm_limit = settings.check_and_get("rpm_limit")
             self._tpm_limit = settings.check_and_get("tpm_limit")
+            if self._endpoints is None:
+                self._endpoints = EndpointPool.from_settings(settings)
+            if self.batch_transport is None and settings.execution_mode == "batch":
+                self.batch_transport = OpenAIBatchTransport(
+                    self.aclient, self._client_config
+                )
 
     def make_payload(
         self,
         index: int,
         prompt: str,
         temperature: float = 0.1,
+        context: t.Optional[str] = None,
+        chunkable: bool = False,
     ) -> Payload:
+        """Make the payload of a grading prompt.
+
+        `context` is the (retrieved) context rendered in the prompt, which may be cut
+        down if the prompt doesn't fit the context window of the model, see
+        `llm_context.ContextFitter`. If `chunkable`, the context may be graded in
+        chunks instead, keeping the most favourable grade.
+        """
         model = self.settings.model
         seed = self.settings.seed
         response_format = self.settings.response_format
@@ -248,53 +715,604 @@ class LLMMulticlient:
             data["custom_llm_provider"] = custom_llm_provider
         if api_base is not None:
             data["api_base"] = api_base
+        metadata = {"index": index}
+        if isinstance(context, str) and context:
+            # the task data comes last in the templates, after the few-shot examples
+            start = prompt.rfind(context)
+            if start >= 0:
+                metadata["context_span"] = [start, start + len(context)]
+                metadata["chunkable"] = chunkable
         return Payload(
             endpoint="chat.completions",
             data=data,
-            metadata={"index": index},
+            metadata=metadata,
         )
 
+    @t.overload
     def fetch_responses(
-        self, input_payloads: list[Payload], validate_func: t.Callable = None
+        self,
+        input_payloads: list[Payload],
+        validate_func: t.Callable = None,
+        return_stats: t.Literal[False] = False,
     ) -> list[Payload]:
-        try:
-            return asyncio.run(
-                self.async_fetch_responses(input_payloads, validate_func=validate_func)
+        ...
+
+    @t.overload
+    def fetch_responses(
+        self,
+        input_payloads: list[Payload],
+        validate_func: t.Callable = None,
+        return_stats: t.Literal[True] = ...,
+    ) -> tuple[list[Payload], RequestStats]:
+        ...
+
+    def fetch_responses(
+        self,
+        input_payloads: list[Payload],
+        validate_func: t.Callable = None,
+        return_stats: bool = False,
+    ):
+        """Sends the requests on the shared background event loop and waits for all
+        of them. Works the same whether or not the caller is in a running loop.
+
+        With `return_stats`, the telemetry of the run is returned too."""
+        return run_coroutine(
+            self.async_fetch_responses(
+                input_payloads, validate_func=validate_func, return_stats=return_stats
             )
-        except Exception as e:
-            try:
-                loop = asyncio.get_running_loop()
-                if loop.is_running():
-                    logger.warning(
-                        "Detected a running event loop, scheduling requests in a separate thread."
-                    )
-                    with ThreadPoolExecutor(max_workers=1) as executor:
-                        return executor.submit(
-                            asyncio.run,
-                            self.async_fetch_responses(
-                                input_payloads, validate_func=validate_func
-                            ),
-                        ).result()
-            except Exception:
-                logger.error(f"Caught an exception: {e}")
+        )
 
     async def async_fetch_responses(
         self,
         input_payloads: list[Payload],
         validate_func: t.Callable = None,
+        return_stats: bool = False,
+    ):
+        run = self._start_run()
+        try:
+            if self.batch_transport is not None and run.capture is None:
+                output_payloads = await self._afetch_batch(
+                    list(input_payloads), validate_func, run
+                )
+            else:
+                output_payloads = await tqdm_asyncio.tqdm_asyncio.gather(
+                    *[
+                        self._process_payload(data, validate_func, run)
+                        for data in input_payloads
+                    ]
+                )
+        finally:
+            self._finish_run(run)
+        if return_stats:
+            return output_payloads, run.stats
+        return output_payloads
+
+    def iter_responses(
+        self,
+        input_payloads: t.Iterable[Payload],
+        validate_func: t.Callable = None,
+        max_in_flight: t.Optional[int] = None,
+        pack: bool = False,
+    ) -> t.Iterator[Payload]:
+        """Yields payloads as their responses arrive, i.e. NOT in the input order.
+
+        The requests run on the shared background event loop, so the caller can
+        process finished payloads while the rest are in flight. See `aiter_responses`
+        for the bounded mode, in which the payloads not yet consumed by the caller
+        also count towards `max_in_flight`.
+
+        With `pack`, several payloads are graded per request if
+        `Settings.grading_pack_size` allows it, see `iter_packed_responses`.
+        """
+        if pack:
+            yield from self.iter_packed_responses(
+                input_payloads, validate_func, max_in_flight=max_in_flight
+            )
+            return
+        max_in_flight = self._get_max_in_flight(input_payloads, max_in_flight)
+        yield from self._iter_on_background_loop(
+            self.aiter_responses(input_payloads, validate_func, max_in_flight=max_in_flight),
+            max_in_flight,
+        )
+
+    def iter_packed_responses(
+        self,
+        input_payloads: t.Iterable[Payload],
+        validate_func: t.Callable = None,
+        pack_size: t.Optional[int] = None,
+        max_in_flight: t.Optional[int] = None,
+    ) -> t.Iterator[Payload]:
+        """Sync version of `aiter_packed_responses`, which runs on the shared
+        background event loop like `iter_responses`."""
+        max_in_flight = self._get_max_in_flight(input_payloads, max_in_flight)
+        yield from self._iter_on_background_loop(
+            self.aiter_packed_responses(
+                input_payloads, validate_func, pack_size, max_in_flight=max_in_flight
+            ),
+            max_in_flight,
+        )
+
+    def _iter_on_background_loop(
+        self,
+        payloads: t.AsyncIterator[Payload],
+        max_in_flight: t.Optional[int],
+    ) -> t.Iterator[Payload]:
+        """Iterate over async generated payloads, which run on the background loop.
+        In bounded mode, the payloads yielded but not consumed yet count towards
+        `max_in_flight`."""
+        outputs: queue.Queue = queue.Queue()
+        stop = threading.Event()
+        finished = object()
+        # in bounded mode, one slot per payload that is yielded but not consumed yet
+        slots: list[asyncio.Semaphore] = []
+
+        async def produce():
+            try:
+                if max_in_flight is not None:
+                    slots.append(asyncio.Semaphore(max_in_flight))
+                async for payload in payloads:
+                    if slots:
+                        await slots[0].acquire()
+                    outputs.put(payload)
+                    if stop.is_set():
+                        break
+            except BaseException as exc:
+                outputs.put(exc)
+                raise
+            finally:
+                outputs.put(finished)
+
+        background_loop = get_background_loop()
+        if background_loop.in_loop_thread():
+            raise RuntimeError(
+                "Can't block on the uptrain event loop from inside it, use `aiter_responses` instead."
+            )
+        future = background_loop.submit(produce())
+        try:
+            while True:
+                item = outputs.get()
+                if item is finished:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                if slots:
+                    background_loop.loop.call_soon_threadsafe(slots[0].release)
+                yield item
+        finally:
+            stop.set()
+            if not future.done():
+                future.cancel()
+
+    async def aiter_packed_responses(
+        self,
+        input_payloads: t.Iterable[Payload],
+        validate_func: t.Callable = None,
+        pack_size: t.Optional[int] = None,
+        max_in_flight: t.Optional[int] = None,
+    ) -> t.AsyncIterator[Payload]:
+        """Yields payloads as their responses arrive, grading up to `pack_size` of
+        them (`Settings.grading_pack_size` by default) in one request, see `llm_pack`.
+
+        The response of a pack is split into one response per payload, each
+        validated on its own. Payloads without a valid result are packed again, in
+        packs half as large, and eventually sent on their own.
+        """
+        if pack_size is None:
+            pack_size = self.settings.grading_pack_size if self.settings else 1
+        pending = list(input_payloads)
+        while pack_size > 1 and pending:
+            packs, singles = make_packs(pending, pack_size)
+            if not packs:
+                break
+            members = {id(pack): chunk for pack, chunk in packs}
+            pending = singles
+            async for pack in self.aiter_responses(
+                [pack for pack, _ in packs], validate_pack, max_in_flight=max_in_flight
+            ):
+                done, retry = self._unpack(pack, members[id(pack)], validate_func)
+                for payload in done:
+                    yield payload
+                pending.extend(retry)
+            pack_size //= 2
+        if pending:
+            async for payload in self.aiter_responses(
+                pending, validate_func, max_in_flight=max_in_flight
+            ):
+                yield payload
+
+    def _unpack(
+        self, pack: Payload, chunk: list[Payload], validate_func: t.Optional[t.Callable]
+    ) -> tuple[list[Payload], list[Payload]]:
+        """The members of a graded pack that got a valid result, and the ones to grade
+        again."""
+        if pack.error is not None and get_payload_capture() is not None:
+            # dry run, re-splitting would record the rows twice
+            for payload in chunk:
+                payload.error = pack.error
+            return chunk, []
+        done, retry = [], []
+        for payload, result in zip(chunk, unpack_results(pack, len(chunk))):
+            if result is not None and (
+                validate_func is None or run_validation(result, validate_func)
+            ):
+                payload.set_response(make_item_response(pack.response, result), result)
+                payload.metadata["packed"] = len(chunk)
+                done.append(payload)
+            else:
+                retry.append(payload)
+        return done, retry
+
+    async def aiter_responses(
+        self,
+        input_payloads: t.Iterable[Payload],
+        validate_func: t.Callable = None,
+        max_in_flight: t.Optional[int] = None,
+        pack: bool = False,
+    ) -> t.AsyncIterator[Payload]:
+        """Async generator that yields payloads as their responses arrive.
+
+        By default, a request is scheduled for every payload up front. In bounded
+        mode, i.e. if `max_in_flight` is set (or `Settings.max_in_flight`, or the
+        payloads come from an iterator rather than a list), payloads are pulled from
+        the input lazily and at most `max_in_flight` of them are in flight at once.
+        The payloads are sent as copies, which drop their prompts once the response
+        is in, so memory use depends on the concurrency rather than the size of the
+        dataset, as long as the caller lets go of the payloads it consumed. The
+        payloads passed get the responses, and keep their prompts.
+
+        With `pack`, see `iter_responses`.
+        """
+        if pack:
+            async for payload in self.aiter_packed_responses(
+                input_payloads, validate_func, max_in_flight=max_in_flight
+            ):
+                yield payload
+            return
+
+        if self.batch_transport is not None and get_payload_capture() is None:
+            for payload in await self.async_fetch_responses(input_payloads, validate_func):
+                yield payload
+            return
+
+        max_in_flight = self._get_max_in_flight(input_payloads, max_in_flight)
+        if max_in_flight is not None:
+            async for payload in self._aiter_bounded(
+                input_payloads, validate_func, max_in_flight
+            ):
+                yield payload
+            return
+
+        run = self._start_run()
+        tasks = [
+            asyncio.ensure_future(self._process_payload(data, validate_func, run))
+            for data in input_payloads
+        ]
+        try:
+            for next_done in tqdm_asyncio.tqdm_asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._finish_run(run)
+
+    async def _aiter_bounded(
+        self,
+        input_payloads: t.Iterable[Payload],
+        validate_func: t.Optional[t.Callable],
+        max_in_flight: int,
+    ) -> t.AsyncIterator[Payload]:
+        run = self._start_run()
+        payloads_iter = iter(input_payloads)
+        total = len(input_payloads) if isinstance(input_payloads, t.Sized) else None
+        progress = tqdm_asyncio.tqdm_asyncio(total=total)
+        pending: set[asyncio.Future] = set()
+        # the payloads of the caller, each sent as a copy whose prompt is released
+        # once graded, so the caller's payloads are left as they were passed
+        originals: dict[asyncio.Future, Payload] = {}
+        exhausted = False
+        try:
+            while True:
+                # refill only while the caller is consuming, so nothing piles up
+                while not exhausted and len(pending) < max_in_flight:
+                    payload = next(payloads_iter, None)
+                    if payload is None:
+                        exhausted = True
+                        break
+                    sent = payload.model_copy(update={"data": dict(payload.data)})
+                    task = asyncio.ensure_future(
+                        self._process_payload(sent, validate_func, run)
+                    )
+                    originals[task] = payload
+                    pending.add(task)
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    payload, graded = originals.pop(task), task.result()
+                    graded.release_prompt()
+                    payload.response, payload.error = graded.response, graded.error
+                    payload._output = graded._output
+                    if graded.metadata is not payload.metadata:
+                        payload.metadata.update(graded.metadata)
+                    progress.update(1)
+                    yield payload
+        finally:
+            for task in pending:
+                task.cancel()
+            progress.close()
+            self._finish_run(run)
+
+    async def _afetch_batch(
+        self,
+        payloads: list[Payload],
+        validate_func: t.Optional[t.Callable],
+        run: _RunContext,
     ) -> list[Payload]:
-        rpm_limiter = AsyncLimiter(self._rpm_limit, time_period=60)
-        tpm_limiter = AsyncLimiter(self._tpm_limit, time_period=60)
-        async_outputs = [
-            async_process_payload(
-                data,
-                rpm_limiter,
-                tpm_limiter,
-                self.aclient,
-                self._max_tries,
+        """Fetch the responses through the batch API. Payloads whose response fails
+        validation, or that got no result, are resubmitted in another batch."""
+        transport = self.batch_transport
+        assert transport is not None
+        if self.context_fitter is not None:
+            # batch requests map one to one to payloads, so no chunking
+            fitter = ContextFitter(
+                "truncate" if self.context_fitter.strategy == "chunk" else self.context_fitter.strategy,
+                self.context_fitter.windows,
+            )
+            for payload in payloads:
+                fitter.fit(payload)
+        cache_keys: dict[int, t.Optional[str]] = {}
+        payload_hashes: dict[int, t.Optional[str]] = {}
+        pending = []
+        for payload in payloads:
+            payload_hash, replayed = get_journaled_response(
+                payload, run.journal, self.operator_name, validate_func
+            )
+            if replayed:
+                continue
+            cache_key, hit = get_cached_response(payload, self.cache, validate_func)
+            if not hit:
+                cache_keys[id(payload)] = cache_key
+                payload_hashes[id(payload)] = payload_hash
+                pending.append(payload)
+
+        poll_interval = self.settings.batch_poll_interval if self.settings else 30.0
+        num_rounds = 1 + self.retry_policy.budgets.get("validation", 0)
+        for round_idx in range(num_rounds):
+            if not pending:
+                break
+            try:
+                run.cost_tracker.check()
+            except CostBudgetExceeded as exc:
+                for payload in pending:
+                    payload.error = str(exc)
+                break
+            requests, by_id = make_batch_requests(pending, transport.url)
+            batch_id = await transport.submit(requests)
+            logger.info(f"Submitted batch {batch_id} with {len(requests)} requests")
+            run.stats.increment("attempts", len(requests))
+            if round_idx > 0:
+                run.stats.increment("retries", len(requests))
+            status = await wait_for_batch(transport, batch_id, poll_interval)
+            logger.info(f"Batch {batch_id} is {status}")
+            results = [] if status == "failed" else await transport.results(batch_id)
+
+            retry = []
+            for line in results:
+                payload = by_id.pop(line.get("custom_id"), None)
+                if payload is None:
+                    continue
+                payload.metadata["batch_id"] = batch_id
+                response, payload.error = parse_batch_result(line)
+                if response is None:
+                    continue
+                payload.response = response
+                response_usage = get_usage(response)
+                if response_usage is not None:
+                    run.usage.add(*response_usage)
+                    run.stats.observe("prompt_tokens", response_usage[0])
+                    run.stats.observe("completion_tokens", response_usage[1])
+                    run.cost_tracker.add(
+                        payload.data["model"], *response_usage, batch=True
+                    )
+                if validate_func is not None and not run_validation(
+                    payload.get_output(), validate_func
+                ):
+                    payload.error = f"Response doesn't pass the validation func.\nResponse: {response.choices[0].message.content}"
+                    run.stats.increment("validation_failures")
+                    retry.append(payload)
+                else:
+                    if self.cache is not None:
+                        store_cached_response(
+                            payload, self.cache, cache_keys[id(payload)]
+                        )
+                    if run.journal is not None:
+                        run.journal.record(
+                            self.operator_name, payload_hashes[id(payload)], payload
+                        )
+            for payload in by_id.values():
+                payload.error = f"No result for the request in batch {batch_id} ({status})"
+                retry.append(payload)
+            if status == "failed":
+                break
+            pending = retry
+
+        for payload in payloads:
+            run.stats.record_payload(payload)
+        return payloads
+
+    def _get_max_in_flight(
+        self, input_payloads: t.Iterable[Payload], max_in_flight: t.Optional[int]
+    ) -> t.Optional[int]:
+        if max_in_flight is None and self.settings is not None:
+            max_in_flight = self.settings.max_in_flight
+        if max_in_flight is None and not isinstance(input_payloads, t.Sized):
+            # an iterator might be arbitrarily long, never materialize it
+            max_in_flight = (
+                self.settings.max_concurrency
+                if self.settings is not None
+                else DEFAULT_MAX_IN_FLIGHT
+            )
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+        return max_in_flight
+
+    @property
+    def endpoints(self) -> EndpointPool:
+        if self._endpoints is None:
+            self._endpoints = EndpointPool([self._make_default_endpoint()])
+        return self._endpoints
+
+    def _make_default_endpoint(self) -> Endpoint:
+        return Endpoint(
+            "default",
+            self._rpm_limit,
+            self._tpm_limit,
+            aclient=self.aclient,
+            client_config=self._client_config,
+            adaptive=self.settings.adaptive_rate_limit if self.settings else False,
+            max_concurrency=self.settings.max_concurrency if self.settings else 256,
+            limiter=get_shared_limiter(
+                self.settings,
+                self._rpm_limit,
+                self._tpm_limit,
+                aclient=self.aclient,
+                client_config=self._client_config,
+                model=self.settings.model if self.settings else None,
+                api_base=self.settings.api_base if self.settings else None,
+            ),
+        )
+
+    def _start_run(self) -> _RunContext:
+        return _RunContext(
+            self.endpoints,
+            self.retry_policy.new_state(),
+            get_cost_tracker() or self.cost_tracker,
+            get_payload_capture(),
+            get_journal(),
+        )
+
+    def _finish_run(self, run: _RunContext) -> None:
+        self.last_run_usage = run.usage
+        self.token_usage.merge(run.usage)
+        self.last_run_stats = run.stats
+        self.stats.merge(run.stats)
+        STATS_REGISTRY.record_run(self.operator_name, run.stats)
+
+    async def _process_payload(
+        self,
+        payload: Payload,
+        validate_func: t.Optional[t.Callable],
+        run: _RunContext,
+    ) -> Payload:
+        if self.context_fitter is not None and "chunk" not in payload.metadata:
+            chunks = self.context_fitter.fit(payload)
+            if len(chunks) > 1:
+                return await self._process_chunks(payload, chunks, validate_func, run)
+
+        if run.capture is not None:
+            # dry run, cached responses are free so only the rest is recorded
+            _, hit = get_cached_response(payload, self.cache, validate_func)
+            if not hit:
+                run.capture.add(self.operator_name, payload)
+                payload.error = "Dry run, the request wasn't sent"
+            return payload
+
+        payload_hash, replayed = get_journaled_response(
+            payload, run.journal, self.operator_name, validate_func
+        )
+        if replayed:
+            run.stats.record_payload(payload)
+            return payload
+
+        def process(payload: Payload = payload) -> t.Awaitable[Payload]:
+            return async_process_payload(
+                payload,
+                None,
+                None,
+                self.retry_policy.max_attempts,
                 validate_func=validate_func,
+                cache=self.cache,
+                usage=run.usage,
+                retry_policy=self.retry_policy,
+                retry_state=run.retry_state,
+                endpoints=run.endpoints,
+                hedger=self.hedger,
+                stats=run.stats,
+                cost_tracker=run.cost_tracker,
+            )
+
+        if self.settings is None or not self.settings.coalesce_requests:
+            payload = await process()
+            self._finish_payload(payload, payload_hash, run)
+            return payload
+
+        # identical requests validated the same way can share one response
+        key = (
+            canonical_hash(payload.data),
+            getattr(validate_func, "__qualname__", repr(validate_func)),
+        )
+        leader, shared = await _SINGLE_FLIGHT.do(key, process)
+        if shared:
+            payload.set_response(leader.response, leader.get_output())
+            payload.error = leader.error
+            payload.metadata["coalesced"] = True
+        self._finish_payload(payload, payload_hash, run)
+        return payload
+
+    async def _process_chunks(
+        self,
+        payload: Payload,
+        chunks: list[Payload],
+        validate_func: t.Optional[t.Callable],
+        run: _RunContext,
+    ) -> Payload:
+        """Grade the chunks of the context of a payload separately, the payload gets
+        the response of the most favourable grade."""
+        chunks = await asyncio.gather(
+            *[self._process_payload(chunk, validate_func, run) for chunk in chunks]
+        )
+        payload.metadata["chunks"] = len(chunks)
+        for chunk in chunks:
+            if chunk.error is not None or grade_rank(chunk.get_output()) is None:
+                payload.error = chunk.error or "No grade for a chunk of the context"
+                return payload
+        best = max(chunks, key=lambda chunk: grade_rank(chunk.get_output()))
+        payload.set_response(best.response, best.get_output())
+        return payload
+
+    def _finish_payload(
+        self, payload: Payload, payload_hash: t.Optional[str], run: _RunContext
+    ) -> None:
+        if run.journal is not None and payload_hash is not None:
+            run.journal.record(self.operator_name, payload_hash, payload)
+        run.stats.record_payload(payload)
+
+
+class LLMRequest(t.NamedTuple):
+    """The payloads an operator needs the responses to, yielded from its `run_steps`
+    (see `uptrain.operators.base.ColumnOp`).
+
+    `run` fetches the responses in a blocking way, `arun` awaits them on the running
+    event loop. Either way, the operator is sent back the payloads with their
+    responses, NOT in the input order. The arguments are those of `iter_responses`.
+    """
+
+    client: LLMMulticlient
+    payloads: list[Payload]
+    validate_func: t.Optional[t.Callable] = None
+    pack: bool = False
+
+    def fetch(self) -> t.Iterable[Payload]:
+        return self.client.iter_responses(
+            self.payloads, self.validate_func, pack=self.pack
+        )
+
+    async def afetch(self) -> list[Payload]:
+        return [
+            payload
+            async for payload in self.client.aiter_responses(
+                self.payloads, self.validate_func, pack=self.pack
             )
-            for data in input_payloads
         ]
-        output_payloads = await tqdm_asyncio.tqdm_asyncio.gather(*async_outputs)
-        return output_payloads
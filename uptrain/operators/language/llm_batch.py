@@ -0,0 +1,167 @@
+"""
+Offline execution of LLM requests through a provider's batch API, which trades
+latency (up to a day) for lower prices.
+"""
+
+from __future__ import annotations
+import abc
+import asyncio
+import json
+import typing as t
+
+from loguru import logger
+
+from uptrain.operators.language.llm_runner import ClientConfig, get_async_client
+
+if t.TYPE_CHECKING:
+    from uptrain.operators.language.llm import Payload
+
+# statuses after which a batch won't make any more progress
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# request keys only understood by litellm, not by the provider APIs
+_LITELLM_ONLY_KEYS = ("custom_llm_provider", "api_base")
+
+
+class BatchTransport(abc.ABC):
+    """Submits batch files to a provider and fetches the results.
+
+    Subclass this to support another provider, or to run against a local stand-in.
+    Requests and results are lines of the OpenAI batch file format, i.e.
+    `{"custom_id", "method", "url", "body"}` and `{"custom_id", "response", "error"}`.
+    """
+
+    url: str = "/v1/chat/completions"
+
+    @abc.abstractmethod
+    async def submit(self, requests: list[dict]) -> str:
+        """Submit the requests, returning the id of the batch."""
+
+    @abc.abstractmethod
+    async def status(self, batch_id: str) -> str:
+        """Return the status of the batch, see `BATCH_FINAL_STATUSES`."""
+
+    @abc.abstractmethod
+    async def results(self, batch_id: str) -> list[dict]:
+        """Return the result lines of a finished batch, including failed requests."""
+
+    @abc.abstractmethod
+    async def cancel(self, batch_id: str) -> None:
+        """Cancel a batch that isn't finished, e.g. when its run is interrupted."""
+
+
+class OpenAIBatchTransport(BatchTransport):
+    """Batch API of OpenAI and Azure OpenAI, through the `files` and `batches` endpoints."""
+
+    def __init__(
+        self,
+        aclient: t.Any = None,
+        client_config: t.Optional[ClientConfig] = None,
+        completion_window: str = "24h",
+    ):
+        if aclient is None and client_config is None:
+            raise ValueError(
+                "Batch execution needs an OpenAI or Azure client, it isn't supported through litellm."
+            )
+        self._aclient = aclient
+        self.client_config = client_config
+        self.completion_window = completion_window
+        if client_config is not None and client_config.provider == "azure":
+            self.url = "/chat/completions"
+
+    @property
+    def aclient(self) -> t.Any:
+        aclient = self._aclient or get_async_client(self.client_config)  # type: ignore
+        if not hasattr(aclient, "batches"):
+            raise RuntimeError(
+                "The installed openai package doesn't support the batch API, please upgrade it."
+            )
+        return aclient
+
+    async def submit(self, requests: list[dict]) -> str:
+        content = "\n".join(json.dumps(request) for request in requests).encode("utf-8")
+        batch_file = await self.aclient.files.create(
+            file=("uptrain_batch.jsonl", content), purpose="batch"
+        )
+        batch = await self.aclient.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=self.url,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self.aclient.batches.retrieve(batch_id)
+        return batch.status
+
+    async def results(self, batch_id: str) -> list[dict]:
+        batch = await self.aclient.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is None:
+                continue
+            content = await self.aclient.files.content(file_id)
+            lines.extend(
+                json.loads(line) for line in content.text.splitlines() if line.strip()
+            )
+        return lines
+
+    async def cancel(self, batch_id: str) -> None:
+        await self.aclient.batches.cancel(batch_id)
+
+
+async def wait_for_batch(
+    transport: BatchTransport, batch_id: str, poll_interval: float
+) -> str:
+    """Poll the batch until it reaches a final status, which is returned. The batch
+    is cancelled if the wait is."""
+    try:
+        while True:
+            status = await transport.status(batch_id)
+            if status in BATCH_FINAL_STATUSES:
+                return status
+            await asyncio.sleep(poll_interval)
+    except asyncio.CancelledError:
+        try:
+            await transport.cancel(batch_id)
+        except Exception as e:
+            logger.warning(f"Could not cancel batch {batch_id}: {e}")
+        raise
+
+
+def make_batch_requests(
+    payloads: list["Payload"], url: str
+) -> tuple[list[dict], dict[str, "Payload"]]:
+    """Build the batch file lines for the payloads, and the payloads by `custom_id`.
+
+    The `custom_id` is the payload's `metadata["index"]`, made unique with the
+    position in the batch if several payloads share an index.
+    """
+    indices = [str(payload.metadata.get("index")) for payload in payloads]
+    unique = len(set(indices)) == len(indices)
+    requests, by_id = [], {}
+    for pos, (index, payload) in enumerate(zip(indices, payloads)):
+        custom_id = index if unique else f"{index}-{pos}"
+        body = {
+            key: value
+            for key, value in payload.data.items()
+            if key not in _LITELLM_ONLY_KEYS
+        }
+        requests.append({"custom_id": custom_id, "method": "POST", "url": url, "body": body})
+        by_id[custom_id] = payload
+    return requests, by_id
+
+
+def parse_batch_result(line: dict) -> tuple[t.Optional[t.Any], t.Optional[str]]:
+    """Return the chat completion of a result line, or the error message."""
+    from openai.types.chat import ChatCompletion
+
+    response = line.get("response") or {}
+    if line.get("error") is None and response.get("status_code") == 200:
+        try:
+            return ChatCompletion.model_validate(response["body"]), None
+        except Exception as e:
+            logger.warning(f"Could not parse the batch result {line.get('custom_id')}: {e}")
+            return None, str(e)
+    error = line.get("error") or response.get("body", {}).get("error") or response
+    return None, json.dumps(error) if not isinstance(error, str) else error
@@ -0,0 +1,280 @@
+"""
+On-disk cache for LLM responses, keyed on a canonical hash of the request payload.
+"""
+
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing as t
+
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+
+def canonical_hash(data: dict) -> str:
+    """Hash of the request data that is stable across dict ordering and runs."""
+    serialized = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def serialize_response(response: t.Any) -> t.Optional[str]:
+    """Serialize a chat completion (openai or litellm) to a json string."""
+    try:
+        if hasattr(response, "model_dump"):
+            return json.dumps(response.model_dump(mode="json"))
+        if hasattr(response, "json"):
+            return response.json()
+        return json.dumps(response)
+    except Exception as e:
+        logger.warning(f"Could not serialize LLM response for caching: {e}")
+        return None
+
+
+def deserialize_response(value: str) -> t.Any:
+    """Rebuild a chat completion object from its serialized form."""
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate(json.loads(value))
+
+
+class ResponseCache:
+    """A SQLite backed cache of LLM responses with TTL and size based eviction.
+
+    Attributes:
+        fpath: Path to the SQLite database file.
+        ttl: Seconds after which an entry expires. `None` means entries never expire.
+        max_size_mb: Upper bound on the total size of the cached responses. Least
+            recently used entries are evicted once it is crossed.
+        bypass: If set, lookups always miss but fresh responses are still written,
+            which refreshes the cache.
+        hits/misses/evictions: Counters for the lifetime of this object.
+
+    Caches are shared by all clients of the process with the same options, see
+    `ResponseCache.shared`, so a database is opened once rather than per operator.
+    """
+
+    _registry: dict[tuple, "ResponseCache"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        fpath: str,
+        ttl: t.Optional[float] = None,
+        max_size_mb: float = 512,
+        bypass: bool = False,
+    ):
+        self.fpath = fpath
+        self.ttl = ttl
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        dirname = os.path.dirname(fpath)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(fpath, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def shared(
+        cls,
+        fpath: str,
+        ttl: t.Optional[float] = None,
+        max_size_mb: float = 512,
+        bypass: bool = False,
+    ) -> "ResponseCache":
+        """The cache at `fpath` with the given options, opened on first use and shared
+        by all clients asking for it."""
+        key = (os.path.abspath(fpath), ttl, max_size_mb, bypass)
+        with cls._registry_lock:
+            cache = cls._registry.get(key)
+            if cache is None:
+                cache = cls._registry[key] = cls(fpath, ttl, max_size_mb, bypass)
+            return cache
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close the caches shared by the clients of the process."""
+        with cls._registry_lock:
+            caches = list(cls._registry.values())
+            cls._registry.clear()
+        for cache in caches:
+            cache.close()
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> t.Optional["ResponseCache"]:
+        """Create the cache configured in the settings, if caching is enabled."""
+        if not settings.response_cache:
+            return None
+        fpath = settings.response_cache_path
+        if fpath is None:
+            fpath = os.path.join(settings.logs_folder, "llm_response_cache.sqlite")
+        try:
+            return cls.shared(
+                fpath,
+                ttl=settings.response_cache_ttl,
+                max_size_mb=settings.response_cache_max_size_mb,
+                bypass=settings.response_cache_bypass,
+            )
+        except Exception as e:
+            logger.error(f"Could not open the LLM response cache at {fpath}: {e}")
+            return None
+
+    def get(self, key: str) -> t.Optional[str]:
+        """Return the serialized response for the key, if present and not expired."""
+        if self.bypass:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a serialized response, evicting old entries if over the size limit."""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+        (total_size,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total_size <= self.max_size_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall()
+        to_delete = []
+        for key, size in rows:
+            if total_size <= self.max_size_bytes:
+                break
+            to_delete.append((key,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self.evictions += len(to_delete)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries, total_size) = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": total_size,
+        }
+
+    def close(self) -> None:
+        with self._registry_lock:
+            for key, cache in list(self._registry.items()):
+                if cache is self:
+                    del self._registry[key]
+        with self._lock:
+            self._conn.close()
+
+
+class SingleFlight:
+    """Coalesces concurrent requests with the same key into a single in-flight request.
+
+    The first caller for a key (the leader) runs the request, and every caller that
+    arrives while it is in flight waits for the leader's result instead of sending a
+    duplicate. Results are shared through thread-safe futures, so callers on event
+    loops in different threads are coalesced too.
+    """
+
+    def __init__(self):
+        self._calls: dict[t.Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    async def do(
+        self, key: t.Hashable, func: t.Callable[[], t.Awaitable[t.Any]]
+    ) -> tuple[t.Any, bool]:
+        """Run `func` unless a call with the same key is in flight, in which case its
+        result is awaited. Returns the result and whether it was shared."""
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            try:
+                return await asyncio.wrap_future(future), True
+            except concurrent.futures.CancelledError:
+                # the leader was cancelled, the request has to be sent after all
+                return await func(), False
+
+        try:
+            result = await func()
+            future.set_result(result)
+            return result, False
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                # nobody may be waiting, avoid "exception was never retrieved" warnings
+                future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -0,0 +1,208 @@
+"""
+Fit prompts into the context window of the model before they are sent, instead of
+finding out from a `context_length_exceeded` error and retrying on a larger model.
+"""
+
+from __future__ import annotations
+import typing as t
+
+from loguru import logger
+
+from uptrain.operators.language.llm_tokens import (
+    DEFAULT_COMPLETION_TOKENS,
+    count_message_tokens,
+    count_text_tokens,
+    split_text_tokens,
+)
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+    from uptrain.operators.language.llm import Payload
+
+
+# Context window (prompt + completion tokens) per model. Model names are looked up
+# exactly first, then keys are matched as prefixes of the name, longest first, like
+# the price table. Dated snapshots whose window differs from the model alias must be
+# listed, e.g. the 4k snapshots of gpt-3.5-turbo.
+MODEL_CONTEXT_WINDOWS: dict[str, int] = {
+    "gpt-3.5-turbo": 16_385,
+    "gpt-3.5-turbo-0301": 4_096,
+    "gpt-3.5-turbo-0613": 4_096,
+    "gpt-3.5-turbo-instruct": 4_096,
+    "gpt-3.5-turbo-16k": 16_385,
+    "gpt-4": 8_192,
+    "gpt-4-0613": 8_192,
+    "gpt-4-32k": 32_768,
+    "gpt-4-turbo": 128_000,
+    "gpt-4-1106-preview": 128_000,
+    "gpt-4-0125-preview": 128_000,
+    "gpt-4-vision-preview": 128_000,
+    "gpt-4-1106-vision-preview": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "claude-instant-1.2": 100_000,
+    "claude-2.0": 100_000,
+    "claude-3": 200_000,
+    "mistral-small": 32_000,
+    "mistral-medium": 32_000,
+    "mistral-large": 32_000,
+}
+
+# The model with a larger context window to switch to, when a prompt doesn't fit.
+# refer - https://github.com/BerriAI/reliableGPT/
+LARGER_CONTEXT_MODELS: dict[str, str] = {
+    "gpt-3.5-turbo": "gpt-3.5-turbo-16k",
+    "gpt-3.5-turbo-0301": "gpt-3.5-turbo-16k",
+    "gpt-3.5-turbo-0613": "gpt-3.5-turbo-16k-0613",
+    "gpt-3.5-turbo-16k": "claude-instant-1.2",
+    "gpt-3.5-turbo-16k-0613": "claude-instant-1.2",
+    "gpt-4": "gpt-4-32k",
+    "gpt-4-0613": "gpt-4-32k-0613",
+    "gpt-4-32k": "claude-2.0",
+    "gpt-4-32k-0613": "claude-2.0",
+}
+
+# kept free besides the completion, as the token counts of non-openai models are
+# only estimates
+SAFETY_MARGIN_TOKENS = 16
+
+
+def get_context_window(
+    model: str, windows: t.Optional[t.Mapping[str, int]] = None
+) -> t.Optional[int]:
+    """Context window of a model in tokens, None if unknown.
+
+    Custom `windows` take precedence over the built-in table.
+    """
+    table = {**MODEL_CONTEXT_WINDOWS, **(windows or {})}
+    # strip provider prefixes like `azure/` or `openai/`
+    name = model.split("/")[-1]
+    if name in table:
+        return int(table[name])
+    for key in sorted(table, key=len, reverse=True):
+        if name.startswith(key + "-"):
+            return int(table[key])
+    return None
+
+
+def grade_rank(output: dict) -> t.Optional[float]:
+    """How favourable a grade is: a higher score, or an earlier choice (the options of
+    the templates are listed from the best to the worst)."""
+    score = output.get("Score")
+    if isinstance(score, (int, float)):
+        return float(score)
+    choice = output.get("Choice")
+    if isinstance(choice, str) and choice:
+        return -float(ord(choice.strip()[0].upper()))
+    return None
+
+
+class ContextFitter:
+    """Makes the prompt of every payload fit the context window of its model, along
+    with the expected completion.
+
+    Prompts that don't fit are handled as per the strategy:
+    - truncate: cut the context of the payload (see `LLMMulticlient.make_payload`)
+        down to what fits.
+    - chunk: split the context into pieces that fit and grade each piece separately,
+        the payload then gets the most favourable grade. Only for payloads that allow
+        it, the others are truncated.
+    - route: send the payload to a model with a larger context window right away.
+    Payloads that can't be truncated or chunked (no context) are routed.
+
+    Attributes:
+        strategy: One of "truncate", "chunk" or "route".
+        windows: Context windows of models missing from (or differing from)
+            `MODEL_CONTEXT_WINDOWS`.
+    """
+
+    def __init__(
+        self,
+        strategy: t.Literal["truncate", "chunk", "route"] = "route",
+        windows: t.Optional[t.Mapping[str, int]] = None,
+    ):
+        if strategy not in ("truncate", "chunk", "route"):
+            raise ValueError(
+                f"Unknown context overflow strategy {strategy}, expected truncate, chunk or route"
+            )
+        self.strategy = strategy
+        self.windows = dict(windows or {})
+
+    @classmethod
+    def from_settings(cls, settings: t.Optional["Settings"]) -> t.Optional["ContextFitter"]:
+        if settings is None or settings.context_overflow is None:
+            return None
+        return cls(settings.context_overflow, settings.context_windows)
+
+    def fit(self, payload: "Payload") -> list["Payload"]:
+        """The payload, truncated or routed in place if needed, or its chunks."""
+        model = payload.data["model"]
+        window = get_context_window(model, self.windows)
+        if window is None:
+            return [payload]
+        prompt_tokens = count_message_tokens(payload.data["messages"], model)
+        payload.metadata["prompt_tokens"] = prompt_tokens
+        budget = window - self._completion_tokens(payload) - SAFETY_MARGIN_TOKENS
+        excess = prompt_tokens - budget
+        if excess <= 0:
+            return [payload]
+
+        span = payload.metadata.get("context_span")
+        if self.strategy != "route" and span is not None:
+            prompt = payload.data["messages"][0]["content"]
+            context = prompt[span[0] : span[1]]
+            context_tokens = count_text_tokens(context, model)
+            if context_tokens > excess:
+                pieces = split_text_tokens(context, context_tokens - excess, model)
+                if self.strategy == "chunk" and payload.metadata.get("chunkable"):
+                    logger.info(
+                        f"Grading the context of payload {payload.metadata.get('index')} in {len(pieces)} chunks to fit {model}"
+                    )
+                    return [
+                        self._with_context(payload, piece, chunk=idx)
+                        for idx, piece in enumerate(pieces)
+                    ]
+                logger.info(
+                    f"Truncating the context of payload {payload.metadata.get('index')} by {excess} tokens to fit {model}"
+                )
+                fitted = self._with_context(payload, pieces[0])
+                payload.data = fitted.data
+                payload.metadata = fitted.metadata
+                return [payload]
+        self._route(payload, prompt_tokens)
+        return [payload]
+
+    def _completion_tokens(self, payload: "Payload") -> int:
+        return payload.data.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+
+    def _with_context(
+        self, payload: "Payload", context: str, chunk: t.Optional[int] = None
+    ) -> "Payload":
+        start, end = payload.metadata["context_span"]
+        prompt = payload.data["messages"][0]["content"]
+        data = dict(
+            payload.data,
+            messages=[{"role": "user", "content": prompt[:start] + context + prompt[end:]}],
+        )
+        metadata = dict(payload.metadata, context_span=[start, start + len(context)])
+        metadata["prompt_tokens"] = count_message_tokens(data["messages"], data["model"])
+        if chunk is not None:
+            metadata["chunk"] = chunk
+        return type(payload)(data=data, metadata=metadata)
+
+    def _route(self, payload: "Payload", prompt_tokens: int) -> None:
+        model = payload.data["model"]
+        candidate = LARGER_CONTEXT_MODELS.get(model)
+        while candidate is not None:
+            window = get_context_window(candidate, self.windows)
+            if window is None or prompt_tokens <= window - self._completion_tokens(payload):
+                logger.info(
+                    f"Switching to larger context model {candidate} for payload {payload.metadata.get('index')}"
+                )
+                payload.data["model"] = candidate
+                # counted with the tokenizer of the previous model, good enough for the limiter
+                return
+            candidate = LARGER_CONTEXT_MODELS.get(candidate)
+        logger.warning(
+            f"The prompt of payload {payload.metadata.get('index')} ({prompt_tokens} tokens) doesn't fit the context window of {model}"
+        )
@@ -0,0 +1,254 @@
+"""
+Pricing of LLM requests: a price table, a tracker that enforces a cost budget at
+runtime, and a dry-run mode in which payloads are captured instead of sent, to
+estimate the cost of an evaluation up front.
+"""
+
+from __future__ import annotations
+import contextlib
+import contextvars
+import threading
+import typing as t
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from uptrain.operators.language.llm_tokens import (
+    DEFAULT_COMPLETION_TOKENS,
+    count_message_tokens,
+)
+
+if t.TYPE_CHECKING:
+    from uptrain.operators.language.llm import Payload
+
+
+# USD per million (prompt, completion) tokens. Keys are matched as prefixes of the
+# model name, longest first, so dated snapshots resolve to their family.
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-3.5-turbo-16k": (3.0, 4.0),
+    "gpt-3.5-turbo-0613": (1.5, 2.0),
+    "gpt-3.5-turbo-1106": (1.0, 2.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-32k": (60.0, 120.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4-1106-preview": (10.0, 30.0),
+    "gpt-4-0125-preview": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "claude-instant-1.2": (0.8, 2.4),
+    "claude-2.0": (8.0, 24.0),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3-opus": (15.0, 75.0),
+    "mistral-small": (2.0, 6.0),
+    "mistral-medium": (2.7, 8.1),
+    "mistral-large": (8.0, 24.0),
+}
+
+# Batch APIs bill half the regular price
+BATCH_DISCOUNT = 0.5
+
+
+class CostBudgetExceeded(Exception):
+    """Raised instead of sending a request once the cost budget is spent."""
+
+
+def get_model_price(
+    model: str, prices: t.Optional[t.Mapping[str, t.Sequence[float]]] = None
+) -> t.Optional[tuple[float, float]]:
+    """Price per million (prompt, completion) tokens of a model, None if unknown.
+
+    Custom `prices` take precedence over the built-in table.
+    """
+    table = {**MODEL_PRICES, **(prices or {})}
+    # strip provider prefixes like `azure/` or `openai/`
+    name = model.split("/")[-1]
+    for key in sorted(table, key=len, reverse=True):
+        if name == key or name.startswith(key + "-"):
+            prompt_price, completion_price = table[key]
+            return float(prompt_price), float(completion_price)
+    return None
+
+
+def compute_cost(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    prices: t.Optional[t.Mapping[str, t.Sequence[float]]] = None,
+    batch: bool = False,
+) -> t.Optional[float]:
+    """Cost in USD of a request, None if the model's price is unknown."""
+    price = get_model_price(model, prices)
+    if price is None:
+        return None
+    cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+class CostTracker:
+    """Thread-safe running total of the cost of LLM requests, against a budget.
+
+    Attributes:
+        max_cost: Budget in USD. None means unlimited.
+        spent: Cost of the requests accounted for so far.
+        unpriced_models: Models whose price is unknown, and so aren't accounted for.
+    """
+
+    def __init__(
+        self,
+        max_cost: t.Optional[float] = None,
+        prices: t.Optional[t.Mapping[str, t.Sequence[float]]] = None,
+    ):
+        self.max_cost = max_cost
+        self.prices = prices
+        self.spent = 0.0
+        self.unpriced_models: set[str] = set()
+        self._warned = False
+        self._lock = threading.Lock()
+
+    @property
+    def exceeded(self) -> bool:
+        return self.max_cost is not None and self.spent >= self.max_cost
+
+    def check(self) -> None:
+        """Raise `CostBudgetExceeded` if no more requests may be sent."""
+        if not self.exceeded:
+            return
+        with self._lock:
+            if not self._warned:
+                self._warned = True
+                logger.warning(
+                    f"Spent ${self.spent:.4f} on LLM requests, over the budget of "
+                    f"${self.max_cost:.4f}. The remaining requests are cancelled."
+                )
+        raise CostBudgetExceeded(
+            f"The cost budget of ${self.max_cost:.4f} is exhausted (spent ${self.spent:.4f})"
+        )
+
+    def add(
+        self, model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False
+    ) -> None:
+        cost = compute_cost(model, prompt_tokens, completion_tokens, self.prices, batch)
+        with self._lock:
+            if cost is None:
+                if model not in self.unpriced_models:
+                    logger.warning(f"No price known for {model}, its cost isn't tracked")
+                    self.unpriced_models.add(model)
+                return
+            self.spent += cost
+
+
+_COST_TRACKER: contextvars.ContextVar[t.Optional[CostTracker]] = contextvars.ContextVar(
+    "uptrain_cost_tracker", default=None
+)
+
+
+def get_cost_tracker() -> t.Optional[CostTracker]:
+    """The tracker of the enclosing `cost_budget` block, if any."""
+    return _COST_TRACKER.get()
+
+
+@contextlib.contextmanager
+def cost_budget(
+    max_cost: t.Optional[float],
+    prices: t.Optional[t.Mapping[str, t.Sequence[float]]] = None,
+    tracker: t.Optional[CostTracker] = None,
+) -> t.Iterator[CostTracker]:
+    """Share a single cost budget between all LLM requests made in the block, from
+    any operator. With a `tracker`, the block shares its budget instead, e.g. with
+    other blocks on other threads."""
+    if tracker is None:
+        tracker = CostTracker(max_cost, prices)
+    token = _COST_TRACKER.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _COST_TRACKER.reset(token)
+
+
+# -----------------------------------------------------------
+# Dry runs, to estimate costs up front
+# -----------------------------------------------------------
+
+
+class ModelCostEstimate(BaseModel):
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: t.Optional[float] = 0.0
+
+
+class CostEstimate(BaseModel):
+    """Estimated tokens and cost of an evaluation, per model and per operator.
+
+    Completion tokens are estimated from `max_tokens` where set, else a typical
+    completion size. Operators that chain LLM calls, i.e. render prompts from earlier
+    responses, only account for the calls they can make without responses.
+    """
+
+    models: dict[str, ModelCostEstimate] = Field(default_factory=dict)
+    operators: dict[str, ModelCostEstimate] = Field(default_factory=dict)
+
+    @property
+    def total_cost(self) -> t.Optional[float]:
+        """Total in USD, None if the price of a model is unknown."""
+        costs = [estimate.cost for estimate in self.models.values()]
+        return None if any(cost is None for cost in costs) else sum(costs)  # type: ignore
+
+    @property
+    def total_requests(self) -> int:
+        return sum(estimate.requests for estimate in self.models.values())
+
+
+class PayloadCapture:
+    """Payloads collected by LLM clients during a dry run, tagged by operator."""
+
+    def __init__(self):
+        self.payloads: list[tuple[str, "Payload"]] = []
+        self._lock = threading.Lock()
+
+    def add(self, operator_name: str, payload: "Payload") -> None:
+        with self._lock:
+            self.payloads.append((operator_name, payload))
+
+    def estimate(
+        self,
+        prices: t.Optional[t.Mapping[str, t.Sequence[float]]] = None,
+        batch: bool = False,
+    ) -> CostEstimate:
+        estimate = CostEstimate()
+        for operator_name, payload in self.payloads:
+            model = payload.data["model"]
+            prompt_tokens = count_message_tokens(payload.data["messages"], model)
+            completion_tokens = payload.data.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+            cost = compute_cost(model, prompt_tokens, completion_tokens, prices, batch)
+            for group, key in ((estimate.models, model), (estimate.operators, operator_name)):
+                entry = group.setdefault(key, ModelCostEstimate())
+                entry.requests += 1
+                entry.prompt_tokens += prompt_tokens
+                entry.completion_tokens += completion_tokens
+                entry.cost = None if entry.cost is None or cost is None else entry.cost + cost
+        return estimate
+
+
+_CAPTURE: contextvars.ContextVar[t.Optional[PayloadCapture]] = contextvars.ContextVar(
+    "uptrain_payload_capture", default=None
+)
+
+
+def get_payload_capture() -> t.Optional[PayloadCapture]:
+    """The capture of the enclosing `capture_payloads` block, if any."""
+    return _CAPTURE.get()
+
+
+@contextlib.contextmanager
+def capture_payloads() -> t.Iterator[PayloadCapture]:
+    """Dry run: LLM clients in the block record their payloads instead of sending
+    them, and return them without a response."""
+    capture = PayloadCapture()
+    token = _CAPTURE.set(capture)
+    try:
+        yield capture
+    finally:
+        _CAPTURE.reset(token)
@@ -0,0 +1,191 @@
+"""
+Load balancing of LLM requests over several API keys or deployments.
+"""
+
+from __future__ import annotations
+import threading
+import time
+import typing as t
+
+from loguru import logger
+
+from uptrain.operators.language.llm_ratelimit import RateLimiter
+from uptrain.operators.language.llm_runner import ClientConfig, get_async_client
+from uptrain.operators.language.llm_scheduler import get_shared_limiter
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+
+class Endpoint:
+    """An API key or deployment that requests can be sent to.
+
+    Every endpoint has its own rate limiter and health state. An endpoint that fails
+    repeatedly (timeouts, connection or server errors) is taken out of rotation for a
+    cooldown that grows with every further failure.
+
+    Attributes:
+        name: Identifies the endpoint in logs.
+        aclient: Client to send requests with. If None, a pooled client is created from
+            `client_config`, and if that is None too, requests go through litellm.
+        client_config: Configuration of the pooled client.
+        model: Model (or Azure deployment) to request, overriding the one in the payload.
+        weight: Relative share of the traffic, e.g. 2 for a key with twice the quota.
+        limiter: Rate limiter for the endpoint. Pass a shared one (see
+            `llm_scheduler.get_shared_limiter`) if other endpoints use the same key,
+            otherwise the endpoint gets its own.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm_limit: float,
+        tpm_limit: float,
+        aclient: t.Any = None,
+        client_config: t.Optional[ClientConfig] = None,
+        model: t.Optional[str] = None,
+        weight: float = 1.0,
+        adaptive: bool = False,
+        max_concurrency: int = 256,
+        failure_threshold: int = 3,
+        base_cooldown: float = 5.0,
+        max_cooldown: float = 60.0,
+        limiter: t.Optional[RateLimiter] = None,
+    ):
+        if weight <= 0:
+            raise ValueError(f"Weight of endpoint {name} must be positive, got {weight}")
+        self.name = name
+        self.aclient = aclient
+        self.client_config = client_config
+        self.model = model
+        self.weight = weight
+        self.limiter = limiter or RateLimiter(
+            rpm_limit, tpm_limit, adaptive=adaptive, max_concurrency=max_concurrency
+        )
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._consecutive_failures = 0
+        self._unhealthy_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(
+        cls, config: dict, settings: "Settings", name: t.Optional[str] = None
+    ) -> "Endpoint":
+        """Create an endpoint from an entry of `Settings.llm_endpoints`."""
+        config = dict(config)
+        provider = config.pop("provider", "openai")
+        client_kwargs = {
+            key: config.pop(key)
+            for key in ("api_key", "base_url", "api_version")
+            if key in config
+        }
+        client_config = None
+        if provider in ("openai", "azure"):
+            client_config = ClientConfig.from_settings(settings, provider, **client_kwargs)
+        elif provider != "litellm":
+            raise ValueError(
+                f"Unknown provider {provider} for an LLM endpoint, expected one of openai, azure, litellm"
+            )
+        rpm_limit = config.pop("rpm_limit", settings.rpm_limit)
+        tpm_limit = config.pop("tpm_limit", settings.tpm_limit)
+        return cls(
+            name=config.pop("name", name or provider),
+            rpm_limit=rpm_limit,
+            tpm_limit=tpm_limit,
+            client_config=client_config,
+            adaptive=settings.adaptive_rate_limit,
+            max_concurrency=settings.max_concurrency,
+            limiter=get_shared_limiter(
+                settings,
+                rpm_limit,
+                tpm_limit,
+                client_config=client_config,
+                model=config.get("model"),
+            ),
+            **config,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self.limiter.in_flight
+
+    @property
+    def load(self) -> float:
+        """Requests sent or waiting for the rate limiter, relative to the weight."""
+        return (self.limiter.in_flight + self.limiter.queued + 1) / self.weight
+
+    def is_healthy(self, now: t.Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) >= self._unhealthy_until
+
+    def get_aclient(self) -> t.Any:
+        """The client to send requests with, on the currently running loop."""
+        if self.aclient is not None or self.client_config is None:
+            return self.aclient
+        return get_async_client(self.client_config)
+
+    def prepare(self, data: dict) -> dict:
+        """The request data to send to this endpoint."""
+        if self.model is None:
+            return data
+        return {**data, "model": self.model}
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._unhealthy_until = 0.0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            excess = self._consecutive_failures - self.failure_threshold
+            if excess < 0:
+                return
+            cooldown = min(self.max_cooldown, self.base_cooldown * 2**excess)
+            self._unhealthy_until = time.monotonic() + cooldown
+        logger.warning(
+            f"LLM endpoint {self.name} failed {self._consecutive_failures} times in a row, "
+            f"taking it out of rotation for {cooldown:.0f}s"
+        )
+
+    def __repr__(self) -> str:
+        return f"Endpoint(name={self.name!r}, weight={self.weight}, in_flight={self.in_flight})"
+
+
+class EndpointPool:
+    """Dispatches requests to the least loaded healthy endpoint."""
+
+    def __init__(self, endpoints: list[Endpoint]):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = endpoints
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> t.Optional["EndpointPool"]:
+        """Create the pool configured in `Settings.llm_endpoints`, if any."""
+        if not settings.llm_endpoints:
+            return None
+        return cls(
+            [
+                Endpoint.from_dict(config, settings, name=f"endpoint-{idx}")
+                for idx, config in enumerate(settings.llm_endpoints)
+            ]
+        )
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def select(self, exclude: t.Collection[Endpoint] = ()) -> Endpoint:
+        """Pick the endpoint for the next request.
+
+        Endpoints in `exclude` (e.g. the one a request just failed on) are only picked
+        if no other endpoint is healthy. If none is healthy at all, the one that
+        recovers first is picked.
+        """
+        now = time.monotonic()
+        healthy = [ep for ep in self.endpoints if ep.is_healthy(now)]
+        candidates = [ep for ep in healthy if ep not in exclude] or healthy
+        if not candidates:
+            return min(self.endpoints, key=lambda ep: ep._unhealthy_until)
+        return min(candidates, key=lambda ep: ep.load)
@@ -0,0 +1,227 @@
+"""
+Hedged LLM requests: if a request takes longer than usual, a backup is sent and
+whichever returns first is used.
+"""
+
+from __future__ import annotations
+import asyncio
+import collections
+import threading
+import time
+import typing as t
+
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+T = t.TypeVar("T")
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful requests.
+
+    Trackers are shared by all clients of a provider and model in the process, see
+    `LatencyTracker.get`, so a client that only sends a few requests can still hedge
+    them against the latencies observed by the others.
+    """
+
+    _registry: dict[str, "LatencyTracker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, window: int = 512, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: collections.deque[float] = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str, window: int = 512) -> "LatencyTracker":
+        """The tracker of a provider and model, shared by all clients of it."""
+        with cls._registry_lock:
+            tracker = cls._registry.get(name)
+            if tracker is None:
+                tracker = cls._registry[name] = cls(window)
+            return tracker
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._registry_lock:
+            cls._registry.clear()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: t.Optional[int] = None) -> t.Optional[float]:
+        """The q-quantile of the latencies, or None until there are `min_samples`
+        (by default those of the tracker). With 0, this is 0 until the first sample is
+        recorded."""
+        if min_samples is None:
+            min_samples = self.min_samples
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            if not self._samples:
+                return 0.0
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class Hedger:
+    """Sends a backup request when the first one is slower than the observed
+    `quantile` latency, and keeps whichever succeeds first.
+
+    Attributes:
+        quantile: Latency quantile after which a backup request is sent.
+        budget: Maximum number of backup requests, as a fraction of all requests.
+        min_hedges: Number of backup requests allowed regardless of the budget, so
+            that a client sending a single request can still hedge it.
+        min_delay: Lower bound in seconds on the wait before sending a backup, and the
+            wait when no latencies have been observed yet (with `min_samples` 0).
+        min_samples: Number of latencies to observe before hedging.
+        requests/hedges/wins: Counters of requests, backups sent, and backups that
+            returned first.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        budget: float = 0.05,
+        min_delay: float = 0.5,
+        window: int = 512,
+        min_samples: int = 20,
+        min_hedges: int = 1,
+    ):
+        self.quantile = quantile
+        self.budget = budget
+        self.min_hedges = min_hedges
+        self.min_delay = min_delay
+        self.window = window
+        self.min_samples = min_samples
+        # latencies of requests run without a key, private to this hedger
+        self.latencies = LatencyTracker(window, min_samples)
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: t.Optional["Settings"]) -> t.Optional["Hedger"]:
+        """Create the hedger configured in the settings, if hedging is enabled."""
+        if settings is None or not settings.hedge_requests:
+            return None
+        return cls(
+            quantile=settings.hedge_quantile,
+            budget=settings.hedge_budget,
+            min_delay=settings.hedge_min_delay,
+            min_samples=settings.hedge_min_samples,
+        )
+
+    def get_latencies(self, key: t.Optional[str] = None) -> LatencyTracker:
+        """The process-wide latencies of the provider `key`, or those of this hedger."""
+        if key is None:
+            return self.latencies
+        return LatencyTracker.get(key, self.window)
+
+    def delay(self, key: t.Optional[str] = None) -> t.Optional[float]:
+        """Seconds to wait for a request before hedging, None if not known yet."""
+        latency = self.get_latencies(key).quantile(self.quantile, self.min_samples)
+        if latency is None:
+            return None
+        return max(self.min_delay, latency)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > max(self.min_hedges, self.budget * self.requests):
+                return False
+            self.hedges += 1
+            return True
+
+    async def run(
+        self,
+        primary: t.Callable[[t.Callable[[], None]], t.Awaitable[T]],
+        backup: t.Callable[[t.Callable[[], None]], t.Awaitable[T]],
+        key: t.Optional[str] = None,
+        discard: t.Optional[t.Callable[[T], None]] = None,
+    ) -> tuple[T, bool]:
+        """Run `primary`, hedging it with `backup` if it is slow. Returns the first
+        successful result, and whether it came from the backup. The slower request
+        is cancelled. If both fail, the error of the primary is raised.
+
+        Both are passed a callback to call once their request is actually sent, e.g.
+        after waiting for the rate limiter. Latencies are measured from then, and a
+        request that hasn't been sent yet isn't hedged, as its backup would only
+        queue up behind it. `discard` is called with the result of a request that
+        succeeded too, but lost the race.
+
+        `key` identifies the provider and model the request goes to, whose latencies
+        are shared with the other clients of the process."""
+        with self._lock:
+            self.requests += 1
+        latencies = self.get_latencies(key)
+        loop = asyncio.get_running_loop()
+        first_sent, second_sent = loop.create_future(), loop.create_future()
+        first = asyncio.ensure_future(primary(_mark_sent(first_sent)))
+        delay = self.delay(key)
+        try:
+            done: set = set()
+            if delay is not None:
+                await asyncio.wait({first, first_sent}, return_when=asyncio.FIRST_COMPLETED)
+                if first.done():
+                    done = {first}
+                else:
+                    done, _ = await asyncio.wait({first}, timeout=delay)
+            if delay is None or done or not self._take_budget():
+                result = await first
+                _record_latency(latencies, first_sent)
+                return result, False
+        except BaseException:
+            first.cancel()
+            raise
+
+        logger.debug(f"LLM request slower than {delay:.1f}s, sending a backup request")
+        second = asyncio.ensure_future(backup(_mark_sent(second_sent)))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                succeeded = [
+                    task
+                    for task in (first, second)
+                    if task in done and task.exception() is None
+                ]
+                if not succeeded:
+                    continue
+                task = succeeded[0]
+                if task is second:
+                    with self._lock:
+                        self.wins += 1
+                    _record_latency(latencies, second_sent)
+                else:
+                    _record_latency(latencies, first_sent)
+                if discard is not None:
+                    for other in succeeded[1:]:
+                        discard(other.result())
+                return task.result(), task is second
+            raise first.exception()  # type: ignore
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # let the cancelled request account for itself before returning
+                await asyncio.wait(pending)
+
+
+def _mark_sent(sent: asyncio.Future) -> t.Callable[[], None]:
+    def mark() -> None:
+        if not sent.done():
+            sent.set_result(time.monotonic())
+
+    return mark
+
+
+def _record_latency(latencies: LatencyTracker, sent: asyncio.Future) -> None:
+    if sent.done():
+        latencies.record(time.monotonic() - sent.result())
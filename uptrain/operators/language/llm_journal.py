@@ -0,0 +1,141 @@
+"""
+Crash-safe journal of the LLM responses of an evaluation, so that an interrupted run
+can be resumed without paying again for the requests that had completed.
+"""
+
+from __future__ import annotations
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import typing as t
+
+from loguru import logger
+
+from uptrain.operators.language.llm_cache import serialize_response
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+    from uptrain.operators.language.llm import Payload
+
+
+class ResponseJournal:
+    """Append-only log of completed LLM responses, one json line per payload with its
+    operator, row key (`metadata["index"]`), payload hash and response.
+
+    Lines are flushed as they are written and synced to disk at most every
+    `fsync_interval` seconds. A line torn by a crash is skipped when reading back.
+
+    Attributes:
+        fpath: Path of the journal file.
+        replayed: Number of responses served from the journal.
+        recorded: Number of responses written to the journal.
+    """
+
+    def __init__(self, fpath: str, resume: bool = False, fsync_interval: float = 1.0):
+        self.fpath = fpath
+        self.fsync_interval = fsync_interval
+        self.replayed = 0
+        self.recorded = 0
+        self._entries: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+
+        dirname = os.path.dirname(fpath)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if resume:
+            self._load()
+        self._file = open(fpath, "a" if resume else "w", encoding="utf-8")
+
+    @classmethod
+    def for_run(
+        cls, settings: "Settings", fingerprint: str, resume: bool = False
+    ) -> "ResponseJournal":
+        """The journal of a run in the logs folder, identified by a fingerprint of
+        its inputs so that re-running the same evaluation finds it."""
+        fpath = os.path.join(settings.logs_folder, "journals", f"{fingerprint}.jsonl")
+        if resume and not os.path.exists(fpath):
+            logger.info("No journal found for this evaluation, nothing to resume")
+        return cls(fpath, resume=resume)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.fpath):
+            return
+        with open(self.fpath, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._entries[(record["operator"], record["hash"])] = record["response"]
+                except (ValueError, KeyError):
+                    # torn write at the time of the crash
+                    continue
+        logger.info(f"Resuming from {len(self._entries)} journaled LLM responses")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, operator: str, payload_hash: str) -> t.Optional[str]:
+        """The serialized response journaled for the payload, if any."""
+        return self._entries.get((operator, payload_hash))
+
+    def record(self, operator: str, payload_hash: str, payload: "Payload") -> None:
+        """Journal the response of a completed payload. Errors aren't journaled, so
+        their requests are sent again on resume."""
+        if payload.response is None or payload.error is not None:
+            return
+        response = serialize_response(payload.response)
+        if response is None:
+            return
+        line = json.dumps(
+            {
+                "operator": operator,
+                "row": payload.metadata.get("index"),
+                "hash": payload_hash,
+                "response": response,
+            }
+        )
+        with self._lock:
+            if self._file.closed:
+                return
+            self._entries[(operator, payload_hash)] = response
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+
+    def close(self, remove: bool = False) -> None:
+        """Close the journal, and delete it if the run it covers completed."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+        if remove and os.path.exists(self.fpath):
+            os.remove(self.fpath)
+
+
+_JOURNAL: contextvars.ContextVar[t.Optional[ResponseJournal]] = contextvars.ContextVar(
+    "uptrain_response_journal", default=None
+)
+
+
+def get_journal() -> t.Optional[ResponseJournal]:
+    """The journal of the enclosing `journal_session` block, if any."""
+    return _JOURNAL.get()
+
+
+@contextlib.contextmanager
+def journal_session(journal: t.Optional[ResponseJournal]) -> t.Iterator[None]:
+    """Journal the responses of all LLM requests made in the block, and replay the
+    ones already in the journal."""
+    token = _JOURNAL.set(journal)
+    try:
+        yield
+    finally:
+        _JOURNAL.reset(token)
@@ -0,0 +1,147 @@
+"""
+Pack the grading prompts of several rows into one request.
+
+The eval templates share everything up to their "Task Data." section (instructions,
+few-shot examples, output format) between rows. A packed prompt keeps that prefix
+once, lists the task data of K rows as numbered items and asks for one result per
+item, which cuts the requests and prompt tokens of cheap classify evals about K-fold.
+"""
+
+from __future__ import annotations
+import json
+import re
+import typing as t
+
+from uptrain.operators.language.llm_cache import deserialize_response, serialize_response
+
+if t.TYPE_CHECKING:
+    from uptrain.operators.language.llm import Payload
+
+# spelled differently across the templates
+TASK_DATA_RE = re.compile(r"\nTask [Dd]ata[.:]\n")
+RESULTS_KEY = "Results"
+ITEM_KEY = "Item"
+
+PACK_INSTRUCTIONS = """
+The task data below has {num_items} items, numbered from 1 to {num_items}. Grade every item on its own, exactly as described above. Instead of a single JSON object, return the output only in the following JSON format, with one object per item and in the same order. Every object has the number of its item under "Item", then the keys of the output format above:
+{{
+    "Results": [
+        {{"Item": 1, ...}},
+        ...
+    ]
+}}
+"""
+
+
+def split_prompt(prompt: str) -> t.Optional[tuple[str, str]]:
+    """Split a grading prompt into the part shared between rows and the task data of
+    the row, None if the prompt doesn't follow the eval templates."""
+    match = TASK_DATA_RE.search(prompt)
+    if match is None:
+        return None
+    task_data = prompt[match.end() :].strip()
+    if task_data.endswith("[Output]:"):
+        task_data = task_data[: -len("[Output]:")].rstrip()
+    return prompt[: match.start()], task_data
+
+
+def _pack_group_key(payload: "Payload") -> t.Optional[tuple[str, str]]:
+    """Payloads can share a request if they only differ in their task data."""
+    messages = payload.data.get("messages", [])
+    if len(messages) != 1 or not isinstance(messages[0].get("content"), str):
+        return None
+    parts = split_prompt(messages[0]["content"])
+    if parts is None:
+        return None
+    params = {key: value for key, value in payload.data.items() if key != "messages"}
+    return parts[0], json.dumps(params, sort_keys=True, default=str)
+
+
+def make_packs(
+    payloads: list["Payload"], pack_size: int
+) -> tuple[list[tuple["Payload", list["Payload"]]], list["Payload"]]:
+    """Group the payloads into packs of at most `pack_size` members.
+
+    Returns the packed payloads along with their members, and the payloads that
+    have to be sent on their own (no template, or nothing to pack them with).
+    """
+    from uptrain.operators.language.llm import Payload
+
+    groups: dict[tuple[str, str], list[Payload]] = {}
+    singles = []
+    for payload in payloads:
+        key = _pack_group_key(payload)
+        if key is None:
+            singles.append(payload)
+        else:
+            groups.setdefault(key, []).append(payload)
+
+    packs = []
+    for (prefix, _), members in groups.items():
+        for start in range(0, len(members), pack_size):
+            chunk = members[start : start + pack_size]
+            if len(chunk) == 1:
+                singles.extend(chunk)
+                continue
+            items = "\n\n".join(
+                f"[Item {num}]\n{split_prompt(member.data['messages'][0]['content'])[1]}"
+                for num, member in enumerate(chunk, start=1)
+            )
+            prompt = (
+                prefix
+                + PACK_INSTRUCTIONS.format(num_items=len(chunk))
+                + "\nTask Data.\n"
+                + items
+                + "\n[Output]:\n"
+            )
+            data = dict(chunk[0].data, messages=[{"role": "user", "content": prompt}])
+            pack = Payload(
+                data=data,
+                metadata={
+                    "index": chunk[0].metadata.get("index"),
+                    "pack": [member.metadata.get("index") for member in chunk],
+                },
+            )
+            packs.append((pack, chunk))
+    return packs, singles
+
+
+def validate_pack(llm_output: dict) -> bool:
+    """A packed response is usable if it has a list of results, the results of the
+    items are validated one by one when unpacking."""
+    return isinstance(llm_output.get(RESULTS_KEY), list)
+
+
+def unpack_results(pack: "Payload", num_items: int) -> list[t.Optional[dict]]:
+    """The result of every item of a packed response, None for the missing ones."""
+    results: list[t.Optional[dict]] = [None] * num_items
+    if pack.response is None or pack.error is not None:
+        return results
+    output = pack.get_output().get(RESULTS_KEY)
+    if not isinstance(output, list):
+        return results
+    entries = [entry for entry in output if isinstance(entry, dict)]
+    numbered = all(isinstance(entry.get(ITEM_KEY), int) for entry in entries)
+    if not numbered and len(entries) != num_items:
+        # can't tell which result belongs to which item
+        return results
+    for position, entry in enumerate(entries):
+        num = entry[ITEM_KEY] if numbered else position + 1
+        if 1 <= num <= num_items and results[num - 1] is None:
+            results[num - 1] = {key: value for key, value in entry.items() if key != ITEM_KEY}
+    return results
+
+
+def make_item_response(pack_response: t.Any, result: dict) -> t.Any:
+    """A chat completion for one item, carrying its result as the message content.
+    The token usage stays with the packed request."""
+    completion = json.loads(serialize_response(pack_response) or "{}")
+    completion["choices"] = [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": json.dumps(result)},
+        }
+    ]
+    completion["usage"] = None
+    return deserialize_response(json.dumps(completion))
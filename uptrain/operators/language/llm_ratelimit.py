@@ -0,0 +1,404 @@
+"""
+Rate limiting for concurrent LLM requests.
+
+The limiter paces requests against "requests per minute" and "tokens per minute"
+budgets. In adaptive mode, it additionally:
+- learns the actual limits and remaining quota from the `x-ratelimit-*` response
+  headers (as sent by OpenAI/Azure, and forwarded by litellm), without exceeding
+  the configured limits, which may be set lower on purpose,
+- bounds the number of in-flight requests with an AIMD window, which grows
+  additively on success and shrinks multiplicatively on 429s.
+"""
+
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import re
+import threading
+import time
+import typing as t
+import weakref
+
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+_HEADER_PREFIXES = ("", "llm_provider-")
+
+# priority class of requests outside a scheduling session, see `llm_scheduler.PRIORITIES`
+PRIORITY_DEFAULT = 1
+
+
+def parse_duration(value: t.Any) -> t.Optional[float]:
+    """Parse durations like `1s`, `6m0s`, `20ms` or `0.5` into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = _DURATION_RE.findall(value)
+    if not matches:
+        return None
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in matches)
+
+
+def get_header(headers: t.Optional[t.Mapping], name: str) -> t.Optional[str]:
+    """Look up a header, including the `llm_provider-` prefixed copies litellm makes."""
+    if not headers:
+        return None
+    for prefix in _HEADER_PREFIXES:
+        value = headers.get(prefix + name)
+        if value is None and hasattr(headers, "items"):
+            # plain dicts are case sensitive, unlike httpx headers
+            value = next(
+                (v for k, v in headers.items() if k.lower() == prefix + name), None
+            )
+        if value is not None:
+            return value
+    return None
+
+
+def get_response_headers(obj: t.Any) -> t.Mapping:
+    """Extract HTTP headers from a litellm response or an (openai/litellm) exception."""
+    hidden_params = getattr(obj, "_hidden_params", None)
+    if isinstance(hidden_params, dict) and hidden_params.get("additional_headers"):
+        return hidden_params["additional_headers"]
+    response = getattr(obj, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        return headers
+    return {}
+
+
+class _Bucket:
+    """Leaky bucket that holds `capacity` units and drains fully over `period` seconds.
+    `ceiling` is the configured capacity, which learned limits don't exceed."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.ceiling = self.capacity
+        self.period = period
+        self.level = 0.0
+        self._last = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def leak(self, now: float) -> None:
+        self.level = max(0.0, self.level - (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units fit in the bucket. Assumes `leak` was called."""
+        amount = min(amount, self.capacity)
+        excess = self.level + amount - self.capacity
+        return 0.0 if excess <= 0 else excess / self.rate
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "tokens", "reason", "session", "tag")
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, tokens: float, session: t.Any = None
+    ):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.tokens = tokens
+        # what the waiter is currently held back by
+        self.reason = "queue"
+        self.session = session
+        # virtual start tag for fair queuing, see `RateLimiter._order_key`
+        self.tag = 0.0
+
+    def wake(self) -> None:
+        def _set():
+            if not self.future.done():
+                self.future.set_result(None)
+
+        try:
+            self.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            pass  # loop is closed, the waiter is gone anyway
+
+
+class RateLimiter:
+    """Paces LLM requests against RPM/TPM budgets, optionally adapting to the server.
+
+    Requests are admitted by the priority class of their scheduling session (see
+    `llm_scheduler`), and within a class by start-time fair queuing: every session
+    gets a share of the admissions proportional to its weight, however many requests
+    it queues. Without sessions, this is FIFO order. The limiter is safe to share
+    between event loops running in different threads.
+
+    Attributes:
+        rpm_limit: Requests per minute budget.
+        tpm_limit: Tokens per minute budget.
+        adaptive: Whether to learn limits from response headers and bound concurrency
+            with an AIMD window. The limits learned are capped at the configured ones.
+        concurrency: Current size of the in-flight window (only used if adaptive).
+        max_concurrency: Upper bound for the in-flight window.
+        min_concurrency: Lower bound for the in-flight window.
+        backoff_factor: Multiplier applied to the window on a 429.
+        cooldown: Seconds during which further 429s don't shrink the window again, so a
+            single burst of rejections only counts once.
+    """
+
+    def __init__(
+        self,
+        rpm_limit: float,
+        tpm_limit: float,
+        adaptive: bool = False,
+        initial_concurrency: int = 16,
+        max_concurrency: int = 256,
+        min_concurrency: int = 1,
+        backoff_factor: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.adaptive = adaptive
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(
+            max(min_concurrency, min(initial_concurrency, max_concurrency))
+        )
+        self.backoff_factor = backoff_factor
+        self.cooldown = cooldown
+
+        self._requests = _Bucket(rpm_limit)
+        self._tokens = _Bucket(tpm_limit)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._queue: list[tuple[t.Any, int, _Waiter]] = []
+        self._seq = itertools.count()
+        # fair queuing state: virtual time, and the finish tag of the last request
+        # queued per session
+        self._virtual_time = 0.0
+        self._finish_tags: weakref.WeakKeyDictionary[t.Any, float] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._default_finish_tag = 0.0
+
+    @classmethod
+    def from_settings(
+        cls, settings: t.Optional["Settings"], rpm_limit: float, tpm_limit: float
+    ) -> "RateLimiter":
+        if settings is None:
+            return cls(rpm_limit, tpm_limit)
+        return cls(
+            rpm_limit,
+            tpm_limit,
+            adaptive=settings.adaptive_rate_limit,
+            max_concurrency=settings.max_concurrency,
+        )
+
+    @property
+    def rpm_limit(self) -> float:
+        return self._requests.capacity
+
+    @property
+    def tpm_limit(self) -> float:
+        return self._tokens.capacity
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting to be admitted."""
+        return len(self._queue)
+
+    def _order_key(self, waiter: _Waiter) -> t.Any:
+        """Priority class, then virtual start time: a session's requests are spaced
+        1/weight apart, starting no earlier than the current virtual time, so a new or
+        idle session doesn't wait behind the backlog of a busy one."""
+        session = waiter.session
+        if session is None:
+            waiter.tag = max(self._default_finish_tag, self._virtual_time)
+            self._default_finish_tag = waiter.tag + 1.0
+            return (PRIORITY_DEFAULT, waiter.tag)
+        waiter.tag = max(self._finish_tags.get(session, 0.0), self._virtual_time)
+        self._finish_tags[session] = waiter.tag + 1.0 / session.weight
+        return (session.rank, waiter.tag)
+
+    async def acquire(self, tokens: float = 0, session: t.Any = None) -> dict[str, float]:
+        """Wait until a request consuming `tokens` tokens can be sent. `session` is
+        the `llm_scheduler.SchedulingSession` the request belongs to, if any.
+
+        Every successful `acquire` must be paired with a `release` once the request
+        is done. Returns the seconds spent waiting, by what the request waited for:
+        its turn in the queue (or the concurrency window), the requests budget, the
+        tokens budget, or a block requested by the server.
+        """
+        waiter = _Waiter(asyncio.get_running_loop(), tokens, session)
+        waits = {"queue": 0.0, "requests": 0.0, "tokens": 0.0, "blocked": 0.0}
+        with self._lock:
+            heapq.heappush(
+                self._queue, (self._order_key(waiter), next(self._seq), waiter)
+            )
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_admit(waiter)
+                    if delay is None:
+                        waiter.reason = "queue"
+                        waiter.future = waiter.loop.create_future()
+                if delay is not None and delay <= 0:
+                    return waits
+                start = time.monotonic()
+                if delay is None:
+                    await waiter.future
+                else:
+                    await asyncio.sleep(delay)
+                waits[waiter.reason] += time.monotonic() - start
+        except BaseException:
+            with self._lock:
+                self._remove(waiter)
+            raise
+
+    def _try_admit(self, waiter: _Waiter) -> t.Optional[float]:
+        """Admit the waiter if possible. Returns 0 when admitted, the time to sleep
+        if the waiter is next in line but the budget is exhausted, or None if it
+        must wait to be woken up."""
+        if not self._queue or self._queue[0][2] is not waiter:
+            return None
+        if self.adaptive and self._in_flight >= int(self.concurrency):
+            return None
+        now = time.monotonic()
+        if self._blocked_until > now:
+            waiter.reason = "blocked"
+            return self._blocked_until - now
+        self._requests.leak(now)
+        self._tokens.leak(now)
+        requests_delay = self._requests.wait_time(1)
+        tokens_delay = self._tokens.wait_time(waiter.tokens)
+        if requests_delay > 0 or tokens_delay > 0:
+            waiter.reason = "requests" if requests_delay >= tokens_delay else "tokens"
+            return max(requests_delay, tokens_delay)
+        self._requests.level += 1
+        self._tokens.level += min(waiter.tokens, self._tokens.capacity)
+        self._in_flight += 1
+        self._virtual_time = max(self._virtual_time, waiter.tag)
+        heapq.heappop(self._queue)
+        self._wake_next()
+        return 0.0
+
+    def _remove(self, waiter: _Waiter) -> None:
+        for idx, entry in enumerate(self._queue):
+            if entry[2] is waiter:
+                self._queue.pop(idx)
+                heapq.heapify(self._queue)
+                self._wake_next()
+                return
+
+    def _wake_next(self) -> None:
+        if self._queue:
+            self._queue[0][2].wake()
+
+    def release(self) -> None:
+        """Mark a request admitted by `acquire` as finished."""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._wake_next()
+
+    def adjust_tokens(self, delta: float) -> None:
+        """Correct the tokens charged for a request once its actual usage is known.
+
+        A positive delta debits the budget further (the request used more than was
+        reserved), while a negative one refunds the unused reservation.
+        """
+        with self._lock:
+            self._tokens.leak(time.monotonic())
+            self._tokens.level = max(0.0, self._tokens.level + delta)
+            if delta < 0:
+                self._wake_next()
+
+    def configure(
+        self,
+        rpm_limit: float,
+        tpm_limit: float,
+        adaptive: t.Optional[bool] = None,
+        max_concurrency: t.Optional[int] = None,
+    ) -> None:
+        """Apply new configured limits, raising or lowering the budgets. Limits learned
+        from response headers stay below them. `adaptive` and `max_concurrency` are
+        updated too, when passed."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket, limit in ((self._requests, rpm_limit), (self._tokens, tpm_limit)):
+                bucket.leak(now)
+                limit = float(limit)
+                # a raised ceiling is used until the server says otherwise
+                bucket.capacity = limit if limit > bucket.ceiling else min(bucket.capacity, limit)
+                bucket.ceiling = limit
+            if adaptive is not None:
+                self.adaptive = adaptive
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+                self.concurrency = max(
+                    self.min_concurrency, min(self.concurrency, max_concurrency)
+                )
+            self._wake_next()
+
+    def record_success(self, headers: t.Optional[t.Mapping] = None) -> None:
+        """Feed back a successful response, growing the in-flight window."""
+        if not self.adaptive:
+            return
+        with self._lock:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / max(self.concurrency, 1)
+            )
+            self._update_from_headers(headers)
+            self._wake_next()
+
+    def record_rate_limited(self, headers: t.Optional[t.Mapping] = None) -> None:
+        """Feed back a 429 response, shrinking the in-flight window."""
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_decrease >= self.cooldown:
+                self.concurrency = max(
+                    self.min_concurrency, self.concurrency * self.backoff_factor
+                )
+                self._last_decrease = now
+                logger.info(
+                    f"Rate limited by the LLM API, reducing concurrency to {int(self.concurrency)}"
+                )
+            retry_after = parse_duration(get_header(headers, "retry-after"))
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._update_from_headers(headers)
+
+    def _update_from_headers(self, headers: t.Optional[t.Mapping]) -> None:
+        if not headers:
+            return
+        now = time.monotonic()
+        for bucket, kind in ((self._requests, "requests"), (self._tokens, "tokens")):
+            try:
+                limit = get_header(headers, f"x-ratelimit-limit-{kind}")
+                remaining = get_header(headers, f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(get_header(headers, f"x-ratelimit-reset-{kind}"))
+                if limit is not None and float(limit) > 0:
+                    bucket.capacity = min(bucket.ceiling, float(limit))
+                if remaining is not None:
+                    remaining = float(remaining)
+                    bucket.leak(now)
+                    # align with the server's view, which includes other clients of the key
+                    bucket.level = min(
+                        bucket.capacity,
+                        max(bucket.level, bucket.capacity - remaining),
+                    )
+                    if remaining <= 0 and reset is not None:
+                        self._blocked_until = max(self._blocked_until, now + reset)
+            except (TypeError, ValueError):
+                continue
@@ -0,0 +1,304 @@
+"""
+Retry policy for failed LLM requests.
+"""
+
+from __future__ import annotations
+import email.utils
+import random
+import sys
+import threading
+import time
+import typing as t
+
+import openai
+
+from loguru import logger
+
+from uptrain.operators.language.llm_ratelimit import (
+    get_header,
+    get_response_headers,
+    parse_duration,
+)
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+
+class ResponseValidationError(Exception):
+    """Raised when the LLM response doesn't pass the validation function."""
+
+
+# error classes that indicate the provider is down, rather than a problem with a request
+OUTAGE_ERROR_CLASSES = ("timeout", "connection", "server")
+
+
+# error class -> max number of retries for a single payload
+DEFAULT_RETRY_BUDGETS = {
+    "rate_limit": 6,
+    "timeout": 3,
+    "connection": 3,
+    "server": 3,
+    "validation": 3,
+}
+
+
+class RetryState:
+    """Retry bookkeeping shared by all payloads of a run, to enforce the deadline."""
+
+    def __init__(self, deadline: t.Optional[float] = None):
+        self.started_at = time.monotonic()
+        self.deadline_at = None if deadline is None else self.started_at + deadline
+        self.retries = 0
+        self.sleep_time = 0.0
+
+    def time_left(self) -> float:
+        if self.deadline_at is None:
+            return float("inf")
+        return self.deadline_at - time.monotonic()
+
+
+class RetryPolicy:
+    """Decides whether, and after how long, a failed request is retried.
+
+    Delays follow capped exponential backoff with full jitter, i.e. uniformly random
+    in `[0, min(max_delay, base_delay * multiplier ** retry)]`, unless the server
+    asks for a specific wait through the `Retry-After` header, which is capped at
+    `max_delay` too. Validation failures are retried immediately.
+
+    Subclass and override `classify`/`compute_delay` to customize the behaviour.
+
+    Attributes:
+        max_attempts: Maximum number of attempts (including the first) for a payload.
+        base_delay: Delay in seconds for the first retry.
+        max_delay: Cap on the delay before a retry, in seconds.
+        multiplier: Growth factor of the backoff delay per retry.
+        deadline: Seconds after the start of a run, beyond which no more retries are made.
+        budgets: Maximum number of retries per error class for a payload. Error classes
+            missing from this dict are not retried.
+        circuit_breaker_threshold: Consecutive outage errors (timeouts, connection and
+            server errors) after which requests to a provider fail fast. 0 (the default)
+            disables it.
+        circuit_breaker_reset_timeout: Seconds after which a tripped circuit lets a
+            probe request through.
+        fallback_model: Model (routed through litellm) to send requests to while the
+            circuit of their provider is open, instead of failing them. Needs
+            `circuit_breaker_threshold` to be set.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        multiplier: float = 2.0,
+        deadline: t.Optional[float] = None,
+        budgets: t.Optional[dict[str, int]] = None,
+        circuit_breaker_threshold: int = 0,
+        circuit_breaker_reset_timeout: float = 30.0,
+        fallback_model: t.Optional[str] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.deadline = deadline
+        self.budgets = {**DEFAULT_RETRY_BUDGETS, **(budgets or {})}
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_reset_timeout = circuit_breaker_reset_timeout
+        self.fallback_model = fallback_model
+
+    @classmethod
+    def from_settings(cls, settings: t.Optional["Settings"]) -> "RetryPolicy":
+        if settings is None:
+            return cls()
+        return cls(
+            max_attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+            deadline=settings.retry_deadline,
+            budgets=settings.retry_budgets,
+            circuit_breaker_threshold=settings.circuit_breaker_threshold,
+            circuit_breaker_reset_timeout=settings.circuit_breaker_reset_timeout,
+            fallback_model=settings.fallback_model,
+        )
+
+    def new_state(self) -> RetryState:
+        return RetryState(self.deadline)
+
+    def get_circuit_breaker(self, key: str) -> t.Optional["CircuitBreaker"]:
+        """The process-wide circuit breaker for a provider, None if disabled."""
+        if self.circuit_breaker_threshold <= 0:
+            return None
+        return CircuitBreaker.get(
+            key, self.circuit_breaker_threshold, self.circuit_breaker_reset_timeout
+        )
+
+    def classify(self, exc: Exception) -> t.Optional[str]:
+        """Map an exception to an error class. `None` means it isn't retryable."""
+        if isinstance(exc, ResponseValidationError):
+            return "validation"
+        if isinstance(exc, openai.RateLimitError):
+            return "rate_limit"
+        if isinstance(exc, openai.APITimeoutError):
+            return "timeout"
+        if isinstance(exc, openai.APIConnectionError):
+            return "connection"
+        if isinstance(exc, (openai.InternalServerError, openai.UnprocessableEntityError)):
+            return "server"
+
+        # litellm exceptions can only be raised if it was imported, and importing it is slow
+        litellm = sys.modules.get("litellm")
+        if litellm is None:
+            return None
+        if isinstance(exc, litellm.RateLimitError):
+            return "rate_limit"
+        if isinstance(exc, litellm.Timeout):
+            return "timeout"
+        if isinstance(exc, litellm.APIConnectionError):
+            return "connection"
+        if isinstance(exc, (litellm.ServiceUnavailableError, litellm.InternalServerError)):
+            return "server"
+        return None
+
+    def compute_delay(self, exc: Exception, num_retries: int) -> float:
+        """Seconds to wait before the next attempt. `num_retries` counts earlier retries."""
+        if isinstance(exc, ResponseValidationError):
+            return 0.0
+        retry_after = get_retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        cap = min(self.max_delay, self.base_delay * self.multiplier**num_retries)
+        return random.uniform(0, cap)
+
+    def should_retry(
+        self,
+        error_class: t.Optional[str],
+        attempt: int,
+        class_retries: dict[str, int],
+        delay: float,
+        state: RetryState,
+    ) -> bool:
+        if error_class is None or attempt >= self.max_attempts:
+            return False
+        if class_retries.get(error_class, 0) >= self.budgets.get(error_class, 0):
+            return False
+        return delay <= state.time_left()
+
+
+class CircuitBreaker:
+    """Stops sending requests to a provider that is down.
+
+    The circuit is closed normally. After `failure_threshold` consecutive outage
+    errors it opens, and requests fail fast. Once `reset_timeout` seconds have passed,
+    it is half-open: a single probe request is let through, which closes the circuit
+    if it succeeds, or opens it again if it fails.
+
+    Breakers are shared by all clients in the process, see `CircuitBreaker.get`.
+    """
+
+    _registry: dict[str, "CircuitBreaker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: t.Optional[float] = None
+        self._probe_started_at: t.Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(
+        cls, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ) -> "CircuitBreaker":
+        """The breaker of a provider, shared by all clients of it. Clients asking for
+        other settings than the breaker has update them, the last one wins."""
+        with cls._registry_lock:
+            breaker = cls._registry.get(name)
+            if breaker is None:
+                breaker = cls._registry[name] = cls(name, failure_threshold, reset_timeout)
+            elif (breaker.failure_threshold, breaker.reset_timeout) != (
+                failure_threshold,
+                reset_timeout,
+            ):
+                with breaker._lock:
+                    breaker.failure_threshold = failure_threshold
+                    breaker.reset_timeout = reset_timeout
+            return breaker
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._registry_lock:
+            cls._registry.clear()
+
+    @property
+    def state(self) -> t.Literal["closed", "open", "half_open"]:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now. In the half-open state, this reserves
+        the single probe request."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "open":
+                return False
+            now = time.monotonic()
+            # a probe that never reported back (e.g. it was cancelled) is given up on
+            if (
+                self._probe_started_at is not None
+                and now - self._probe_started_at < self.reset_timeout
+            ):
+                return False
+            self._probe_started_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit breaker for {self.name} closed, the provider is back")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None:
+                # the probe failed
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+            elif self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                logger.error(
+                    f"{self._failures} consecutive failures from {self.name}, failing "
+                    f"requests to it fast for the next {self.reset_timeout:.0f}s"
+                )
+
+
+def get_retry_after(exc: Exception) -> t.Optional[float]:
+    """Seconds the server asked us to wait, from the `Retry-After(-ms)` headers."""
+    headers = get_response_headers(exc)
+    retry_after_ms = get_header(headers, "retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = get_header(headers, "retry-after")
+    if retry_after is None:
+        return None
+    seconds = parse_duration(retry_after)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
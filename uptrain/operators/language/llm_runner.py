@@ -0,0 +1,191 @@
+"""
+Process-wide runtime for LLM requests: a long-lived event loop running in a
+background thread, and a pool of API clients whose HTTP connections are reused
+across calls.
+"""
+
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+import typing as t
+import weakref
+
+import httpx
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+
+
+class BackgroundLoop:
+    """An event loop that runs forever in a daemon thread.
+
+    Coroutines submitted from any thread run on it, so sync callers don't pay for
+    creating (and tearing down) a loop per call, and it works the same whether or
+    not the caller already has a running loop. Context variables of the caller are
+    propagated to the coroutine.
+    """
+
+    def __init__(self):
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+        self._thread: t.Optional[threading.Thread] = None
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # threads don't survive a fork, so the child needs its own loop
+            if self._loop is None or self._pid != os.getpid():
+                self._start()
+            return self._loop  # type: ignore
+
+    def _start(self) -> None:
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(started.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name="uptrain-llm-loop", daemon=True)
+        thread.start()
+        started.wait()
+        self._loop, self._thread, self._pid = loop, thread, os.getpid()
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is threading.current_thread()
+
+    def submit(self, coro: t.Coroutine) -> concurrent.futures.Future:
+        """Schedule the coroutine on the loop, returning a thread-safe future."""
+        loop = self.loop
+        ctx = contextvars.copy_context()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def schedule():
+            # tasks copy the current context, which `ctx.run` has made the caller's
+            task = loop.create_task(coro)
+
+            def on_cancel(fut: concurrent.futures.Future):
+                if fut.cancelled():
+                    loop.call_soon_threadsafe(task.cancel)
+
+            def on_done(task: asyncio.Task):
+                if future.done():
+                    return
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+
+            future.add_done_callback(on_cancel)
+            task.add_done_callback(on_done)
+
+        if future.set_running_or_notify_cancel():
+            loop.call_soon_threadsafe(ctx.run, schedule)
+        return future
+
+    def run(self, coro: t.Coroutine) -> t.Any:
+        """Run the coroutine on the loop and block until it is done."""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError(
+                "Can't block on the uptrain event loop from inside it, await the coroutine instead."
+            )
+        future = self.submit(coro)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+
+
+_BACKGROUND_LOOP = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    return _BACKGROUND_LOOP
+
+
+def run_coroutine(coro: t.Coroutine) -> t.Any:
+    """Run a coroutine to completion on the shared background loop."""
+    return _BACKGROUND_LOOP.run(coro)
+
+
+# -----------------------------------------------------------
+# Pool of API clients
+# -----------------------------------------------------------
+
+# HTTP connections are bound to the event loop they were opened on, so clients are
+# pooled per loop. Entries go away with their loop.
+_CLIENT_POOL: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, t.Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_CLIENT_POOL_LOCK = threading.Lock()
+
+
+class ClientConfig(t.NamedTuple):
+    """Everything needed to construct an API client for a provider."""
+
+    provider: t.Literal["openai", "azure"]
+    api_key: t.Optional[str] = None
+    base_url: t.Optional[str] = None
+    api_version: t.Optional[str] = None
+    max_connections: int = 256
+    max_keepalive_connections: int = 64
+    keepalive_expiry: float = 60.0
+
+    @classmethod
+    def from_settings(
+        cls, settings: "Settings", provider: t.Literal["openai", "azure"], **kwargs
+    ) -> "ClientConfig":
+        return cls(
+            provider=provider,
+            max_connections=settings.max_concurrency,
+            max_keepalive_connections=settings.http_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+            **kwargs,
+        )
+
+
+def make_async_client(config: ClientConfig) -> t.Any:
+    from openai import AsyncOpenAI, AsyncAzureOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(180, connect=10),
+        follow_redirects=True,
+    )
+    if config.provider == "azure":
+        return AsyncAzureOpenAI(
+            api_key=config.api_key,
+            api_version=config.api_version,
+            azure_endpoint=config.base_url,
+            http_client=http_client,
+        )
+    return AsyncOpenAI(
+        api_key=config.api_key, base_url=config.base_url, http_client=http_client
+    )
+
+
+def get_async_client(config: ClientConfig) -> t.Any:
+    """Return the pooled client for the config, on the currently running loop."""
+    loop = asyncio.get_running_loop()
+    with _CLIENT_POOL_LOCK:
+        clients = _CLIENT_POOL.setdefault(loop, {})
+        client = clients.get(config)
+        if client is None:
+            logger.debug(f"Creating a pooled {config.provider} client for {config.base_url}")
+            client = make_async_client(config)
+            clients[config] = client
+    return client
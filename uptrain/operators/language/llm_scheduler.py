@@ -0,0 +1,183 @@
+"""
+Process-wide scheduling of LLM requests across operators and evaluations.
+
+All clients of an API key (or of an explicitly passed client) share one rate
+limiter, so operators running back to back or concurrently don't overshoot the
+account's quota. The limiter admits requests by priority class first, and shares
+the budget fairly between the scheduling sessions (e.g. concurrent evaluations)
+within a class.
+"""
+
+from __future__ import annotations
+import contextlib
+import contextvars
+import hashlib
+import itertools
+import threading
+import typing as t
+import weakref
+
+from loguru import logger
+
+from uptrain.operators.language.llm_ratelimit import RateLimiter
+
+if t.TYPE_CHECKING:
+    from uptrain.framework import Settings
+    from uptrain.operators.language.llm_runner import ClientConfig
+
+# priority classes, lower ones are admitted first
+PRIORITIES = {"interactive": 0, "default": 1, "bulk": 2}
+
+_session_ids = itertools.count()
+
+
+class SchedulingSession:
+    """A stream of requests that gets a fair share of the rate limits.
+
+    Attributes:
+        priority: Priority class, one of `PRIORITIES`.
+        weight: Relative share of the budget against other sessions of the class.
+        name: Identifies the session in logs.
+    """
+
+    def __init__(self, priority: str = "default", weight: float = 1.0, name: t.Optional[str] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(
+                f"Unknown request priority {priority}, expected one of {', '.join(PRIORITIES)}"
+            )
+        if weight <= 0:
+            raise ValueError(f"Weight of a scheduling session must be positive, got {weight}")
+        self.priority = priority
+        self.weight = weight
+        self.name = name or f"session-{next(_session_ids)}"
+
+    @property
+    def rank(self) -> int:
+        return PRIORITIES[self.priority]
+
+    def __repr__(self) -> str:
+        return f"SchedulingSession(name={self.name!r}, priority={self.priority!r}, weight={self.weight})"
+
+
+_SESSION: contextvars.ContextVar[t.Optional[SchedulingSession]] = contextvars.ContextVar(
+    "uptrain_scheduling_session", default=None
+)
+
+
+def get_session() -> t.Optional[SchedulingSession]:
+    """The session of the enclosing `scheduling_session` block, if any."""
+    return _SESSION.get()
+
+
+@contextlib.contextmanager
+def scheduling_session(
+    priority: str = "default", weight: float = 1.0, name: t.Optional[str] = None
+) -> t.Iterator[SchedulingSession]:
+    """Schedule all LLM requests made in the block as one session."""
+    session = SchedulingSession(priority, weight, name)
+    token = _SESSION.set(session)
+    try:
+        yield session
+    finally:
+        _SESSION.reset(token)
+
+
+class LimiterRegistry:
+    """Rate limiters of the process, shared by all clients of the same API key or
+    client object.
+
+    A client set up with other limits or flags than a shared limiter has reconfigures
+    it, the most recent configuration wins, so limits can be raised again (e.g. after
+    a tier upgrade). Adaptive limiters then learn the actual limits of the key from
+    the response headers, up to the configured limits.
+    """
+
+    def __init__(self):
+        self._by_key: dict[str, RateLimiter] = {}
+        # explicitly passed clients are keyed by identity, and forgotten with them
+        self._by_client: weakref.WeakKeyDictionary[t.Any, RateLimiter] = (
+            weakref.WeakKeyDictionary()
+        )
+        # configuration each limiter was last set up with
+        self._configs: weakref.WeakKeyDictionary[RateLimiter, tuple] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        client_config: t.Optional["ClientConfig"] = None,
+        model: t.Optional[str] = None,
+        api_base: t.Optional[str] = None,
+    ) -> str:
+        """Key of the quota requests count against: the API key and base url for the
+        openai/azure clients, else (litellm) the model and base url."""
+        if client_config is not None:
+            api_key_hash = hashlib.sha256(
+                (client_config.api_key or "").encode("utf-8")
+            ).hexdigest()[:16]
+            return f"{client_config.provider}:{client_config.base_url or 'default'}:{api_key_hash}"
+        return f"litellm:{model}:{api_base or 'default'}"
+
+    def get(
+        self,
+        key: t.Optional[str],
+        rpm_limit: float,
+        tpm_limit: float,
+        aclient: t.Any = None,
+        adaptive: bool = False,
+        max_concurrency: int = 256,
+    ) -> RateLimiter:
+        """The shared limiter of the client if one is passed, else of the key."""
+        config = (rpm_limit, tpm_limit, adaptive, max_concurrency)
+        with self._lock:
+            limiters = self._by_client if aclient is not None else self._by_key
+            lookup = aclient if aclient is not None else key
+            limiter = limiters.get(lookup)
+            if limiter is None:
+                limiter = RateLimiter(
+                    rpm_limit, tpm_limit, adaptive=adaptive, max_concurrency=max_concurrency
+                )
+                limiters[lookup] = limiter
+            elif self._configs[limiter] != config:
+                logger.warning(
+                    f"Clients sharing the rate limits of {key or 'a client'} were set up "
+                    f"differently, applying the latest: {rpm_limit:g} requests and "
+                    f"{tpm_limit:g} tokens per minute, adaptive={adaptive}, "
+                    f"max_concurrency={max_concurrency}"
+                )
+                limiter.configure(rpm_limit, tpm_limit, adaptive, max_concurrency)
+            self._configs[limiter] = config
+            return limiter
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_key.clear()
+            self._by_client.clear()
+            self._configs.clear()
+
+
+LIMITER_REGISTRY = LimiterRegistry()
+
+
+def get_shared_limiter(
+    settings: t.Optional["Settings"],
+    rpm_limit: float,
+    tpm_limit: float,
+    aclient: t.Any = None,
+    client_config: t.Optional["ClientConfig"] = None,
+    model: t.Optional[str] = None,
+    api_base: t.Optional[str] = None,
+) -> t.Optional[RateLimiter]:
+    """The process-wide limiter for requests through the given client, None if
+    sharing is disabled in the settings."""
+    if settings is not None and not settings.share_rate_limits:
+        return None
+    return LIMITER_REGISTRY.get(
+        None if aclient is not None else LimiterRegistry.make_key(client_config, model, api_base),
+        rpm_limit,
+        tpm_limit,
+        aclient=aclient,
+        adaptive=settings.adaptive_rate_limit if settings is not None else False,
+        max_concurrency=settings.max_concurrency if settings is not None else 256,
+    )
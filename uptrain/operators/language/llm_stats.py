@@ -0,0 +1,264 @@
+"""
+Request-level telemetry for LLM calls: where the time goes (rate limiting, network,
+retries), tokens used, and how payloads were resolved (cache, coalescing, errors).
+
+Stats are collected per `fetch_responses` run and aggregated per operator in a
+process-wide registry, which can be exported in the OpenMetrics (Prometheus) text
+format.
+"""
+
+from __future__ import annotations
+import bisect
+import http.server
+import threading
+import typing as t
+
+if t.TYPE_CHECKING:
+    from uptrain.operators.language.llm import Payload
+
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKENS_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Histogram:
+    """Counts of observations in cumulative buckets, plus their count and sum."""
+
+    def __init__(self, buckets: t.Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram") -> None:
+        for idx, count in enumerate(other.counts):
+            self.counts[idx] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the q-quantile, interpolated within its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.mean, 4),
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "max": round(self.max, 4),
+        }
+
+
+class RequestStats:
+    """Thread-safe telemetry of the LLM requests of a run, or of several merged runs.
+
+    Histograms (in seconds, or tokens):
+        limiter_wait_{queue,requests,tokens,blocked}_seconds: Time spent waiting on the
+            rate limiter per attempt, by what was waited for (see `RateLimiter.acquire`).
+        latency_seconds: Duration of the API calls.
+        retry_sleep_seconds: Backoff time per retry.
+        prompt_tokens/completion_tokens: Tokens per response, as reported by the API.
+
+    Counters:
+        payloads, attempts, retries, errors, validation_failures, cache_hits,
+        coalesced, hedged, replayed (from the journal of an interrupted run).
+    """
+
+    HISTOGRAMS = {
+        "limiter_wait_queue_seconds": SECONDS_BUCKETS,
+        "limiter_wait_requests_seconds": SECONDS_BUCKETS,
+        "limiter_wait_tokens_seconds": SECONDS_BUCKETS,
+        "limiter_wait_blocked_seconds": SECONDS_BUCKETS,
+        "latency_seconds": SECONDS_BUCKETS,
+        "retry_sleep_seconds": SECONDS_BUCKETS,
+        "prompt_tokens": TOKENS_BUCKETS,
+        "completion_tokens": TOKENS_BUCKETS,
+    }
+    COUNTERS = (
+        "payloads",
+        "attempts",
+        "retries",
+        "errors",
+        "validation_failures",
+        "cache_hits",
+        "coalesced",
+        "hedged",
+        "replayed",
+    )
+
+    def __init__(self):
+        self.histograms = {
+            name: Histogram(buckets) for name, buckets in self.HISTOGRAMS.items()
+        }
+        self.counters = {name: 0 for name in self.COUNTERS}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe_limiter_waits(self, waits: t.Mapping[str, float]) -> None:
+        with self._lock:
+            for reason, seconds in waits.items():
+                self.histograms[f"limiter_wait_{reason}_seconds"].observe(seconds)
+
+    def record_payload(self, payload: "Payload") -> None:
+        """Count a finished payload, by how it was resolved."""
+        with self._lock:
+            self.counters["payloads"] += 1
+            self.counters["errors"] += payload.error is not None
+            for flag in ("cache_hit", "coalesced", "hedged", "replayed"):
+                if payload.metadata.get(flag):
+                    self.counters["cache_hits" if flag == "cache_hit" else flag] += 1
+
+    def merge(self, other: "RequestStats") -> None:
+        with self._lock, other._lock:
+            for name, histogram in other.histograms.items():
+                self.histograms[name].merge(histogram)
+            for name, value in other.counters.items():
+                self.counters[name] += value
+
+    def dict(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                **{name: hist.dict() for name, hist in self.histograms.items()},
+            }
+
+    def __repr__(self) -> str:
+        return f"RequestStats({self.dict()})"
+
+    def to_openmetrics(
+        self, prefix: str = "uptrain_llm", labels: t.Optional[dict] = None
+    ) -> str:
+        """Render the stats in the OpenMetrics text format."""
+        return _render_families(self._metric_families(prefix, labels or {}))
+
+    def _metric_families(self, prefix: str, labels: dict) -> dict[str, list[str]]:
+        """Sample lines by the `# TYPE` line of their metric family."""
+        families = {}
+        with self._lock:
+            for name, value in self.counters.items():
+                families[f"# TYPE {prefix}_{name} counter\n"] = [
+                    f"{prefix}_{name}_total{_format_labels(labels)} {value}\n"
+                ]
+            for name, hist in self.histograms.items():
+                lines = []
+                cumulative = 0
+                for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, "le": bound})
+                    lines.append(f"{prefix}_{name}_bucket{bucket_labels} {cumulative}\n")
+                lines.append(f"{prefix}_{name}_count{_format_labels(labels)} {hist.count}\n")
+                lines.append(f"{prefix}_{name}_sum{_format_labels(labels)} {hist.sum}\n")
+                families[f"# TYPE {prefix}_{name} histogram\n"] = lines
+        return families
+
+
+def _render_families(families: dict[str, list[str]]) -> str:
+    return "".join(meta + "".join(lines) for meta, lines in families.items()) + "# EOF\n"
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + inner + "}"
+
+
+class StatsRegistry:
+    """Cumulative request stats of the process, per operator."""
+
+    def __init__(self):
+        self._stats: dict[str, RequestStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, operator: str) -> RequestStats:
+        with self._lock:
+            if operator not in self._stats:
+                self._stats[operator] = RequestStats()
+            return self._stats[operator]
+
+    def record_run(self, operator: str, stats: RequestStats) -> None:
+        self.get(operator).merge(stats)
+
+    def dict(self) -> dict[str, dict]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {operator: value.dict() for operator, value in stats.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def to_openmetrics(self, prefix: str = "uptrain_llm") -> str:
+        """Render the stats of all operators in the OpenMetrics text format."""
+        with self._lock:
+            stats = sorted(self._stats.items())
+        # the samples of a metric family must be contiguous, so group them across operators
+        families: dict[str, list[str]] = {}
+        for operator, value in stats:
+            for meta, lines in value._metric_families(prefix, {"operator": operator}).items():
+                families.setdefault(meta, []).extend(lines)
+        return _render_families(families)
+
+
+STATS_REGISTRY = StatsRegistry()
+
+
+def start_metrics_server(
+    port: int = 9464, host: str = "127.0.0.1", registry: StatsRegistry = STATS_REGISTRY
+) -> http.server.ThreadingHTTPServer:
+    """Serve the stats of the registry for Prometheus to scrape, in a daemon thread.
+
+    Only local connections are accepted by default. Pass e.g. `host="0.0.0.0"` to
+    expose the stats on the other network interfaces too."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.to_openmetrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header(
+                "Content-Type",
+                "application/openmetrics-text; version=1.0.0; charset=utf-8",
+            )
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
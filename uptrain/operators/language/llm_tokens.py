@@ -0,0 +1,150 @@
+"""
+Token counting for LLM payloads, and bookkeeping of the tokens actually used.
+"""
+
+from __future__ import annotations
+import functools
+import importlib.util
+import threading
+import typing as t
+
+from loguru import logger
+
+# Used to reserve rate limit budget for the completion, until we've seen real responses
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+@functools.lru_cache(maxsize=None)
+def _has_tiktoken() -> bool:
+    if importlib.util.find_spec("tiktoken") is None:
+        logger.warning(
+            "tiktoken is not installed, estimating token counts from text length "
+            "instead. Install it (`pip install tiktoken`) for accurate rate limiting."
+        )
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=64)
+def get_encoding(model: str) -> t.Any:
+    """Return the (cached) tiktoken encoder for a model, or None if tiktoken isn't installed."""
+    if not _has_tiktoken():
+        return None
+    import tiktoken
+
+    # strip provider prefixes like `azure/` or `openai/`
+    model = model.split("/")[-1]
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(
+            f"Could not load a tokenizer for {model}, estimating its token counts "
+            f"from text length instead: {e}"
+        )
+        return None
+
+
+def count_text_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 3  # average token length is 3, conservatively
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_text_tokens(text: str, chunk_tokens: int, model: str) -> list[str]:
+    """Split a text into consecutive pieces of at most `chunk_tokens` tokens."""
+    chunk_tokens = max(chunk_tokens, 1)
+    encoding = get_encoding(model)
+    if encoding is None:
+        size = chunk_tokens * 3
+        return [text[start : start + size] for start in range(0, len(text), size)] or [""]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [
+        encoding.decode(tokens[start : start + chunk_tokens])
+        for start in range(0, len(tokens), chunk_tokens)
+    ] or [""]
+
+
+def count_message_tokens(messages: list[dict], model: str) -> int:
+    """Count the prompt tokens of a chat request.
+
+    Follows the accounting in the openai cookbook: every message carries a few tokens
+    of overhead, and the reply is primed with 3 more.
+    """
+    num_tokens = 3
+    for message in messages:
+        num_tokens += 3
+        for key, value in message.items():
+            if isinstance(value, str):
+                num_tokens += count_text_tokens(value, model)
+            if key == "name":
+                num_tokens += 1
+    return num_tokens
+
+
+class TokenUsage:
+    """Thread-safe running totals of tokens used by LLM requests.
+
+    Attributes:
+        requests: Number of responses accounted for.
+        prompt_tokens: Total prompt tokens, as reported by the API.
+        completion_tokens: Total completion tokens, as reported by the API.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def expected_completion_tokens(self) -> int:
+        """Average completion size seen so far, used to reserve budget for new requests."""
+        if self.requests == 0:
+            return DEFAULT_COMPLETION_TOKENS
+        return self.completion_tokens // self.requests
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def merge(self, other: "TokenUsage") -> None:
+        with self._lock:
+            self.requests += other.requests
+            self.prompt_tokens += other.prompt_tokens
+            self.completion_tokens += other.completion_tokens
+
+    def dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+    def __repr__(self) -> str:
+        return f"TokenUsage({self.dict()})"
+
+
+def get_usage(response: t.Any) -> t.Optional[tuple[int, int]]:
+    """Return (prompt_tokens, completion_tokens) from a chat completion, if reported."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    return int(prompt_tokens or 0), int(completion_tokens or 0)
@@ -19,7 +19,7 @@ from uptrain.operators.base import (
     register_op,
     TYPE_TABLE_OUTPUT,
 )
-from uptrain.operators.language.llm import LLMMulticlient, Payload
+from uptrain.operators.language.llm import LLMMulticlient, Payload, log_payload_error
 
 # from evals.elsuite.modelgraded.classify_utils import (
 #     # append_answer_prompt,
@@ -263,7 +263,9 @@ class ModelGradeScore(ColumnOp):
     col_out: t.Union[str, list[str]] = "model_grade_score"
 
     def setup(self, settings: Settings, aclient: t.Any = None):
-        self._api_client = LLMMulticlient(settings=settings, aclient=aclient)
+        self._api_client = LLMMulticlient(
+            settings=settings, aclient=aclient, operator_name=self.__class__.__name__
+        )
         self._aclient = aclient
         self._settings = settings
         self.model = settings.model.replace("azure/", "")
@@ -476,15 +478,13 @@ class ModelGradeScore(ColumnOp):
             self._make_payload(idx, prompt_msgs)
             for idx, prompt_msgs in enumerate(prompts)
         ]
-        output_payloads = self._api_client.fetch_responses(input_payloads)
+        output_payloads = self._api_client.iter_responses(input_payloads)
 
         results = []
         for res in output_payloads:
             idx = res.metadata["index"]
             if res.error is not None:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
                 results.append((idx, None, None))
             else:
                 try:
@@ -5,7 +5,6 @@ Implement checks for multi query related operations
 
 from __future__ import annotations
 import typing as t
-import json
 
 from loguru import logger
 import polars as pl
@@ -26,9 +25,14 @@ from uptrain.utilities.prompt_utils import parse_scenario_description
 
 if t.TYPE_CHECKING:
     from uptrain.framework import Settings
-from uptrain.operators.base import register_op, ColumnOp, TYPE_TABLE_OUTPUT
+from uptrain.operators.base import (
+    register_op,
+    ColumnOp,
+    TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
+)
 from uptrain.utilities import polars_to_json_serializable_dict
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 
 
 @register_op
@@ -63,12 +67,14 @@ class MultiQueryAccuracy(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -79,7 +85,7 @@ class MultiQueryAccuracy(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "multi_query_accuracy",
@@ -110,7 +116,7 @@ class MultiQueryAccuracy(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -156,8 +162,8 @@ class MultiQueryAccuracy(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -169,16 +175,14 @@ class MultiQueryAccuracy(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_multi_query_accuracy"] = float(score)
                 output["explanation_multi_query_accuracy"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -7,16 +7,20 @@ import typing as t
 
 from loguru import logger
 import polars as pl
-import json
 
 from uptrain.utilities.prompt_utils import parse_scenario_description
 
 if t.TYPE_CHECKING:
     from uptrain.framework import Settings
-from uptrain.operators.base import register_op, ColumnOp, TYPE_TABLE_OUTPUT
+from uptrain.operators.base import (
+    register_op,
+    ColumnOp,
+    TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
+)
 from uptrain.framework import APIClient
 from uptrain.utilities import polars_to_json_serializable_dict
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 
 from uptrain.operators.language.prompts.classic import (
     QUERY_REWRITE_PROMPT_TEMPLATE,
@@ -97,12 +101,14 @@ class QueryRewrite(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["conversation"] = row[self.col_conversation]
@@ -112,7 +118,7 @@ class QueryRewrite(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "query_rewriting",
@@ -138,7 +144,7 @@ class QueryRewrite(ColumnOp):
         is_correct = is_correct and ("Question" in llm_output)
         return is_correct
     
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -173,8 +179,8 @@ class QueryRewrite(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client, input_payloads, validation_func
         )
 
         results = []
@@ -184,12 +190,10 @@ class QueryRewrite(ColumnOp):
                 "revised_question": None,
             }
             try:
-                revised_question = json.loads(res.response.choices[0].message.content)["Question"]
+                revised_question = res.get_output()["Question"]
                 output["revised_question"] = revised_question
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
         return results
\ No newline at end of file
@@ -4,7 +4,6 @@ Implement operaores to evaluate response quality i.e. quality of the generated r
 
 from __future__ import annotations
 import typing as t
-import json
 import copy
 
 from loguru import logger
@@ -15,9 +14,14 @@ from uptrain.utilities.prompt_utils import parse_scenario_description
 
 if t.TYPE_CHECKING:
     from uptrain.framework import Settings
-from uptrain.operators.base import register_op, ColumnOp, TYPE_TABLE_OUTPUT
+from uptrain.operators.base import (
+    register_op,
+    ColumnOp,
+    TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
+)
 from uptrain.utilities import polars_to_json_serializable_dict
-from uptrain.operators.language.llm import LLMMulticlient
+from uptrain.operators.language.llm import LLMMulticlient, LLMRequest, log_payload_error
 from uptrain.operators.language.factual_accuracy import ResponseFactualScore
 from uptrain.operators.language.rouge import RougeScore
 from uptrain.framework import Settings
@@ -83,12 +87,14 @@ class ResponseCompleteness(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -99,7 +105,7 @@ class ResponseCompleteness(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "response_completeness",
@@ -130,7 +136,7 @@ class ResponseCompleteness(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -174,8 +180,11 @@ class ResponseCompleteness(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -187,16 +196,14 @@ class ResponseCompleteness(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_response_completeness"] = float(score)
                 output["explanation_response_completeness"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -235,12 +242,14 @@ class ResponseConciseness(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -251,7 +260,7 @@ class ResponseConciseness(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "response_conciseness",
@@ -282,7 +291,7 @@ class ResponseConciseness(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -326,8 +335,11 @@ class ResponseConciseness(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -339,16 +351,14 @@ class ResponseConciseness(ColumnOp):
             }
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_response_conciseness"] = float(score)
                 output["explanation_response_conciseness"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -384,12 +394,14 @@ class ResponseConsistency(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["response"] = row.pop(self.col_response)
@@ -399,7 +411,7 @@ class ResponseConsistency(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "response_consistency",
@@ -431,7 +443,7 @@ class ResponseConsistency(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -473,10 +485,15 @@ class ResponseConsistency(ColumnOp):
                     f"Missing required attribute(s) for scenario description: {e}"
                 )
             input_payloads.append(
-                self._api_client.make_payload(idx, grading_prompt_template)
+                self._api_client.make_payload(
+                    idx, grading_prompt_template, context=row["context"]
+                )
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -487,7 +504,7 @@ class ResponseConsistency(ColumnOp):
                 "explanation_response_consistency": None,
             }
             try:
-                parsed_output = json.loads(res.response.choices[0].message.content)
+                parsed_output = res.get_output()
                 score = parsed_output["Score"]
                 output["score_response_consistency"] = float(score)
                 output["explanation_response_consistency"] = parsed_output["Argument"]
@@ -496,9 +513,7 @@ class ResponseConsistency(ColumnOp):
                         "Reasoning"
                     ]
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
 
@@ -535,12 +550,14 @@ class ValidResponseScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["response"] = row.pop(self.col_response)
@@ -550,7 +567,7 @@ class ValidResponseScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "valid_response",
@@ -579,7 +596,7 @@ class ValidResponseScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -623,8 +640,11 @@ class ValidResponseScore(ColumnOp):
             input_payloads.append(
                 self._api_client.make_payload(idx, grading_prompt_template)
             )
-        output_payloads = self._api_client.fetch_responses(
-            input_payloads, validation_func
+        output_payloads = yield LLMRequest(
+            self._api_client,
+            input_payloads,
+            validation_func,
+            pack=self.settings.eval_type == "basic",
         )
 
         results = []
@@ -634,16 +654,14 @@ class ValidResponseScore(ColumnOp):
             output = {"score_valid_response": None, "explanation_valid_response": None}
             try:
                 score = self.score_mapping[
-                    json.loads(res.response.choices[0].message.content)["Choice"]
+                    res.get_output()["Choice"]
                 ]
                 output["score_valid_response"] = float(score)
                 output["explanation_valid_response"] = res.response.choices[
                     0
                 ].message.content
             except Exception:
-                logger.error(
-                    f"Error when processing payload at index {idx}: {res.error}"
-                )
+                log_payload_error(idx, res)
             results.append((idx, output))
 
         results = [val for _, val in sorted(results, key=lambda x: x[0])]
@@ -680,12 +698,14 @@ class ResponseRelevance(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["response"] = row.pop(self.col_response)
@@ -695,7 +715,7 @@ class ResponseRelevance(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "response_relevance",
@@ -721,7 +741,7 @@ class ResponseRelevance(ColumnOp):
     def response_relevance_cot_validate_func(self, llm_output):
         pass
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -733,10 +753,9 @@ class ResponseRelevance(ColumnOp):
             scenario_description=self.scenario_description,
         )
         output_completeness = (
-            response_completeness.setup(settings=self.settings)
-            .run(pl.DataFrame(data))["output"]
-            .to_dicts()
-        )
+            yield from response_completeness.setup(settings=self.settings)
+            .run_steps(pl.DataFrame(data))
+        )["output"].to_dicts()
 
         response_conciseness = ResponseConciseness(
             col_response=self.col_response,
@@ -744,10 +763,9 @@ class ResponseRelevance(ColumnOp):
         )
 
         output_conciseness = (
-            response_conciseness.setup(settings=self.settings)
-            .run(pl.DataFrame(data))["output"]
-            .to_dicts()
-        )
+            yield from response_conciseness.setup(settings=self.settings)
+            .run_steps(pl.DataFrame(data))
+        )["output"].to_dicts()
 
         results = []
         for combined_row in zip(output_conciseness, output_completeness):
@@ -818,12 +836,14 @@ class ResponseMatchingScore(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -835,7 +855,7 @@ class ResponseMatchingScore(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.evaluate(
                     "ResponseMatching",
@@ -867,7 +887,7 @@ class ResponseMatchingScore(ColumnOp):
         is_correct = is_correct and ("Reasoning" in llm_output)
         return is_correct
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         """
         Our methodology is based on the model grade evaluation introduced by openai evals.
         """
@@ -910,16 +930,15 @@ class ResponseMatchingScore(ColumnOp):
             )
 
             output = (
-                ResponseFactualScore(
+                yield from ResponseFactualScore(
                     col_question=self.col_question,
                     col_response="response",
                     col_context="context",
                     scenario_description=self.scenario_description,
                 )
                 .setup(settings=self.settings)
-                .run(eval_data)["output"]
-                .to_dicts()
-            )
+                .run_steps(eval_data)
+            )["output"].to_dicts()
             output_precision = output[0 : len(data)]
             output_recall = output[len(data) :]
 
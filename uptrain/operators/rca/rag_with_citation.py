@@ -16,6 +16,7 @@ from uptrain.operators.base import (
     ColumnOp,
     register_op,
     TYPE_TABLE_OUTPUT,
+    TYPE_TABLE_STEPS,
 )
 
 from uptrain import RcaTemplate
@@ -60,12 +61,14 @@ class RagWithCitation(ColumnOp):
             self.settings.uptrain_access_token is None
             or not len(self.settings.uptrain_access_token)
         ):
-            self._api_client = LLMMulticlient(settings)
+            self._api_client = LLMMulticlient(
+                settings, operator_name=self.__class__.__name__
+            )
         else:
             self._api_client = APIClient(settings)
         return self
 
-    def run(self, data: pl.DataFrame) -> TYPE_TABLE_OUTPUT:
+    def run_steps(self, data: pl.DataFrame) -> TYPE_TABLE_STEPS:
         data_send = polars_to_json_serializable_dict(data)
         for row in data_send:
             row["question"] = row.pop(self.col_question)
@@ -78,7 +81,7 @@ class RagWithCitation(ColumnOp):
                 self.settings.uptrain_access_token is None
                 or not len(self.settings.uptrain_access_token)
             ):
-                results = self.evaluate_local(data_send)
+                results = yield from self.evaluate_local_steps(data_send)
             else:
                 results = self._api_client.perform_root_cause_analysis(
                     project_name="_internal",
@@ -96,36 +99,32 @@ class RagWithCitation(ColumnOp):
         assert results is not None
         return {"output": data.with_columns(pl.from_dicts(results))}
 
-    def evaluate_local(self, data):
+    def evaluate_local_steps(self, data):
         question_valid_scores = (
-            ValidQuestionScore(col_question="question")
+            yield from ValidQuestionScore(col_question="question")
             .setup(settings=self.settings)
-            .run(pl.DataFrame(data))["output"]
-            .to_dicts()
-        )
+            .run_steps(pl.DataFrame(data))
+        )["output"].to_dicts()
 
         response_valid_scores = (
-            ValidResponseScore(col_response="response")
+            yield from ValidResponseScore(col_response="response")
             .setup(settings=self.settings)
-            .run(pl.DataFrame(data))["output"]
-            .to_dicts()
-        )
+            .run_steps(pl.DataFrame(data))
+        )["output"].to_dicts()
 
         context_relevance_scores = (
-            ContextRelevance(col_question="question", col_context="context")
+            yield from ContextRelevance(col_question="question", col_context="context")
             .setup(settings=self.settings)
-            .run(pl.DataFrame(data))["output"]
-            .to_dicts()
-        )
+            .run_steps(pl.DataFrame(data))
+        )["output"].to_dicts()
 
         factual_accuracy_scores = (
-            ResponseFactualScore(
+            yield from ResponseFactualScore(
                 col_question="question", col_context="context", col_response="response"
             )
             .setup(settings=self.settings)
-            .run(pl.DataFrame(data))["output"]
-            .to_dicts()
-        )
+            .run_steps(pl.DataFrame(data))
+        )["output"].to_dicts()
 
         data_cited = (
             copy.deepcopy(pl.DataFrame(data))
@@ -134,20 +133,18 @@ class RagWithCitation(ColumnOp):
         )
 
         cited_context_relevance_scores = (
-            ContextRelevance(col_question="question", col_context="context")
+            yield from ContextRelevance(col_question="question", col_context="context")
             .setup(settings=self.settings)
-            .run(data_cited)["output"]
-            .to_dicts()
-        )
+            .run_steps(data_cited)
+        )["output"].to_dicts()
 
         cited_factual_accuracy_scores = (
-            ResponseFactualScore(
+            yield from ResponseFactualScore(
                 col_question="question", col_context="context", col_response="response"
             )
             .setup(settings=self.settings)
-            .run(data_cited)["output"]
-            .to_dicts()
-        )
+            .run_steps(data_cited)
+        )["output"].to_dicts()
 
         results = []
 